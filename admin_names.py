@@ -0,0 +1,36 @@
+import re
+
+# Name matching across UBOS, the MFL and the DHIS2 instances, without any third-party imports so the
+# federation layer can use it without loading pandas.
+
+ADMIN_SUFFIX = re.compile(r'\s+(sub[\s-]?county|s/c|district)$')
+PARENTHESES = re.compile(r'\s*\([^)]*\)')
+SEPARATORS = re.compile(r'[\s\-_/]+')
+TOWN_COUNCIL = re.compile(r'\b(town council|t ?c)$')
+DIVISION = re.compile(r'\bdivison\b')
+ADMIN_TYPE = re.compile(r'\b(sub ?county|s c|district|town council|t ?c|division|div|municipality|municipal council|mc|rural|ward)\b')
+NON_LETTERS = re.compile(r'[^a-z]+')
+DOUBLED = re.compile(r'([a-z])\1+')
+
+def normalise_admin_name(name):
+    # 'Kanara Subcounty (Ntoroko District)' and 'kanara' both become 'kanara'
+    name = PARENTHESES.sub('', str(name).casefold())
+    name = SEPARATORS.sub(' ', name).strip()
+    name = DIVISION.sub('division', TOWN_COUNCIL.sub('town council', name))
+    return ADMIN_SUFFIX.sub('', name)
+
+def compact_admin_name(name):
+    # spelling noise only: 'Butunduuzi Town Council' and 'Butunduzi T/C' both become 'butunduzitowncouncil'
+    return DOUBLED.sub(r'\1', NON_LETTERS.sub('', normalise_admin_name(name)))
+
+def municipal_division_name(name):
+    # 'Entebbe Division A' is listed as 'Division A' under its district, None unless something follows 'Division'
+    words = normalise_admin_name(name).split(' ')
+    start = words.index('division') if 'division' in words else len(words)
+    return ' '.join(words[start:]) if start < len(words) - 1 else None
+
+def loose_admin_name(name):
+    # drops the unit type and spelling noise: 'Butunduuzi Town Council' and 'Butunduzi' both become 'butunduzi',
+    # so only use it where the result is unique among the candidates
+    name = ADMIN_TYPE.sub(' ', normalise_admin_name(name))
+    return DOUBLED.sub(r'\1', NON_LETTERS.sub('', name))
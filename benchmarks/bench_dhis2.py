@@ -0,0 +1,110 @@
+import argparse
+import gc
+import io
+import json
+import random
+from time import perf_counter
+import tracemalloc
+
+import cassette
+import dhis2
+from benchmarks.stub_dhis2 import StubDhis2, AGE_GROUPS, SEXES
+
+# Run from the repository root:
+#   python -m benchmarks.bench_dhis2 --scales 1 10 100 --output bench_output.txt
+#   python -m benchmarks.bench_dhis2 --scales 1 --record cassettes/stub    (record the stub's responses)
+#   python -m benchmarks.bench_dhis2 --scales 1 10 --replay cassettes/stub (no server, the tree scaled from the recording)
+
+LOOKUPS = 10000
+
+def measure(fn, repeat):
+    # best-of-N wall clock, then a separate run under tracemalloc for the peak allocation
+    times = list()
+    for _ in range(repeat):
+        gc.collect()
+        ts = perf_counter()
+        fn()
+        times.append(perf_counter() - ts)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+def scenarios(instance, rnd):
+    orgunits = instance.orgunits()
+    dataelements = instance.dataelements()
+    names = [ou['name'] for ou in orgunits]
+    de_names = [dataelements[i]['name'] for i in range(len(dataelements))]
+    sample_names = [rnd.choice(names) for _ in range(LOOKUPS)]
+    sample_de_names = [rnd.choice(de_names) for _ in range(LOOKUPS)]
+    sample_cocs = [(rnd.choice(AGE_GROUPS), rnd.choice(SEXES)) for _ in range(LOOKUPS)]
+
+    def lookup_name():
+        for name in sample_names:
+            orgunits.lookup_name(name)
+
+    def ancestor_path():
+        for name in sample_names:
+            orgunits.ancestor_path(name)
+
+    def find_category_combo():
+        for de_name, coc in zip(sample_de_names, sample_cocs):
+            dataelements.lookup_name(de_name).find_category_combo(*coc)
+
+    def mfl_export():
+        dhis2.export_mfl(orgunits, io.StringIO())
+
+    return (
+        ('orgunits_construct', instance.orgunits, len(orgunits)),
+        ('lookup_name', lookup_name, LOOKUPS),
+        ('ancestor_path', ancestor_path, LOOKUPS),
+        ('find_category_combo', find_category_combo, LOOKUPS),
+        ('mfl_export', mfl_export, len(orgunits)),
+    )
+
+def run_scenarios(instance, scale, repeat, seed):
+    results = list()
+    n_orgunits = len(instance.orgunits())
+    for name, fn, n in scenarios(instance, random.Random(seed)):
+        seconds, peak = measure(fn, repeat)
+        results.append({ 'scenario': name, 'scale': scale, 'orgunits': n_orgunits, 'n': n, 'seconds': seconds, 'peak_bytes': peak })
+    return results
+
+def run(scales, repeat, seed, record=None, replay=None):
+    results = list()
+    for scale in scales:
+        if replay:
+            instance = dhis2.Dhis2('http://replay.invalid/', ('admin', 'district'), cassette=cassette.Cassette(replay, 'replay', scale=int(scale)))
+            results.extend(run_scenarios(instance, scale, repeat, seed))
+            continue
+        with StubDhis2.synthetic(scale) as stub:
+            instance = dhis2.Dhis2(stub.url, ('admin', 'district'), cassette=cassette.Cassette(record, 'record') if record else None)
+            results.extend(run_scenarios(instance, scale, repeat, seed))
+    return results
+
+def format_results(results):
+    lines = ['%-20s %6s %9s %9s %12s %12s' % ('scenario', 'scale', 'orgunits', 'n', 'seconds', 'peak_MiB')]
+    for r in results:
+        lines.append('%-20s %6g %9d %9d %12.4f %12.2f' % (r['scenario'], r['scale'], r['orgunits'], r['n'], r['seconds'], r['peak_bytes'] / 2**20))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench_dhis2')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100], help='Multiples of the Uganda orgunit count to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed repetitions per scenario (the best is reported)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Also write the results to OUTPUT')
+    parser.add_argument('--record', help='Record the stub server responses into the cassette directory RECORD')
+    parser.add_argument('--replay', help='Replay the cassette directory REPLAY instead of starting a stub server, scaling the recorded tree')
+    parser.add_argument('--json', action='store_true', default=False, help='Output JSON instead of a table')
+    args = parser.parse_args()
+
+    results = run(args.scales, args.repeat, args.seed, args.record, args.replay)
+    report = json.dumps(results, indent=1) if args.json else format_results(results)
+    print(report)
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            output_file.write(report + '\n')
@@ -0,0 +1,202 @@
+import argparse
+import csv
+import json
+import os
+from pathlib import Path
+import random
+import runpy
+import sys
+import tempfile
+from time import perf_counter
+
+from benchmarks import fake_streamlit
+from benchmarks.stub_dhis2 import StubDhis2
+
+# Run from the repository root:
+#   python -m benchmarks.bench_render --output render.json
+#   python -m benchmarks.bench_render --compare render.json
+#   python -m benchmarks.bench_render --bundles   (the read-only mode, served from bundles.py output)
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+SCRIPT_PATH = REPO_ROOT / 'run_demo.py'
+
+PCR_DE_NAMES = (
+    ('I0MEbZSbEVs', 'EID - Total Number Exposed Infants due for a test'),
+    ('y2G5UdgSfuk', 'EID - Tested 1st PCR'),
+    ('XroPkgIGjVS', 'EID - Tested 2nd PCR'),
+    ('tEYLrsgH6aO', 'EID - Tested 3rd PCR'),
+    ('oX344XVLe1V', 'EID - Tested Rapid Test'),
+    ('T2UepjeVadz', 'EID - Positive Linked to ART'),
+    ('o9Yy4ibSCWE', 'EID - Positive'),
+)
+
+DEFAULT_SEQUENCE = (
+    { 'district': None },
+    { 'district': 'Ntungamo District' },
+    { 'district': 'Ntungamo District', 'subcounty': 'Kayonza' },
+    { 'district': 'Ntungamo District', 'subcounty': 'Kayonza', 'parish': 'Katooma' },
+    { 'district': 'Abim District' },
+    { 'district': None, 'map_level': 'Subcounty', 'map_metric': 'Population density (per km²)' },
+    { 'search': 'katoma' },
+    { 'search': 'Katooma', 'search_pick': 1 },
+)
+
+SELECTION_LABELS = (
+    ('district', 'Select a district'),
+    ('subcounty', 'Select subcounty'),
+    ('parish', 'Select parish'),
+    ('map_level', 'Map level'),
+    ('map_metric', 'Map metric'),
+    ('search', 'Jump to a place'),
+    ('search_pick', 'Matches'),
+)
+
+def district_square(i):
+    lon, lat = 29.6 + (i % 15) * 0.3, -1.4 + (i // 15) * 0.4
+    return { 'type': 'Polygon', 'coordinates': [[[lon, lat], [lon + 0.3, lat], [lon + 0.3, lat + 0.4], [lon, lat + 0.4], [lon, lat]]] }
+
+def write_fixtures(fixture_dir, parish_path, seed=1):
+    # an MFL with one mappable row per UBOS district, OptionB+ values for every district, and matching DHIS2 metadata
+    from gazetteer import DISTRICT_REGION
+
+    rnd = random.Random(seed)
+    with open(parish_path) as parish_file:
+        rows = list(csv.DictReader(parish_file))
+    districts = sorted(set(row['District'] + ' District' for row in rows))
+    subcounties = sorted(set((row['District'] + ' District', row['Subcounty']) for row in rows))
+
+    mfl_path, optionb_path = fixture_dir / 'mfl.csv', fixture_dir / 'optionb.csv'
+    district_ous = list()
+    with open(mfl_path, mode='w') as mfl_file, open(optionb_path, mode='w') as optionb_file:
+        mfl = csv.writer(mfl_file, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        mfl.writerow(('REGION', 'SUB_REGION', 'DISTRICT', 'SUBCOUNTY', 'NAME', 'UID', 'COORDINATES', 'OPERATIONAL STATUS', 'FACILITY_LEVEL', 'OWNERSHIP_NAME', 'AUTHORITY_NAME'))
+        optionb = csv.writer(optionb_file, lineterminator='\n')
+        optionb.writerow(('Data', 'Organisation unit', 'Value'))
+        for i, district in enumerate(districts):
+            district_uid = 'X%010d' % (i,)
+            region = DISTRICT_REGION.get(district, 'Central Region')
+            mfl.writerow((region, 'Subregion', district, None, None, district_uid, json.dumps(district_square(i)), None, None, None, None))
+            district_ous.append({ 'id': district_uid, 'name': district, 'ancestors': [{ 'id': 'akV6429SUqu' }, { 'id': 'R0000000000' }] })
+            due = rnd.randint(50, 500)
+            positive = rnd.randint(0, 10)
+            values = (due, int(due * 0.5), int(due * 0.2), int(due * 0.1), int(due * 0.05), positive, positive)
+            for (de_uid, _), value in zip(PCR_DE_NAMES, values):
+                optionb.writerow((de_uid, district_uid, float(value)))
+        for i, (district, subcounty) in enumerate(subcounties):
+            square = district_square(districts.index(district))
+            lon, lat = square['coordinates'][0][0]
+            lon, lat = lon + (i % 10) * 0.03, lat + (i // 10 % 10) * 0.04
+            polygon = { 'type': 'Polygon', 'coordinates': [[[lon, lat], [lon + 0.03, lat], [lon + 0.03, lat + 0.04], [lon, lat + 0.04], [lon, lat]]] }
+            mfl.writerow((DISTRICT_REGION.get(district, 'Central Region'), 'Subregion', district, subcounty, None, 'Y%010d' % (i,), json.dumps(polygon), None, None, None, None))
+
+    collections = {
+        'organisationUnits': district_ous,
+        'organisationUnitGroupSets': list(),
+        'dataElements': [{ 'id': de_uid, 'name': de_name } for de_uid, de_name in PCR_DE_NAMES],
+        'dataSets': list(),
+    }
+    return mfl_path, optionb_path, collections
+
+def histogram_sums(registry):
+    sums = dict()
+    for h in registry.to_json()['histograms']:
+        if h['name'] in ('demo_stage_seconds', 'demo_build_seconds'):
+            sums['%s.%s' % (h['name'].replace('_seconds', ''), h['labels'].get('stage'))] = h['sum']
+    return sums
+
+def run(sequence, repeat, cold, use_bundles=False):
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(REPO_ROOT) # run_demo.py opens its data files relative to the working directory
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = Path(tmp)
+        parish_path = REPO_ROOT / 'ubos_parish' / 'ALL_POP.csv'
+        mfl_path, optionb_path, collections = write_fixtures(fixture_dir, parish_path)
+        with StubDhis2(collections) as stub:
+            secrets = {
+                'DHIS2_SERVER_URL': stub.url,
+                'credentials': ['admin', 'district'],
+                'MFL_PATH': str(mfl_path),
+                'OPTIONB_PATH': str(optionb_path),
+            }
+            if use_bundles:
+                import bundles
+                n_bundles, n_bytes, seconds = bundles.build_bundles(fixture_dir / 'bundles', mfl_path, parish_path, optionb_path)
+                print('built %d bundles (%.1f MB) in %.1fs' % (n_bundles, n_bytes / 1e6, seconds))
+                secrets['BUNDLE_DIR'] = str(fixture_dir / 'bundles')
+            st = fake_streamlit.install(secrets)
+            import metrics
+
+            results = list()
+            for r in range(repeat):
+                for i, step in enumerate(sequence):
+                    if cold:
+                        st.clear_cache()
+                    # selectors missing from a step keep their default option, which a search pick may have set
+                    st.selections = { label: step[key] for key, label in SELECTION_LABELS if step.get(key) is not None }
+                    st.session_state.pop('jump_target', None)
+                    st.outputs = list()
+                    metrics.REGISTRY.reset()
+                    ts = perf_counter()
+                    try:
+                        runpy.run_path(str(SCRIPT_PATH), run_name='__main__')
+                    except fake_streamlit.StopScript:
+                        pass
+                    total = perf_counter() - ts
+                    results.append({ 'repeat': r, 'step': i, 'selection': step, 'total_seconds': total, 'stages': histogram_sums(metrics.REGISTRY), 'outputs': len(st.outputs) })
+    return results
+
+def summarise(results):
+    # best time over the repeats for each (step, stage)
+    summary = dict()
+    for res in results:
+        entry = summary.setdefault(res['step'], { 'selection': res['selection'], 'total_seconds': res['total_seconds'], 'stages': dict() })
+        entry['total_seconds'] = min(entry['total_seconds'], res['total_seconds'])
+        for stage, seconds in res['stages'].items():
+            entry['stages'][stage] = min(entry['stages'].get(stage, seconds), seconds)
+    return [summary[k] for k in sorted(summary)]
+
+def selection_label(selection):
+    label = ' > '.join(v for v in (selection.get('district'), selection.get('subcounty'), selection.get('parish')) if v) or 'Uganda'
+    if selection.get('search'):
+        label = 'search %r%s' % (selection['search'], ' pick %d' % selection['search_pick'] if selection.get('search_pick') else '')
+    if selection.get('map_level'):
+        label += ' [%s map: %s]' % (selection['map_level'], selection.get('map_metric') or 'Population')
+    return label
+
+def format_report(summary, baseline=None):
+    lines = list()
+    for i, entry in enumerate(summary):
+        base = baseline[i] if baseline and i < len(baseline) else None
+        lines.append('step %d: %s  total %.4fs%s' % (i, selection_label(entry['selection']), entry['total_seconds'], ' (baseline %.4fs)' % base['total_seconds'] if base else ''))
+        for stage, seconds in sorted(entry['stages'].items()):
+            if base and stage in base['stages']:
+                lines.append('    %-36s %10.4fs  %+8.1f%%' % (stage, seconds, 100.0 * (seconds - base['stages'][stage]) / max(base['stages'][stage], 1e-9)))
+            else:
+                lines.append('    %-36s %10.4fs' % (stage, seconds))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench_render')
+    parser.add_argument('--sequence', help='JSON file with a list of {"district", "subcounty", "parish", "search", ...} selections to replay')
+    parser.add_argument('--repeat', type=int, default=3, help='Replays of the whole sequence (the best time per stage is reported)')
+    parser.add_argument('--cold', action='store_true', default=False, help='Clear the st.cache memo before every step')
+    parser.add_argument('--bundles', action='store_true', default=False, help='Build bundles from the fixtures and run the read-only mode')
+    parser.add_argument('--output', help='Write the summary as JSON to OUTPUT')
+    parser.add_argument('--compare', help='Show the change against a summary previously written with --output')
+    args = parser.parse_args()
+
+    sequence = DEFAULT_SEQUENCE
+    if args.sequence:
+        with open(args.sequence) as sequence_file:
+            sequence = json.load(sequence_file)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    summary = summarise(run(sequence, args.repeat, args.cold, args.bundles))
+    print(format_report(summary, baseline))
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            json.dump(summary, output_file, indent=1)
@@ -0,0 +1,155 @@
+import hashlib
+import pickle
+import sys
+import types
+
+# A stand-in for the parts of the Streamlit API that run_demo.py uses, so the script can be
+# executed headless. Widgets return scripted values and output calls are only counted.
+
+class StopScript(Exception):
+    pass
+
+class SessionState(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+def code_names(code):
+    # the global names a function reads, nested functions and comprehensions included
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+    return names
+
+def hash_value(value, hash_funcs):
+    # like st.cache's hasher: hash_funcs by type first, then the value's bytes (the whole value, so a large
+    # DataFrame or GeoJSON dict costs what it costs there)
+    for value_type, hash_func in hash_funcs.items():
+        if isinstance(value, value_type):
+            value = hash_func(value)
+            break
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        data = repr(value).encode('utf-8')
+    return hashlib.md5(data).hexdigest()
+
+class Container(object):
+    def __init__(self, st):
+        self.st = st
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.st, name)
+
+class FakeStreamlit(types.ModuleType):
+    def __init__(self, secrets=None):
+        super().__init__('streamlit')
+        self.secrets = dict(secrets or {})
+        self.session_state = SessionState(u_passcode='silverado')
+        self.query_params = dict()
+        self.selections = dict() # widget label prefix -> formatted option text (or option position) to choose, or text to type
+        self.outputs = list()
+        self.cache_store = dict()
+        self.components = types.SimpleNamespace(v1=types.SimpleNamespace(html=self.html, declare_component=self.declare_component))
+
+    # caching: memoise for the lifetime of the fake, like st.cache within one server process. The key hashes
+    # the arguments and the values of the module globals the function reads on every call, as st.cache does
+    def cache(self, func=None, hash_funcs=None, **cache_kwargs):
+        hash_funcs = dict(hash_funcs or {})
+        def decorator(f):
+            names = sorted(code_names(f.__code__))
+            def wrap(*args, **kw):
+                data_globals = [(n, f.__globals__[n]) for n in names if n in f.__globals__ and not isinstance(f.__globals__[n], (types.ModuleType, types.FunctionType, type))]
+                key = (f.__module__, f.__qualname__,
+                    tuple(hash_value(a, hash_funcs) for a in args),
+                    tuple((k, hash_value(v, hash_funcs)) for k, v in sorted(kw.items())),
+                    tuple((n, hash_value(v, hash_funcs)) for n, v in data_globals))
+                if key not in self.cache_store:
+                    self.cache_store[key] = f(*args, **kw)
+                return self.cache_store[key]
+            wrap.__wrapped__ = f
+            return wrap
+        if func is not None:
+            return decorator(func)
+        return decorator
+
+    def clear_cache(self):
+        self.cache_store.clear()
+
+    def set_page_config(self, **kwargs):
+        pass
+
+    def experimental_get_query_params(self):
+        return dict(self.query_params)
+
+    def experimental_set_query_params(self, **kwargs):
+        self.query_params = { k: v if isinstance(v, list) else [v] for k, v in kwargs.items() }
+
+    def stop(self):
+        raise StopScript()
+
+    def beta_columns(self, spec):
+        n = spec if isinstance(spec, int) else len(spec)
+        return [Container(self) for _ in range(n)]
+
+    def beta_expander(self, label, expanded=False):
+        self.outputs.append(('expander', label))
+        return Container(self)
+
+    def selectbox(self, label, options, index=0, format_func=str, key=None):
+        options = list(options)
+        wanted = next((v for prefix, v in self.selections.items() if label.startswith(prefix)), None)
+        if isinstance(wanted, int) and not isinstance(wanted, bool):
+            return options[wanted] if wanted < len(options) else None
+        if wanted is not None:
+            for option in options:
+                if format_func(option) == wanted:
+                    return option
+        return options[index] if options else None
+
+    def text_input(self, label, value='', type='default', key=None):
+        if key is not None:
+            return self.session_state.get(key, value)
+        return next((v for prefix, v in self.selections.items() if label.startswith(prefix)), value)
+
+    def radio(self, label, options, index=0, format_func=str, key=None):
+        return self.selectbox(label, options, index, format_func, key)
+
+    def _output(self, kind):
+        def output(*args, **kwargs):
+            self.outputs.append((kind, args[0] if args else None))
+        return output
+
+    def __getattr__(self, name):
+        if name in ('write', 'markdown', 'header', 'subheader', 'title', 'image', 'plotly_chart', 'table', 'dataframe', 'caption', 'warning'):
+            return self._output(name)
+        raise AttributeError(name)
+
+    def html(self, html, height=None, width=None, scrolling=False):
+        self.outputs.append(('html', html))
+
+    def declare_component(self, name, url=None, path=None):
+        # the component's arguments are recorded as its output, its value is always the default
+        def component(key=None, default=None, **kwargs):
+            self.outputs.append(('component', name, kwargs))
+            return default
+        return component
+
+def install(secrets=None):
+    st = FakeStreamlit(secrets)
+    sys.modules['streamlit'] = st
+    sys.modules['streamlit.components'] = st.components
+    sys.modules['streamlit.components.v1'] = st.components.v1
+    return st
@@ -0,0 +1,175 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import urllib.parse
+
+from gazetteer import SUBREGION_REGION
+
+# Orgunit counts of the Uganda eHMIS hierarchy the synthetic trees are scaled from
+UGANDA_ORGUNIT_COUNT = 7970
+UGANDA_DISTRICT_COUNT = 146
+SUBCOUNTIES_PER_DISTRICT = 10
+
+GROUP_SETS = (
+    ('GSopStatus1', 'Operational Status', ('Functional', 'Non-Functional')),
+    ('GSfacLevel1', 'Facility Level', ('HC II', 'HC III', 'HC IV', 'Hospital', 'Clinic')),
+    ('GSownershp1', 'Ownership', ('GOV', 'PNFP', 'PFP')),
+    ('GSauthorty1', 'Authority', ('Government', 'NGO', 'UPDF')),
+)
+
+AGE_GROUPS = ('<2 Months', '2-18 Months', '18 Months+', '<1y', '1-4y', '5-9y', '10-14y', '15+y')
+SEXES = ('Female', 'Male')
+
+def uid(prefix, i):
+    return '%s%010d' % (prefix, i)
+
+def square(lon, lat, size):
+    return { 'type': 'Polygon', 'coordinates': [[[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]] }
+
+def synthetic_orgunits(scale=1.0, seed=1):
+    # national > sub-region > district > subcounty > facility, with the facility count filling up to the target size
+    rnd = random.Random(seed)
+    target = int(UGANDA_ORGUNIT_COUNT * scale)
+    n_districts = max(1, int(UGANDA_DISTRICT_COUNT * scale))
+
+    national = { 'id': 'akV6429SUqu', 'name': 'Uganda', 'code': 'UG', 'ancestors': [], 'organisationUnitGroups': [] }
+    orgunits = [national]
+
+    subregions = list()
+    for i, sr_name in enumerate(SUBREGION_REGION):
+        sr = { 'id': uid('R', i), 'name': sr_name, 'code': 'UG_R%d' % i, 'parent': { 'id': national['id'] }, 'ancestors': [{ 'id': national['id'] }], 'organisationUnitGroups': [] }
+        subregions.append(sr)
+    orgunits.extend(subregions)
+
+    subcounties = list()
+    for d in range(n_districts):
+        sr = subregions[d % len(subregions)]
+        lon, lat = 29.5 + (d % 40) * 0.1, -1.5 + (d // 40) * 0.1
+        district = { 'id': uid('D', d), 'name': 'District %d' % d, 'code': 'UG_D%d' % d, 'parent': { 'id': sr['id'] }, 'ancestors': [{ 'id': national['id'] }, { 'id': sr['id'] }], 'geometry': square(lon, lat, 0.1), 'organisationUnitGroups': [] }
+        orgunits.append(district)
+        for s in range(SUBCOUNTIES_PER_DISTRICT):
+            sc_i = d * SUBCOUNTIES_PER_DISTRICT + s
+            subcounty = { 'id': uid('S', sc_i), 'name': 'Subcounty %d' % sc_i, 'code': 'UG_S%d' % sc_i, 'parent': { 'id': district['id'] }, 'ancestors': district['ancestors'] + [{ 'id': district['id'] }], 'geometry': square(lon + s * 0.01, lat, 0.01), 'organisationUnitGroups': [] }
+            subcounties.append(subcounty)
+    orgunits.extend(subcounties)
+
+    for f in range(max(0, target - len(orgunits))):
+        subcounty = subcounties[f % len(subcounties)]
+        lon, lat = subcounty['geometry']['coordinates'][0][0]
+        groups = [{ 'id': 'G%s%d' % (gs_id, k), 'name': rnd.choice(names), 'groupSets': [{ 'id': gs_id }] } for k, (gs_id, _, names) in enumerate(GROUP_SETS)]
+        groups.append({ 'id': 'GplainGroup', 'name': 'Facilities' })
+        facility = { 'id': uid('F', f), 'name': 'Facility %d HC' % f, 'code': 'UG_F%d' % f, 'parent': { 'id': subcounty['id'] }, 'ancestors': subcounty['ancestors'] + [{ 'id': subcounty['id'] }], 'geometry': { 'type': 'Point', 'coordinates': [lon + rnd.random() * 0.01, lat + rnd.random() * 0.01] }, 'organisationUnitGroups': groups }
+        orgunits.append(facility)
+
+    for i, ou in enumerate(orgunits):
+        ou['lastUpdated'] = '2021-04-01T00:00:00.%03d' % (i % 1000,)
+    return orgunits
+
+def synthetic_group_sets():
+    return [{ 'id': gs_id, 'name': gs_name, 'organisationUnitGroups': [] } for gs_id, gs_name, _ in GROUP_SETS]
+
+def synthetic_dataelements(scale=1.0):
+    cocs = list()
+    for i, (age, sex) in enumerate((a, s) for a in AGE_GROUPS for s in SEXES):
+        cocs.append({ 'id': uid('C', i), 'name': '%s, %s' % (age, sex), 'categoryOptions': [{ 'id': 'A%s' % age, 'name': age }, { 'id': 'S%s' % sex, 'name': sex }] })
+    combo = { 'id': 'CC00000001', 'name': 'Age and Sex', 'categoryOptionCombos': cocs }
+    return [{ 'id': uid('E', i), 'name': 'Data Element %d' % i, 'lastUpdated': '2021-04-01T00:00:00.000', 'categoryCombo': combo } for i in range(max(1, int(1000 * scale)))]
+
+def apply_filters(objects, filters):
+    for f in filters:
+        prop, op, value = f.split(':', 2)
+        if op == 'in':
+            wanted = set(value.strip('[]').split(','))
+            objects = [o for o in objects if str(o.get(prop)) in wanted]
+        elif op == 'eq' and prop == 'level':
+            objects = [o for o in objects if len(o.get('ancestors', [])) + 1 == int(value)]
+        elif op == 'eq':
+            objects = [o for o in objects if str(o.get(prop)) == value]
+    return objects
+
+def analytics_response(rows, query):
+    # rows are [dx, ou, pe, value]; dx and ou dimensions select rows, the pe filter is summed over
+    selected = dict()
+    for dimension in query.get('dimension', []) + query.get('filter', []):
+        name, _, items = dimension.partition(':')
+        selected[name] = set(items.split(';'))
+    values = dict()
+    for dx, ou, pe, value in rows:
+        if all(item in selected.get(name, (item,)) for name, item in (('dx', dx), ('ou', ou), ('pe', pe))):
+            values[(dx, ou)] = values.get((dx, ou), 0.0) + float(value)
+    return {
+        'headers': [{ 'name': 'dx' }, { 'name': 'ou' }, { 'name': 'value' }],
+        'rows': [[dx, ou, str(value)] for (dx, ou), value in values.items()],
+    }
+
+class StubDhis2(object):
+    # serves pre-encoded metadata collections the way the DHIS2 web API does, for benchmarks and offline runs
+    def __init__(self, collections, host='127.0.0.1', port=0):
+        self.collections = collections
+        self.payloads = { name: json.dumps({ name: objects }).encode('utf-8') for name, objects in collections.items() }
+        self.requests = list()
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @classmethod
+    def synthetic(cls, scale=1.0, **kwargs):
+        collections = {
+            'organisationUnits': synthetic_orgunits(scale),
+            'organisationUnitGroupSets': synthetic_group_sets(),
+            'dataElements': synthetic_dataelements(scale),
+            'dataSets': list(),
+        }
+        return cls(collections, **kwargs)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+
+    def respond(self, path, query):
+        name = path.rstrip('/').rsplit('/', 1)[-1].replace('.json', '')
+        if name == 'analytics' and name in self.collections:
+            return 200, json.dumps(analytics_response(self.collections[name], query)).encode('utf-8')
+        if name not in self.collections:
+            return 404, b'{}'
+        if 'pageSize' in query:
+            page_size = int(query['pageSize'][0])
+            objects = sorted(self.collections[name], key=lambda o: o.get('lastUpdated', ''), reverse=True)
+            return 200, json.dumps({ 'pager': { 'page': 1, 'pageSize': page_size, 'total': len(objects) }, name: objects[:page_size] }).encode('utf-8')
+        if 'filter' in query:
+            return 200, json.dumps({ name: apply_filters(self.collections[name], query['filter']) }).encode('utf-8')
+        return 200, self.payloads[name]
+
+    def handler_class(self):
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                stub.requests.append((url.path, query))
+                status, body = stub.respond(url.path, query)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,273 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+import gzip
+import json
+import os
+from pathlib import Path
+import re
+import time
+
+# Pre-rendered, gzip-compressed JSON bundles for a read-only dashboard: one per district (subcounty and
+# parish populations, the OptionB+ cascade cards) and one per parish (the rendered profile pillars), plus
+# an index with the selector lists, the national cards, the map layers and the search entries.
+#
+#   python bundles.py --output bundles/ --mfl UG_MFL_2021-04-21.csv --optionb optionb_plus2.csv
+#
+# and point the dashboard at the directory with the BUNDLE_DIR secret.
+
+BUNDLE_FORMAT = 1
+INDEX_NAME = 'index.json.gz'
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+def slug(name):
+    return NON_ALNUM.sub('-', str(name).casefold()).strip('-')
+
+def district_bundle_path(district_name):
+    return Path('districts') / ('%s.json.gz' % (slug(district_name),))
+
+def parish_bundle_path(district_name, subcounty_name, parish_name):
+    return Path('parishes') / slug(district_name) / ('%s--%s.json.gz' % (slug(subcounty_name), slug(parish_name)))
+
+def map_bundle_path(level):
+    return Path('map') / ('%s.json.gz' % (slug(level),))
+
+def write_bundle(path, obj):
+    # written next to the target and renamed over it, readers never see a partial file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = gzip.compress(json.dumps(obj, separators=(',', ':')).encode('utf-8'), compresslevel=6, mtime=0)
+    tmp_path = path.with_name('%s.%d.tmp' % (path.name, os.getpid()))
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+def read_bundle(path):
+    with gzip.open(path, mode='rt', encoding='utf-8') as bundle_file:
+        return json.load(bundle_file)
+
+def population(rows):
+    return { key: int(sum(row[key] for row in rows)) for key in ('Pop_Male', 'Pop_Female', 'Pop_Total') }
+
+@lru_cache(maxsize=4)
+def _worker_profiles(profiles_path):
+    import parish_profiles
+    return parish_profiles.ParishProfiles(profiles_path)
+
+def build_district(bundle_dir, district, parish_rows, cascade, profiles_path):
+    # runs in a pool worker: everything it needs arrives as plain lists and dicts
+    import optionb
+    import parish_profiles
+
+    bundle_dir = Path(bundle_dir)
+    profiles = _worker_profiles(profiles_path) if profiles_path else None
+    district_name = district['name']
+
+    subcounties = dict() # first-seen order, as the dashboard selectors list them
+    for row in parish_rows:
+        subcounties.setdefault(row['Subcounty'], list()).append(row)
+
+    pmtct_title, pmtct = optionb.pmtct_cards({ de_uid: tuple(v) for de_uid, v in cascade.items() }, district_name)
+    bundle = {
+        'format': BUNDLE_FORMAT,
+        'district': district_name,
+        'uid': district['uid'],
+        'optionb_uid': district['optionb_uid'],
+        'population': population(parish_rows),
+        'subcounties': [{
+            'name': subcounty_name,
+            'county': rows[0]['County'],
+            'population': population(rows),
+            'parishes': [{ 'name': row['Parish'], 'population': population([row]) } for row in rows],
+        } for subcounty_name, rows in subcounties.items()],
+        'pmtct': [pmtct_title, pmtct],
+    }
+    n_bytes = write_bundle(bundle_dir / district_bundle_path(district_name), bundle)
+
+    for row in parish_rows:
+        parish_path = (row['District'], row['Subcounty'], row['Parish'])
+        profile = { key: profiles.render(parish_path, key) if profiles else None for key, _ in parish_profiles.PILLARS }
+        n_bytes += write_bundle(bundle_dir / parish_bundle_path(district_name, row['Subcounty'], row['Parish']), {
+            'format': BUNDLE_FORMAT,
+            'district': district_name,
+            'subcounty': row['Subcounty'],
+            'parish': row['Parish'],
+            'population': population([row]),
+            'profile': profile,
+        })
+    return district_name, len(parish_rows), n_bytes
+
+def layer_columns(df_layer):
+    # the layer table as JSON-safe columns, missing values as null
+    import map_layers
+
+    columns = ['location', 'label', *(key for key, _ in map_layers.layer_metrics(df_layer))]
+    df = df_layer[columns].astype(object)
+    return df.where(df.notnull(), None).to_dict(orient='list')
+
+def build_bundles(bundle_dir, mfl_path, parish_path, optionb_path, profiles_path='parish_profiles.json', parish_geojson_path=None, workers=None, verbose=False, uid_map=None, de_names=None):
+    # uid_map and de_names should be the ones the live dashboard uses (the federated eHMIS -> OptionB+ map,
+    # optionb.de_short_names of the eHMIS data elements); the TT_1 table and the built-in names otherwise
+    import pandas as pd
+
+    import map_layers
+    import optionb
+    import search_index
+
+    uid_map = optionb.EHMIS_OPTIONB_MAP if uid_map is None else uid_map
+    de_names = optionb.PCR_DE_NAMES if de_names is None else de_names
+
+    bundle_dir = Path(bundle_dir)
+    ts = time.perf_counter()
+    df_mfl = pd.read_csv(mfl_path)
+    df_parish = pd.read_csv(parish_path)
+    df_optionb_all = pd.read_csv(optionb_path)
+
+    # districts in the order the live dashboard lists them: MFL district rows that have UBOS populations
+    df_districts = df_mfl[df_mfl['NAME'].isnull() & df_mfl['SUBCOUNTY'].isnull()].dropna(subset=['DISTRICT'])
+    df_district_pop = df_parish[['District', *map_layers.POP_COLUMNS]].groupby(['District',], as_index=False).sum()
+    df_district_pop['DISTRICT'] = df_district_pop['District'] + ' District'
+    df_districts = pd.merge(df_districts, df_district_pop, on=['DISTRICT',])
+
+    parish_columns = ['District', 'County', 'Subcounty', 'Parish', *map_layers.POP_COLUMNS]
+    parishes_by_district = { district: df[parish_columns].to_dict(orient='records') for district, df in df_parish.groupby('District', sort=False) }
+
+    index = {
+        'format': BUNDLE_FORMAT,
+        'built': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'districts': list(),
+        'bundles': dict(),
+    }
+    n_bundles, n_bytes = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = list()
+        for district_name, district_uid in zip(df_districts['DISTRICT'], df_districts['UID']):
+            optionb_uid = uid_map.get(district_uid, district_uid)
+            cascade = optionb.cascade_values(df_optionb_all, optionb_uid, de_names)
+            district = { 'name': district_name, 'uid': district_uid, 'optionb_uid': optionb_uid }
+            parish_rows = parishes_by_district.get(district_name[:-len(' District')], list())
+            futures.append(executor.submit(build_district, str(bundle_dir), district, parish_rows, { k: [n, float(v)] for k, (n, v) in cascade.items() }, profiles_path))
+            index['districts'].append([district_name, district_uid])
+            index['bundles'][district_name] = str(district_bundle_path(district_name))
+
+        # the pool works through the districts while the national layers are built here
+        national = optionb.cascade_values(df_optionb_all, optionb.UG_OU_UID, de_names)
+        index['national'] = { 'uid': optionb.UG_OU_UID, 'pmtct': list(optionb.pmtct_cards(national, 'Uganda')) }
+
+        district_geojson = { 'type': 'FeatureCollection', 'features': [{ 'type': 'Feature', 'id': name, 'geometry': map_layers.polygon_or_none(coordinates), 'properties': {} } for name, coordinates in zip(df_districts['DISTRICT'], df_districts['COORDINATES'])] }
+        layers = { 'District': map_layers.district_layer(df_districts, district_geojson), 'Subcounty': map_layers.subcounty_layer(df_mfl, df_parish) }
+        map_layers.add_tested_per_1000(layers['District'][1], df_optionb_all, optionb.PCR_DE_UIDS[1:5], uid_map)
+        if parish_geojson_path:
+            layers['Parish'] = map_layers.parish_layer(parish_geojson_path, df_parish)
+        index['map'] = dict()
+        for level, (layer_geojson, df_layer) in layers.items():
+            n_bytes += write_bundle(bundle_dir / map_bundle_path(level), { 'format': BUNDLE_FORMAT, 'level': level, 'geojson': layer_geojson, 'columns': layer_columns(df_layer) })
+            index['map'][level] = str(map_bundle_path(level))
+            n_bundles += 1
+
+        places = search_index.build_search_index(df_parish, df_mfl, map_layers.mfl_subcounty_lookup(df_parish, df_mfl))
+        n_bytes += write_bundle(bundle_dir / 'search.json.gz', { 'format': BUNDLE_FORMAT, 'entries': places.entries() })
+        index['search'] = 'search.json.gz'
+        n_bundles += 1
+
+        for future in as_completed(futures):
+            district_name, n_parishes, district_bytes = future.result()
+            n_bundles += 1 + n_parishes
+            n_bytes += district_bytes
+            if verbose:
+                print('%-32s %5d parishes %10d bytes' % (district_name, n_parishes, district_bytes))
+
+    # the index goes last, a directory is only picked up once every bundle it names exists
+    n_bytes += write_bundle(bundle_dir / INDEX_NAME, index)
+    return n_bundles + 1, n_bytes, time.perf_counter() - ts
+
+class BundleStore(object):
+    def __init__(self, bundle_dir):
+        self.bundle_dir = Path(bundle_dir)
+        self.index = read_bundle(self.bundle_dir / INDEX_NAME)
+        if self.index.get('format') != BUNDLE_FORMAT:
+            raise ValueError('%s: bundle format %r, expected %r' % (self.bundle_dir, self.index.get('format'), BUNDLE_FORMAT))
+
+    def districts(self):
+        return [tuple(x) for x in self.index['districts']]
+
+    def national_pmtct(self):
+        return tuple(self.index['national']['pmtct'])
+
+    @lru_cache(maxsize=256)
+    def district(self, district_name):
+        path = self.index['bundles'].get(district_name)
+        return read_bundle(self.bundle_dir / path) if path and (self.bundle_dir / path).exists() else None
+
+    @lru_cache(maxsize=4096)
+    def parish(self, district_name, subcounty_name, parish_name):
+        path = self.bundle_dir / parish_bundle_path(district_name, subcounty_name, parish_name)
+        return read_bundle(path) if path.exists() else None
+
+    @lru_cache(maxsize=8)
+    def map_layer(self, level):
+        # (geojson, DataFrame) like map_layers' builders
+        import pandas as pd
+
+        bundle = read_bundle(self.bundle_dir / self.index['map'][level])
+        return bundle['geojson'], pd.DataFrame(bundle['columns'])
+
+    def map_levels(self):
+        return list(self.index['map'])
+
+    @lru_cache(maxsize=1)
+    def search_index(self):
+        import search_index
+        return search_index.from_entries(read_bundle(self.bundle_dir / self.index['search'])['entries'])
+
+    def version(self):
+        return self.index['built']
+
+    def __str__(self):
+        return 'BundleStore(%s, districts: %d, built: %s)' % (self.bundle_dir, len(self.index['districts']), self.index['built'])
+
+def open_bundle_store(bundle_dir):
+    # None while the directory holds no complete build: the index is written last
+    index_path = Path(bundle_dir) / INDEX_NAME
+    return BundleStore(bundle_dir) if index_path.exists() else None
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='bundles')
+    parser.add_argument('--output', required=True, help='Directory to write the bundles to')
+    parser.add_argument('--mfl', default='UG_MFL_2021-04-21.csv', help='MFL export (dhis2.py) with district and subcounty polygons')
+    parser.add_argument('--parish', default='ubos_parish/ALL_POP.csv', help='UBOS parish populations')
+    parser.add_argument('--optionb', default='optionb_plus2.csv', help='OptionB+ values by data element and orgunit')
+    parser.add_argument('--profiles', default='parish_profiles.json', help='Parish profiles')
+    parser.add_argument('--parish-geojson', help='UBOS parish boundaries, enables the parish map layer')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--verbose', action='store_true', default=False, help='Report every district bundle')
+    parser.add_argument('--server', help='eHMIS server URL, the data element names are read from it like the live dashboard does')
+    parser.add_argument('--auth', default=':', help='USER:PASSWORD for the eHMIS server')
+    parser.add_argument('--cassette', help='Replay or record the eHMIS traffic with this cassette URL (see cassette.py)')
+    parser.add_argument('--optionb-server', help='OptionB+ server URL, the district UID map is matched against it (TT_1 otherwise)')
+    parser.add_argument('--optionb-auth', default=':', help='USER:PASSWORD for the OptionB+ server')
+    parser.add_argument('--optionb-cassette', help='Replay or record the OptionB+ traffic with this cassette URL')
+    parser.add_argument('--cache', help='Metadata cache URL, e.g. sqlite:///metadata.sqlite')
+    args = parser.parse_args()
+
+    uid_map, de_names = None, None
+    if args.server:
+        import cassette
+        import dhis2
+        import federation
+        import metadata_cache
+        import optionb
+
+        cache = metadata_cache.open_cache(args.cache) if args.cache else None
+        ehmis = dhis2.Dhis2(args.server, tuple(args.auth.split(':', 1)), cache=cache, cassette=cassette.open_cassette(args.cassette))
+        de_names = optionb.de_short_names(ehmis.dataelements(ids=optionb.PCR_DE_UIDS, fields='id,name'))
+        if args.optionb_server:
+            optionb_server = dhis2.Dhis2(args.optionb_server, tuple(args.optionb_auth.split(':', 1)), cache=cache, cassette=cassette.open_cassette(args.optionb_cassette))
+            uid_map = federation.optionb_federation(ehmis, optionb_server).load().uid_map('optionb')
+    elif args.optionb_server:
+        parser.error('--optionb-server needs --server, the UID map is keyed on eHMIS UIDs')
+
+    n_bundles, n_bytes, seconds = build_bundles(args.output, args.mfl, args.parish, args.optionb, args.profiles, args.parish_geojson, args.workers, args.verbose, uid_map, de_names)
+    print('%d bundles, %.1f MB in %.1fs' % (n_bundles, n_bytes / 1e6, seconds))
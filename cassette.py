@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import urllib.parse
+import zlib
+
+# Record/replay of DHIS2 API traffic. A cassette is a directory holding index.json, which maps each
+# request (method, path, sorted params, body hash) to a response, and objects/, which holds the response
+# bodies compressed and named by their sha256, so identical responses are stored once.
+#
+# Modes: 'record' always calls the server and stores the response; 'replay' never calls the server and
+# raises CassetteMiss for a request that was not recorded; 'auto' replays what is there and records the rest.
+# With scale > 1, organisationUnits responses are replayed as a tree about `scale` times the size: every
+# orgunit below the sub-regions (districts, subcounties, facilities) is repeated with the UID suffix
+# '~1', '~2', ... and the name suffix ' #1', ' #2', ...
+
+CASSETTE_FORMAT = 1
+SHARED_LEVELS = 2 # national and sub-region orgunits are not replicated when scaling
+MODES = ('record', 'replay', 'auto')
+
+class CassetteMiss(KeyError):
+    pass
+
+def request_key(method, path, query_params=None, body=None):
+    params = list()
+    for k in sorted(query_params or {}):
+        v = query_params[k]
+        params.extend((k, str(x)) for x in (v if isinstance(v, (list, tuple)) else [v]))
+    key = '%s %s' % (method, path)
+    if params:
+        key += '?' + urllib.parse.urlencode(params)
+    if body:
+        key += ' #' + hashlib.sha256(body if isinstance(body, bytes) else str(body).encode('utf-8')).hexdigest()[:16]
+    return key
+
+def response(status, content, content_type, url):
+    import requests
+
+    r = requests.models.Response()
+    r.status_code = status
+    r._content = content
+    r.headers['Content-Type'] = content_type
+    r.url = url
+    r.encoding = 'utf-8'
+    return r
+
+def replica_uid(uid, r):
+    return uid if r == 0 else '%s~%d' % (uid, r)
+
+def original_uid(uid):
+    return uid.split('~', 1)[0]
+
+def scale_orgunits(orgunits, scale, shared):
+    # replica r of every orgunit refers to replica r of its parent, ancestors and children, except for shared ones
+    def ref(uid, r):
+        return uid if uid in shared else replica_uid(uid, r)
+
+    scaled = list(orgunits)
+    for r in range(1, scale):
+        for ou in orgunits:
+            if ou.get('id') in shared:
+                continue
+            ou = dict(ou)
+            ou['id'] = replica_uid(ou['id'], r)
+            if 'name' in ou:
+                ou['name'] = '%s #%d' % (ou['name'], r)
+            if 'code' in ou and ou['code']:
+                ou['code'] = '%s_%d' % (ou['code'], r)
+            if ou.get('parent'):
+                ou['parent'] = dict(ou['parent'], id=ref(ou['parent']['id'], r))
+            if 'ancestors' in ou:
+                ou['ancestors'] = [dict(a, id=ref(a['id'], r)) for a in ou['ancestors']]
+            if 'children' in ou:
+                ou['children'] = [dict(c, id=ref(c['id'], r)) for c in ou['children']]
+            if 'path' in ou:
+                ou['path'] = '/'.join(ref(p, r) if p else p for p in ou['path'].split('/'))
+            scaled.append(ou)
+    return scaled
+
+def filter_orgunits(orgunits, filters):
+    # the subset of DHIS2 metadata filters the dashboard uses: id:in:[...] and level:eq:N
+    for f in filters:
+        prop, op, value = f.split(':', 2)
+        if prop == 'id' and op == 'in':
+            wanted = set(value.strip('[]').split(','))
+            orgunits = [ou for ou in orgunits if ou.get('id') in wanted]
+        elif prop == 'level' and op == 'eq':
+            orgunits = [ou for ou in orgunits if ou.get('level', len(ou.get('ancestors', [])) + 1) == int(value)]
+        else:
+            raise ValueError(f'Unsupported filter "{f}" when scaling a recorded orgunit tree')
+    return orgunits
+
+class Cassette(object):
+    def __init__(self, cassette_dir, mode='auto', scale=1):
+        if mode not in MODES:
+            raise ValueError(f'Unsupported cassette mode "{mode}" (expected one of {", ".join(MODES)})')
+        if scale != 1 and mode != 'replay':
+            raise ValueError('Scaling is only supported when replaying')
+        self.cassette_dir = Path(cassette_dir)
+        self.mode = mode
+        self.scale = int(scale)
+        self.__lock = threading.Lock()
+        self.__shared = None
+        self.__interactions = dict()
+        index_path = self.cassette_dir / 'index.json'
+        if index_path.exists():
+            with open(index_path) as index_file:
+                self.__interactions = json.load(index_file)['interactions']
+        elif mode == 'replay':
+            raise FileNotFoundError(f'No cassette at "{self.cassette_dir}"')
+
+    def __object_path(self, digest):
+        return self.cassette_dir / 'objects' / digest[:2] / digest[2:]
+
+    def __load(self, entry):
+        with open(self.__object_path(entry['sha256']), mode='rb') as object_file:
+            return zlib.decompress(object_file.read())
+
+    def __store(self, key, method, path, status, content, content_type):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self.__object_path(digest)
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = object_path.with_name('%s.%d.%d.tmp' % (object_path.name, os.getpid(), threading.get_ident()))
+            tmp_path.write_bytes(zlib.compress(content, 6))
+            os.replace(tmp_path, object_path)
+        with self.__lock:
+            self.__interactions[key] = { 'method': method, 'path': path, 'status': status, 'content_type': content_type, 'sha256': digest, 'bytes': len(content) }
+            # other recorders (processes) may have written the index since it was loaded, their entries are kept;
+            # os.replace swaps the whole file so a reader never sees a partial one
+            index_path = self.cassette_dir / 'index.json'
+            if index_path.exists():
+                with open(index_path) as index_file:
+                    self.__interactions = dict(json.load(index_file)['interactions'], **self.__interactions)
+            tmp_path = index_path.with_name('index.json.%d.%d.tmp' % (os.getpid(), threading.get_ident()))
+            with open(tmp_path, mode='w') as index_file:
+                json.dump({ 'format': CASSETTE_FORMAT, 'interactions': self.__interactions }, index_file, indent=1, sort_keys=True)
+            os.replace(tmp_path, index_path)
+
+    def shared(self):
+        # UIDs of the orgunits down to SHARED_LEVELS, from the ancestor lists and levels of every recorded orgunit
+        if self.__shared is None:
+            shared = set()
+            for entry in list(self.__interactions.values()):
+                if entry['path'].endswith('organisationUnits.json') and entry['status'] == 200:
+                    for ou in json.loads(self.__load(entry)).get('organisationUnits', []):
+                        ancestors = ou.get('ancestors')
+                        if ancestors is not None:
+                            shared.update(a['id'] for a in ancestors[:SHARED_LEVELS])
+                        level = ou.get('level', len(ancestors) + 1 if ancestors is not None else None)
+                        if level is not None and level <= SHARED_LEVELS:
+                            shared.add(ou['id'])
+            self.__shared = shared
+        return self.__shared
+
+    def __replay_scaled(self, method, path, query_params, body):
+        # look up the request with every synthetic UID mapped back to its recorded original, falling back
+        # to the unfiltered recording; the scaled tree is then filtered here
+        params = dict(query_params or {})
+        filters = params.pop('filter', None)
+        candidates = list()
+        if filters is not None:
+            filters = list(filters) if isinstance(filters, (list, tuple)) else [filters]
+            original = [f if not f.startswith('id:in:') else 'id:in:[%s]' % (','.join(dict.fromkeys(original_uid(x) for x in f[len('id:in:'):].strip('[]').split(','))),) for f in filters]
+            # a recording made with the same filters only needs the synthetic UIDs picked out
+            candidates.append((dict(params, filter=original), [f for f in filters if f.startswith('id:in:')]))
+        candidates.append((params, filters or []))
+        for candidate_params, local_filters in candidates:
+            entry = self.__interactions.get(request_key(method, path, candidate_params, body))
+            if entry is None:
+                continue
+            content = self.__load(entry)
+            if entry['status'] != 200:
+                return entry, content
+            res = json.loads(content)
+            if 'organisationUnits' in res:
+                orgunits = filter_orgunits(scale_orgunits(res['organisationUnits'], self.scale, self.shared()), local_filters)
+                if 'pageSize' in params:
+                    orgunits = orgunits[:int(params['pageSize'])]
+                res['organisationUnits'] = orgunits
+            if 'total' in res.get('pager', {}):
+                res['pager'] = dict(res['pager'], total=res['pager']['total'] * self.scale)
+            return entry, json.dumps(res).encode('utf-8')
+        return None, None
+
+    def request(self, method, path, query_params=None, body=None, send=None, url=None):
+        # send() performs the real request and returns a requests.Response
+        key = request_key(method, path, query_params, body)
+        if self.mode != 'record':
+            if self.scale > 1 and path.endswith('organisationUnits.json'):
+                entry, content = self.__replay_scaled(method, path, query_params, body)
+            else:
+                entry = self.__interactions.get(key)
+                content = self.__load(entry) if entry is not None else None
+            if entry is not None:
+                return response(entry['status'], content, entry['content_type'], url or path)
+            if self.mode == 'replay':
+                raise CassetteMiss(f'No recorded response for "{key}" in cassette "{self.cassette_dir}"')
+
+        r = send()
+        self.__store(key, method, path, r.status_code, r.content, r.headers.get('Content-Type', 'application/json'))
+        return r
+
+    def __len__(self):
+        return len(self.__interactions)
+
+    def __str__(self):
+        return 'Cassette(%s, mode: %s, scale: %d, interactions: %d)' % (self.cassette_dir, self.mode, self.scale, len(self.__interactions))
+
+def open_cassette(cassette_url):
+    # '<mode>:///<path>[?scale=N]' like the metadata cache URLs, e.g. 'auto:///cassettes/ehmis' (relative)
+    # or 'replay:////var/lib/parish_demo/ehmis?scale=10' (absolute)
+    if not cassette_url:
+        return None
+    mode, sep, rest = cassette_url.partition(':///')
+    if not sep or mode not in MODES:
+        raise ValueError(f'Unsupported cassette URL "{cassette_url}" (expected "<record|replay|auto>:///<path>[?scale=N]")')
+    path, _, query = rest.partition('?')
+    scale = int(urllib.parse.parse_qs(query).get('scale', ['1'])[0])
+    return Cassette(path, mode, scale)
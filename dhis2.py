@@ -1,15 +1,24 @@
 from functools import lru_cache
 import json
-import pickle
 from pathlib import Path
-import urllib
+import urllib.parse
 
-import requests
-ses = requests.Session() # create and cache single session for entire script run
+import metrics
+
+# requests, pickle, the thread pool and numpy (packed geometries) are imported on first use, keeping `import dhis2` cheap
+ses = None
+
+def session():
+    global ses
+    if ses is None:
+        import requests
+        ses = requests.Session() # create and cache single session for entire script run
+    return ses
 
 API_PATH = 'api/' #'api/29/'
 
-from district_regions import *
+OU_FIELDS = 'id,name,code,parent,ancestors,geometry,organisationUnitGroups[id,name,groupSets]'
+DE_FIELDS = 'id,name,categoryCombo[id,name,categoryOptionCombos[id,name,categoryOptions[id,name]]]'
 
 INDICATOR_ALIASES = dict()
 AGE_GROUP_ALIASES = dict()
@@ -41,7 +50,7 @@ class OrgUnit(object):
         self.orgunits = orgunits
         self.attribs = dict()
         self.groups = list()
-        for ou_g in self.obj_tree['organisationUnitGroups']:
+        for ou_g in self.obj_tree.get('organisationUnitGroups', []):
             if 'groupSets' in ou_g:
                 if len(ou_g['groupSets']) > 0:
                     g_set = ou_g['groupSets'][0]
@@ -55,39 +64,81 @@ class OrgUnit(object):
             return self.obj_tree[key]
         elif key in self.attribs:
             return self.attribs[key]
-        else:
+        geom = self.geometry() if key == 'geometry' else None
+        if geom is None:
             raise KeyError(key)
+        return geom
+
+    def get(self, key, default=None):
+        if key == 'geometry' and key not in self.obj_tree:
+            geom = self.geometry()
+            return default if geom is None else geom
+        return self.obj_tree.get(key, default)
 
-    def get(self, *args, **kwargs):
-        return self.obj_tree.get(*args, **kwargs)
+    def geometry(self):
+        # GeoJSON rebuilt from the packed arrays on every call, only for the orgunits that need it
+        return self.orgunits.geometry(self.obj_tree['id'])
     
     def ancestor_path(self):
         return tuple(self.orgunits[p['id']]['name'] for p in self.obj_tree['ancestors'])
     
     def __str__(self):
         non_attribs = { k:v for k,v in self.obj_tree.items() if k not in ('dataSets', 'organisationUnitGroups') }
+        geom = self.geometry()
+        if geom is not None:
+            non_attribs['geometry'] = geom
         non_attribs['organisationUnitGroups'] = self.groups
         # return str({ **non_attribs, **self.attribs })
         return json.dumps({ **non_attribs, **self.attribs })
 
+def metadata_params(fields, ids=None, level=None):
+    params = { 'fields': fields, 'paging': 'false' }
+    filters = list()
+    if ids is not None:
+        filters.append('id:in:[%s]' % (','.join(ids),))
+    if level is not None:
+        filters.append('level:eq:%d' % (level,))
+    if filters:
+        params['filter'] = filters
+    return params
+
+def without_geometry(ou):
+    if 'geometry' not in ou:
+        return ou
+    ou = dict(ou)
+    del ou['geometry']
+    return ou
+
+GEOMETRY_DTYPE = 'float64' # 'float32' halves the coordinates again, at ~0.2 m precision
+
 class OrgUnits(object):
-    def __init__(self, server_instance):
+    def __init__(self, server_instance, ids=None, level=None, fields=OU_FIELDS, geometry_dtype=GEOMETRY_DTYPE):
+        import geometry
+
         self.server_instance = server_instance
 
-        params = { 'fields': 'id,name,code,parent,ancestors,geometry,organisationUnitGroups[id,name,groupSets]', 'paging': 'false' }
-        res = server_instance.api_get(API_PATH + 'organisationUnits.json', params)
-        self.__ou_cache = res.json()['organisationUnits']
+        params = metadata_params(fields, ids, level)
+        ou_cache = server_instance.get_metadata('organisationUnits', params)['organisationUnits']
+        # geometries are held packed (geometry.py) with one bbox each instead of as nested lists in every
+        # obj_tree; the response may be shared with the metadata cache, so the dicts are copied, not edited
+        self.geometries = geometry.pack([ou.get('geometry') for ou in ou_cache], dtype=geometry_dtype)
+        self.bboxes = geometry.bboxes(self.geometries)
+        self.__ou_cache = [without_geometry(ou) for ou in ou_cache]
         self.__name_map = dict()
         self.__id_map = dict()
+        self.__index = dict()
 
-        for ou in self.__ou_cache:
+        for i, ou in enumerate(self.__ou_cache):
             self.__id_map[ou['id']] = ou
             self.__name_map[ou['name']] = ou
-
-        # OU_GROUP_SET_MAP
-        params = { 'fields': 'id,name,organisationUnitGroups[id,name]', 'paging': 'false' }
-        res = server_instance.api_get(API_PATH + 'organisationUnitGroupSets.json', params)
-        self.OU_GROUP_SET_MAP = { ou_gs['id']:ou_gs['name'] for ou_gs in res.json()['organisationUnitGroupSets'] }
+            self.__index[ou['id']] = i
+
+        # OU_GROUP_SET_MAP (only needed when the groups were requested)
+        self.OU_GROUP_SET_MAP = dict()
+        if 'organisationUnitGroups' in fields:
+            params = { 'fields': 'id,name,organisationUnitGroups[id,name]', 'paging': 'false' }
+            res = server_instance.get_metadata('organisationUnitGroupSets', params)
+            self.OU_GROUP_SET_MAP = { ou_gs['id']:ou_gs['name'] for ou_gs in res['organisationUnitGroupSets'] }
     
     def __getitem__(self, key):
         if isinstance(key, int):
@@ -113,13 +164,28 @@ class OrgUnits(object):
         if isinstance(item, str):
             return item in self.__id_map
             
-        return false
+        return False
 
     def __iter__(self):
         return (OrgUnit(ou, self) for ou in self.__ou_cache)
 
     def __len__(self):
         return len(self.__ou_cache)
+
+    def geometry(self, ou_id):
+        # GeoJSON geometry dict, or None for an orgunit without one
+        import geometry
+        return geometry.unpack(self.geometries, self.__index[ou_id])
+
+    def in_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        # the orgunits whose bounding box intersects the given one
+        import geometry
+        return [OrgUnit(self.__ou_cache[i], self) for i in geometry.bbox_mask(self.bboxes, min_lon, min_lat, max_lon, max_lat).nonzero()[0]]
+
+    def centroids(self):
+        # (N, 2) lon, lat in iteration order, NaN for orgunits without a geometry
+        import geometry
+        return geometry.centroids(self.geometries)
     
     def ancestor_path(self, ou_name):
         return tuple(self[p['id']]['name'] for p in self.lookup_name(ou_name)['ancestors'])
@@ -132,8 +198,7 @@ class DataSets(object):
         self.server_instance = server_instance
 
         params = { 'fields':'id,name,dataSetElements', 'paging': 'false' }
-        res = server_instance.api_get(API_PATH + 'dataSets.json', params)
-        self.__ds_cache = res.json()['dataSets']
+        self.__ds_cache = server_instance.get_metadata('dataSets', params)['dataSets']
         self.__name_map = dict()
         self.__id_map = dict()
 
@@ -160,12 +225,11 @@ def repair(string):
     #just use json.loads(repair(line))
 
 class DataElements(object):
-    def __init__(self, server_instance):
+    def __init__(self, server_instance, ids=None, fields=DE_FIELDS):
         self.server_instance = server_instance
 
-        params = { 'fields':'id,name,categoryCombo[id,name,categoryOptionCombos[id,name,categoryOptions[id,name]]]', 'paging': 'false' }
-        res = server_instance.api_get(API_PATH + 'dataElements.json', params)
-        self.__de_cache = res.json()['dataElements']
+        params = metadata_params(fields, ids)
+        self.__de_cache = server_instance.get_metadata('dataElements', params)['dataElements']
         self.__name_map = dict()
         self.__id_map = dict()
 
@@ -179,6 +243,12 @@ class DataElements(object):
         else:
             return self.__id_map[key]
 
+    def __contains__(self, item):
+        return item in self.__id_map
+
+    def __len__(self):
+        return len(self.__de_cache)
+
     def lookup_name(self, de_name):
         alias = INDICATOR_ALIASES.get(de_name)
         if alias:
@@ -193,40 +263,65 @@ class DataElements(object):
     def __str__(self):
         return 'server_url: %s, size: %d' % (self.server_instance.server_url, len(self.__de_cache))
 
-from functools import wraps
-from time import time
-
-def timing(f):
-    @wraps(f)
-    def wrap(*args, **kw):
-        ts = time()
-        result = f(*args, **kw)
-        te = time()
-        print('func:%r args:[%r, %r] took: %2.4f sec' % (f.__name__, args, kw, te-ts))
-        return result
-    return wrap
+timing = metrics.timed('dhis2_call') # records into the metrics registry instead of printing
 
 class Dhis2(object):
-    def __init__(self, server_url, credentials, cache_dir=None):
+    def __init__(self, server_url, credentials, cache_dir=None, cache=None, cassette=None):
         self.server_url = server_url
         self.credentials = credentials
         self.cache_dir = cache_dir
+        self.cache = cache # shared metadata_cache backend, keyed on the metadata version
+        self.cassette = cassette # cassette.Cassette recording or replaying every API request
 
     def api_get(self, path, query_params):
         req_url = urllib.parse.urljoin(self.server_url, path)
-        r = ses.get(req_url, params=query_params, auth=self.credentials)
+        url = metrics.url_template(path)
+        with metrics.span('dhis2_api_request', method='GET', url=url) as span:
+            if self.cassette is not None:
+                r = self.cassette.request('GET', path, query_params, url=req_url, send=lambda: session().get(req_url, params=query_params, auth=self.credentials))
+            else:
+                r = session().get(req_url, params=query_params, auth=self.credentials)
+            span.update(status=r.status_code, bytes=len(r.content))
+        metrics.inc('dhis2_api_response_bytes_total', len(r.content), method='GET', url=url)
         r.raise_for_status() # throw exception if there is a problem
         return r
 
     def api_post(self, path, query_params=None, custom_headers=None, post_data=None):
         req_url = urllib.parse.urljoin(self.server_url, path)
-        r = ses.post(req_url, params=query_params, auth=self.credentials, headers=custom_headers, data=post_data)
+        url = metrics.url_template(path)
+        with metrics.span('dhis2_api_request', method='POST', url=url) as span:
+            if self.cassette is not None:
+                r = self.cassette.request('POST', path, query_params, post_data, url=req_url, send=lambda: session().post(req_url, params=query_params, auth=self.credentials, headers=custom_headers, data=post_data))
+            else:
+                r = session().post(req_url, params=query_params, auth=self.credentials, headers=custom_headers, data=post_data)
+            span.update(status=r.status_code, bytes=len(r.content), request_bytes=len(post_data or b''))
+        metrics.inc('dhis2_api_response_bytes_total', len(r.content), method='POST', url=url)
         r.raise_for_status() # throw exception if there is a problem
         return r
 
+    def metadata_version(self, resource):
+        # the newest lastUpdated plus the object count changes on every edit, addition and deletion
+        params = { 'fields': 'lastUpdated', 'order': 'lastUpdated:desc', 'pageSize': 1 }
+        res = self.api_get(API_PATH + resource + '.json', params).json()
+        items = res.get(resource, [])
+        last_updated = items[0].get('lastUpdated', '') if items else ''
+        return '%s/%s' % (last_updated, res.get('pager', {}).get('total', len(items)))
+
+    def get_metadata(self, resource, query_params):
+        path = API_PATH + resource + '.json'
+        if self.cache is None:
+            return self.api_get(path, query_params).json()
+
+        version = self.metadata_version(resource)
+        key = urllib.parse.urljoin(self.server_url, path) + '?' + json.dumps(query_params, sort_keys=True)
+        return self.cache.get_or_set('dhis2_metadata', key, version, lambda: self.api_get(path, query_params).json())
+
     @timing
-    def orgunits(self):
+    def orgunits(self, ids=None, level=None, fields=OU_FIELDS):
+        if ids is not None or level is not None or fields != OU_FIELDS:
+            return OrgUnits(self, ids, level, fields)
         if self.cache_dir:
+            import pickle
             if Path(self.cache_dir / 'orgunits.pickle').exists():
                 with open(self.cache_dir / 'orgunits.pickle', mode='rb') as pkf:
                     return pickle.load(pkf)
@@ -240,11 +335,20 @@ class Dhis2(object):
     def datasets(self):
         return DataSets(self)
     @timing
-    def dataelements(self):
-        return DataElements(self)
+    def dataelements(self, ids=None, fields=DE_FIELDS):
+        return DataElements(self, ids, fields)
+
+    def __getstate__(self):
+        # pickled with the OrgUnits/DataElements snapshots the refreshers persist in the shared metadata
+        # cache, so nothing secret goes along: an unpickled instance only knows its server_url
+        state = dict(self.__dict__)
+        state['credentials'] = None
+        state['cache'] = None # cache backends hold open connections
+        state['cassette'] = None
+        return state
 
     def __str__(self):
-        return "Dhis2(u'%s', ('%s', 'XXXXXX'))" % (str(self.server_url), str(self.credentials[0]))
+        return "Dhis2(u'%s', ('%s', 'XXXXXX'))" % (str(self.server_url), str(self.credentials[0]) if self.credentials else '')
 
 def load_mappings(mappings_dir_path):
     # Load organisation unit mappings
@@ -252,10 +356,33 @@ def load_mappings(mappings_dir_path):
         dict_ou = dict(json.load(file_ou))
         ORGUNIT_ALIASES.update(dict_ou)
 
+MFL_COLUMNS = ("REGION","SUB_REGION","DISTRICT","SUBCOUNTY","NAME","UID","COORDINATES","OPERATIONAL STATUS", "FACILITY_LEVEL","OWNERSHIP_NAME","AUTHORITY_NAME")
+
+def export_mfl(orgunits, csvfile, limit=-1):
+    import csv
+    from gazetteer import SUBREGION_REGION
+
+    csvwriter = csv.writer(csvfile, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    csvwriter.writerow(MFL_COLUMNS)
+
+    for i, ou in enumerate(orgunits):
+        ou_name, ou_id, ou_geometry = [ou.get(x, '') for x in ('name', 'id', 'geometry')] # GeoJSON only from here on
+        ou_path = ou.ancestor_path() + (ou_name,)
+        if len(ou_path) > 1:
+            # add the missing 'REGION' section of the 
+            ou_path = ou_path[:1] + (SUBREGION_REGION[ou_path[1]], ) + ou_path[1:]
+        if len(ou_path) < 6:
+            ou_path = ou_path + ('',) * (6 - len(ou_path)) # pad out short orgunit paths
+        ou_path = ou_path[1:]
+        ou_attribs = [ou.attribs.get(x, '') for x in ('Operational Status', 'Facility Level', 'Ownership', 'Authority')]
+        csvwriter.writerow((*ou_path, ou_id, json.dumps(ou_geometry), *ou_attribs))
+
+        if limit > 0 and i >= limit:
+            break
+
 if __name__ == "__main__":
     import argparse
     import sys
-    import csv
     from pathlib import Path
     import datetime
 
@@ -270,14 +397,17 @@ if __name__ == "__main__":
     parser.add_argument('--cached', action='store_true', default=False, help='Load metadata from cache')
     parser.add_argument('--metadata', action='store_true', default=False, help='Stop processing after loading metadata')
     parser.add_argument('--limit', type=int, default=-1, help='Only process LIMIT entries')
+    parser.add_argument('--gazetteer', action='store_true', default=False, help='Regenerate gazetteer.py from the orgunit hierarchy and stop')
+    parser.add_argument('--cassette', help='Record or replay the API traffic, e.g. "auto:///cassettes/ehmis" (see cassette.py)')
     args = parser.parse_args()
 
     base_path, *_ = [p for p in Path(__file__).resolve().parents if p.is_dir()] # extra complications in case we are in a zip archive module
 
+    from cassette import open_cassette
     if args.cached:
-        dhis2_inst = Dhis2(DHIS2_SERVER_URL, credentials, base_path)
+        dhis2_inst = Dhis2(DHIS2_SERVER_URL, credentials, base_path, cassette=open_cassette(args.cassette))
     else:
-        dhis2_inst = Dhis2(DHIS2_SERVER_URL, credentials)
+        dhis2_inst = Dhis2(DHIS2_SERVER_URL, credentials, cassette=open_cassette(args.cassette))
 
     load_mappings(base_path)
 
@@ -291,27 +421,16 @@ if __name__ == "__main__":
 
     kisiizi = orgunits.lookup_name('Cou Kisiizi Hospital')
 
+    if args.gazetteer:
+        import gazetteer
+        import make_gazetteer
+        make_gazetteer.write_gazetteer(base_path / 'gazetteer.py', DHIS2_SERVER_URL, *make_gazetteer.from_orgunits(orgunits, gazetteer.SUBREGION_REGION))
+        sys.exit()
+
     if args.metadata:
         sys.exit()
 
     OUTPUT_FILE = 'UG_MFL_%s.csv' % (datetime.date.today().isoformat(),)
 
     with open(base_path / OUTPUT_FILE, mode='w') as csvfile:
-        csvwriter = csv.writer(csvfile, quoting=csv.QUOTE_ALL, lineterminator='\n')
-        csvwriter.writerow(("REGION","SUB_REGION","DISTRICT","SUBCOUNTY","NAME","UID","COORDINATES","OPERATIONAL STATUS", "FACILITY_LEVEL","OWNERSHIP_NAME","AUTHORITY_NAME"))
-
-        for i, ou_tree in enumerate(orgunits):
-            ou = OrgUnit(ou_tree, orgunits)
-            ou_name, ou_id, ou_geometry = [ou.get(x, '') for x in ('name', 'id', 'geometry')]
-            ou_path = ou.ancestor_path() + (ou_name,)
-            if len(ou_path) > 1:
-                # add the missing 'REGION' section of the 
-                ou_path = ou_path[:1] + (SUBREGION_REGION[ou_path[1]], ) + ou_path[1:]
-            if len(ou_path) < 6:
-                ou_path = ou_path + ('',) * (6 - len(ou_path)) # pad out short orgunit paths
-            ou_path = ou_path[1:]
-            ou_attribs = [ou.attribs.get(x, '') for x in ('Operational Status', 'Facility Level', 'Ownership', 'Authority')]
-            csvwriter.writerow((*ou_path, ou_id, json.dumps(ou_geometry), *ou_attribs))
-
-            if args.limit > 0 and i >= args.limit:
-                break
+        export_mfl(orgunits, csvfile, args.limit)
@@ -0,0 +1,268 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from admin_names import normalise_admin_name
+from dhis2 import API_PATH, metadata_params
+import metrics
+import optionb
+
+# Several DHIS2 instances (the national eHMIS, the OptionB+ server, ...) behind one orgunit space. The
+# canonical instance's UIDs are the ones the dashboard uses; every other instance's orgunits are matched
+# onto them by name, walking both hierarchies from the root down, and analytics requests are sent to the
+# instance holding the data with their orgunit UIDs translated both ways. The dashboard only uses the UID
+# maps (optionb_federation); analytics() is for library callers, run_demo.py reads OptionB+ values from the CSV export.
+#
+#   fed = Federation({ 'ehmis': ehmis, 'optionb': optionb_server }, canonical='ehmis', overrides={ 'optionb': EHMIS_OPTIONB_MAP })
+#   fed.load()
+#   fed.to_instance('optionb', district_uid)
+
+FED_FIELDS = 'id,name,level,parent'
+
+def orgunit_levels(orgunits):
+    # DHIS2 returns 'level'; fall back to the depth in the parent chain when the field is missing
+    by_id = { ou['id']: ou for ou in orgunits }
+    levels = dict()
+    def level(ou):
+        if ou['id'] not in levels:
+            if 'level' in ou:
+                levels[ou['id']] = ou['level']
+            elif 'ancestors' in ou:
+                levels[ou['id']] = len(ou['ancestors']) + 1
+            else:
+                parent = by_id.get((ou.get('parent') or {}).get('id'))
+                levels[ou['id']] = level(parent) + 1 if parent else 1
+        return levels[ou['id']]
+    for ou in orgunits:
+        level(ou)
+    return levels
+
+def unique_names(orgunits):
+    # normalised name -> UID, leaving out names that are ambiguous within the group
+    names = dict()
+    for ou in orgunits:
+        key = normalise_admin_name(ou['name'])
+        names[key] = None if key in names else ou['id']
+    return { k: v for k, v in names.items() if v is not None }
+
+def match_orgunits(canonical, foreign):
+    # foreign UID -> canonical UID: roots first, then children by name under already matched parents, then
+    # whatever is left by name when unique within a level of both trees; never across unrelated levels
+    mapping = dict()
+    trees = list()
+    for orgunits in (canonical, foreign):
+        levels = orgunit_levels(orgunits)
+        children = dict()
+        for ou in orgunits:
+            children.setdefault((ou.get('parent') or {}).get('id'), list()).append(ou)
+        trees.append((levels, children))
+    (c_levels, c_children), (f_levels, f_children) = trees
+
+    def pair(f_uid, c_uid):
+        if f_uid not in mapping and c_uid not in matched:
+            mapping[f_uid] = c_uid
+            matched.add(c_uid)
+            return True
+        return False
+
+    matched = set()
+    c_roots, f_roots = c_children.get(None, []), f_children.get(None, [])
+    queue = list()
+    if len(c_roots) == 1 and len(f_roots) == 1:
+        queue.append((f_roots[0]['id'], c_roots[0]['id']))
+    else:
+        c_names = unique_names(c_roots)
+        queue.extend((f_uid, c_names[name]) for name, f_uid in unique_names(f_roots).items() if name in c_names)
+    while queue:
+        f_uid, c_uid = queue.pop()
+        if not pair(f_uid, c_uid):
+            continue
+        c_names = unique_names(c_children.get(c_uid, []))
+        queue.extend((f_child, c_names[name]) for name, f_child in unique_names(f_children.get(f_uid, [])).items() if name in c_names)
+
+    # the rest by name when unique among the candidate levels: the same level, then the canonical level the
+    # foreign level's matches mostly sit on, then the neighbouring levels, for instances whose hierarchy
+    # leaves out or adds a level
+    def level_offsets():
+        offsets = dict()
+        for f_uid, c_uid in mapping.items():
+            offsets.setdefault(f_levels[f_uid], Counter())[c_levels[c_uid] - f_levels[f_uid]] += 1
+        return { level: (level + counts.most_common(1)[0][0],) for level, counts in offsets.items() }
+
+    for candidate_levels in (lambda level: (level,), lambda level: offsets.get(level, ()), lambda level: (level - 1, level, level + 1)):
+        offsets = level_offsets()
+        c_groups, f_groups = dict(), dict()
+        for ou in canonical:
+            if ou['id'] not in matched:
+                c_groups.setdefault(c_levels[ou['id']], list()).append(ou)
+        for ou in foreign:
+            if ou['id'] not in mapping:
+                f_groups.setdefault(candidate_levels(f_levels[ou['id']]), list()).append(ou)
+        for levels, orgunits in f_groups.items():
+            c_names = unique_names([c_ou for level in levels for c_ou in c_groups.get(level, [])])
+            for name, f_uid in unique_names(orgunits).items():
+                if name in c_names:
+                    pair(f_uid, c_names[name])
+    return mapping
+
+def optionb_federation(ehmis, optionb_server):
+    # the pair the dashboard and the bundle builder use: eHMIS UIDs canonical, TT_1 over the matching and
+    # the EID data elements read from the OptionB+ server
+    instances = { 'ehmis': ehmis, 'optionb': optionb_server }
+    routes = { de_uid: 'optionb' for de_uid in optionb.PCR_DE_UIDS }
+    return Federation(instances, 'ehmis', overrides={ 'optionb': optionb.EHMIS_OPTIONB_MAP }, routes=routes)
+
+class Federation(object):
+    def __init__(self, instances, canonical, overrides=None, routes=None, workers=4):
+        # instances: name -> Dhis2; overrides: name -> { canonical UID: instance UID } applied over the
+        # automatic matching (the hand-made TT_1 table); routes: data element UID -> instance name
+        self.instances = dict(instances)
+        self.canonical = canonical
+        self.overrides = overrides or dict()
+        self.routes = dict(routes or {})
+        self.workers = workers
+        self.__to_canonical = dict() # name -> { instance UID: canonical UID }
+        self.__to_instance = dict() # name -> { canonical UID: instance UID }
+        self.__dataelements = dict()
+
+    def __executor(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='federation')
+
+    def load(self):
+        # every instance's orgunit tree is fetched concurrently; the UID maps are cached in the canonical
+        # instance's metadata cache, keyed on the orgunit versions of every instance
+        names = list(self.instances)
+        with metrics.span('federation_load', instances=len(names)):
+            canonical_instance = self.instances[self.canonical]
+            cache = getattr(canonical_instance, 'cache', None)
+            if cache is not None:
+                with self.__executor() as executor:
+                    versions = list(executor.map(lambda name: self.instances[name].metadata_version('organisationUnits'), names))
+                key = json.dumps([(name, self.instances[name].server_url) for name in names])
+                maps = cache.get_or_set('federation_uid_maps', key, '|'.join(versions), self.__build_maps)
+            else:
+                maps = self.__build_maps()
+        for name, mapping in maps.items():
+            mapping = dict(mapping)
+            for c_uid, f_uid in self.overrides.get(name, {}).items():
+                for stale in [f for f, c in mapping.items() if c == c_uid]:
+                    del mapping[stale]
+                mapping[f_uid] = c_uid
+            self.__to_canonical[name] = mapping
+            self.__to_instance[name] = { c: f for f, c in mapping.items() }
+            metrics.observe('federation_matched_orgunits', len(mapping), instance=name)
+        return self
+
+    def __build_maps(self):
+        with self.__executor() as executor:
+            trees = dict(zip(self.instances, executor.map(lambda name: self.instances[name].get_metadata('organisationUnits', metadata_params(FED_FIELDS))['organisationUnits'], self.instances)))
+        maps = { self.canonical: { ou['id']: ou['id'] for ou in trees[self.canonical] } }
+        for name, orgunits in trees.items():
+            if name != self.canonical:
+                maps[name] = match_orgunits(trees[self.canonical], orgunits)
+        return maps
+
+    def orgunits(self):
+        # the canonical orgunit space
+        return self.instances[self.canonical].orgunits(fields=FED_FIELDS)
+
+    def to_canonical(self, name, uid):
+        return self.__to_canonical[name].get(uid)
+
+    def to_instance(self, name, uid):
+        return self.__to_instance[name].get(uid)
+
+    def uid_map(self, name):
+        # { canonical UID: instance UID }, like EHMIS_OPTIONB_MAP
+        return dict(self.__to_instance[name])
+
+    def route(self, de_uids):
+        # instance name -> data element UIDs; unrouted data elements go to the first instance that has them
+        routed, unrouted = dict(), list()
+        for de_uid in de_uids:
+            if de_uid in self.routes:
+                routed.setdefault(self.routes[de_uid], list()).append(de_uid)
+            else:
+                unrouted.append(de_uid)
+        if unrouted:
+            with self.__executor() as executor:
+                known = dict(zip(self.instances, executor.map(lambda name: self.__known_dataelements(name, unrouted), self.instances)))
+            for de_uid in unrouted:
+                name = next((n for n in self.instances if de_uid in known[n]), self.canonical)
+                self.routes[de_uid] = name
+                routed.setdefault(name, list()).append(de_uid)
+        return routed
+
+    def __known_dataelements(self, name, de_uids):
+        missing = [de_uid for de_uid in de_uids if (name, de_uid) not in self.__dataelements]
+        if missing:
+            found = set(de['id'] for de in self.instances[name].get_metadata('dataElements', { 'fields': 'id', 'paging': 'false', 'filter': 'id:in:[%s]' % (','.join(missing),) })['dataElements'])
+            for de_uid in missing:
+                self.__dataelements[(name, de_uid)] = de_uid in found
+        return set(de_uid for de_uid in de_uids if self.__dataelements[(name, de_uid)])
+
+    def __analytics_one(self, name, de_uids, ou_uids, periods, params):
+        instance = self.instances[name]
+        ou_local = [self.to_instance(name, uid) for uid in ou_uids]
+        ou_local = [uid for uid in ou_local if uid]
+        if not ou_local:
+            return name, list()
+        query = dict(params or {})
+        query['dimension'] = ['dx:' + ';'.join(de_uids), 'ou:' + ';'.join(ou_local)]
+        query['filter'] = ['pe:' + ';'.join(periods)]
+        res = instance.api_get(API_PATH + 'analytics.json', query).json()
+        headers = [h['name'] for h in res.get('headers', [])]
+        dx, ou, value = headers.index('dx'), headers.index('ou'), headers.index('value')
+        return name, [(row[dx], self.to_canonical(name, row[ou]), float(row[value])) for row in res.get('rows', [])]
+
+    def analytics(self, de_uids, ou_uids, periods, params=None):
+        # [(data element, canonical orgunit, value)] from whichever instances hold the data elements
+        routed = self.route(de_uids)
+        with metrics.span('federation_analytics', instances=len(routed)):
+            with self.__executor() as executor:
+                results = list(executor.map(lambda item: self.__analytics_one(item[0], item[1], ou_uids, periods, params), routed.items()))
+        return [row for _, rows in results for row in rows if row[1] is not None]
+
+    def analytics_table(self, de_uids, ou_uids, periods, params=None):
+        # the analytics values in the layout of the OptionB+ CSV export, with canonical orgunit UIDs
+        import pandas as pd
+
+        return pd.DataFrame(self.analytics(de_uids, ou_uids, periods, params), columns=['Data', 'Organisation unit', 'Value'])
+
+    def __str__(self):
+        return 'Federation(canonical: %s, instances: %s)' % (self.canonical, ', '.join('%s=%s' % (n, i.server_url) for n, i in self.instances.items()))
+
+if __name__ == '__main__':
+    import argparse
+
+    import cassette
+    import dhis2
+    import metadata_cache
+
+    parser = argparse.ArgumentParser(prog='federation')
+    parser.add_argument('--ehmis', required=True, help='eHMIS server URL (canonical UIDs)')
+    parser.add_argument('--ehmis-auth', default=':', help='USER:PASSWORD for the eHMIS server')
+    parser.add_argument('--ehmis-cassette', help='Replay or record the eHMIS traffic with this cassette URL (see cassette.py)')
+    parser.add_argument('--optionb', required=True, help='OptionB+ server URL')
+    parser.add_argument('--optionb-auth', default=':', help='USER:PASSWORD for the OptionB+ server')
+    parser.add_argument('--optionb-cassette', help='Replay or record the OptionB+ traffic with this cassette URL')
+    parser.add_argument('--cache', help='Metadata cache URL, e.g. sqlite:///metadata.sqlite')
+    parser.add_argument('--output', help='Write the eHMIS -> OptionB+ UID map as CSV to OUTPUT')
+    args = parser.parse_args()
+
+    cache = metadata_cache.open_cache(args.cache) if args.cache else None
+    instances = {
+        'ehmis': dhis2.Dhis2(args.ehmis, tuple(args.ehmis_auth.split(':', 1)), cache=cache, cassette=cassette.open_cassette(args.ehmis_cassette)),
+        'optionb': dhis2.Dhis2(args.optionb, tuple(args.optionb_auth.split(':', 1)), cache=cache, cassette=cassette.open_cassette(args.optionb_cassette)),
+    }
+    # matched without the TT_1 overrides first, to report which hand-made rows the matching gets right by itself
+    fed = Federation(instances, 'ehmis').load()
+    automatic = fed.uid_map('optionb')
+    agree = [name for name, ehmis_uid, optionb_uid in optionb.TT_1 if automatic.get(ehmis_uid) == optionb_uid]
+    fed = optionb_federation(instances['ehmis'], instances['optionb']).load()
+    uid_map = fed.uid_map('optionb')
+    print('%s: %d orgunits matched, %d of %d TT_1 rows matched by name' % (fed, len(uid_map), len(agree), len(optionb.TT_1)))
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            output_file.write('ehmis_uid,optionb_uid\n')
+            output_file.writelines('%s,%s\n' % item for item in sorted(uid_map.items()))
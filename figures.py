@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import importlib.util
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+
+import metrics
+
+# Choropleth maps are rendered straight from cached JSON fragments with plotly.js, so a rerun that does
+# not change the map does no plotly validation and no GeoJSON serialisation. The GeoJSON fragment is
+# serialised once per geometry version and shared by reference between every metric drawn on it.
+#
+# The figure JSON is drawn by a small static Streamlit component (component_dir) holding the installed
+# plotly package's plotly.js: the browser loads it once and caches it, no CDN is needed, and a rerun that
+# changes the metric only sends the figure, which the component redraws in place with Plotly.react.
+
+MAP_LAYOUT = {
+    'mapbox': { 'style': 'carto-positron', 'zoom': 5.5, 'center': { 'lat': 0.6226, 'lon': 32.3271 } },
+    'margin': { 'r': 0, 't': 0, 'l': 0, 'b': 0 },
+}
+
+COMPONENT_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="plotly.min.js"></script>
+<style>body { margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+function post(type, data) {
+    window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), '*');
+}
+var shown = null;
+window.addEventListener('message', function (event) {
+    if (event.data.type !== 'streamlit:render') {
+        return;
+    }
+    var args = event.data.args;
+    document.getElementById('map').style.height = args.height + 'px';
+    if (args.figure !== shown) {
+        shown = args.figure;
+        var fig = JSON.parse(args.figure);
+        Plotly.react('map', fig.data, fig.layout, { responsive: true });
+    }
+    post('streamlit:setFrameHeight', { height: args.height });
+});
+post('streamlit:componentReady', { apiVersion: 1 });
+</script>
+</body>
+</html>
+'''
+
+PLACEHOLDERS = ('__GEOJSON__', '__LOCATIONS__', '__Z__')
+
+def component_dir(root=None):
+    # index.html plus the plotly.min.js of the installed plotly package (found without importing plotly),
+    # written once per plotly.js file; pass the result to components.declare_component(path=...)
+    plotly_js = Path(importlib.util.find_spec('plotly').submodule_search_locations[0]) / 'package_data' / 'plotly.min.js'
+    stat = plotly_js.stat()
+    path = Path(root or tempfile.gettempdir()) / ('figure_component-%d-%d' % (stat.st_size, stat.st_mtime_ns))
+    if not (path / 'index.html').exists():
+        tmp_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=path.name + '.'))
+        shutil.copyfile(plotly_js, tmp_path / 'plotly.min.js')
+        (tmp_path / 'index.html').write_text(COMPONENT_HTML)
+        try:
+            tmp_path.rename(path)
+        except OSError: # written by another process in the meantime
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+def dumps(obj):
+    # '</' is escaped so that the JSON stays safe to splice into a <script> element ('</script>' in a name)
+    from plotly.utils import PlotlyJSONEncoder
+    return json.dumps(obj, cls=PlotlyJSONEncoder, separators=(',', ':')).replace('</', '<\\/')
+
+def figure_shell(trace_kwargs, layout):
+    # validate the trace once with plotly (named colorscales are resolved here), leaving holes for the payload
+    import plotly.graph_objs as go
+
+    trace = go.Choroplethmapbox(**trace_kwargs).to_plotly_json()
+    trace['geojson'], trace['locations'], trace['z'] = PLACEHOLDERS
+    shell = dumps({ 'data': [trace], 'layout': layout })
+    # split the JSON on the quoted placeholders: prefix, geojson, middle, locations, middle, z, suffix
+    parts = list()
+    for p in PLACEHOLDERS:
+        head, shell = shell.split(json.dumps(p), 1)
+        parts.append(head)
+    parts.append(shell)
+    return tuple(parts)
+
+class FigureCache(object):
+    def __init__(self, maxsize=64, max_geometries=6):
+        self.maxsize = maxsize
+        self.max_geometries = max_geometries # a few MB each at parish level
+        self.__lock = threading.Lock()
+        self.__shells = OrderedDict() # (level, trace kwargs) -> JSON fragments around the payload
+        self.__geometry = OrderedDict() # (level, geometry_version) -> (geojson JSON, locations JSON)
+        self.__values = OrderedDict() # (level, metric, geometry_version) -> z JSON
+
+    def __lru_get(self, entries, key):
+        with self.__lock:
+            value = entries.get(key)
+            if value is not None:
+                entries.move_to_end(key)
+            return value
+
+    def __lru_set(self, entries, maxsize, key, value):
+        with self.__lock:
+            entries[key] = value
+            while len(entries) > maxsize:
+                entries.popitem(last=False)
+
+    def figure_json(self, level, metric, geometry_version, geojson, locations, z, layout=MAP_LAYOUT, **trace_kwargs):
+        # geojson, locations and z are only serialised on a miss for their key
+        shell_key = (level, json.dumps(trace_kwargs, sort_keys=True), json.dumps(layout, sort_keys=True))
+        shell = self.__lru_get(self.__shells, shell_key)
+        if shell is None:
+            metrics.inc('figure_cache_requests_total', part='shell', result='miss')
+            shell = figure_shell(trace_kwargs, layout)
+            self.__lru_set(self.__shells, self.maxsize, shell_key, shell)
+        else:
+            metrics.inc('figure_cache_requests_total', part='shell', result='hit')
+
+        geometry_key = (level, geometry_version)
+        geometry = self.__lru_get(self.__geometry, geometry_key)
+        if geometry is None:
+            metrics.inc('figure_cache_requests_total', part='geometry', result='miss')
+            geometry = (dumps(geojson), dumps(list(locations)))
+            self.__lru_set(self.__geometry, self.max_geometries, geometry_key, geometry)
+        else:
+            metrics.inc('figure_cache_requests_total', part='geometry', result='hit')
+
+        values_key = (level, metric, geometry_version)
+        values = self.__lru_get(self.__values, values_key)
+        if values is None:
+            metrics.inc('figure_cache_requests_total', part='values', result='miss')
+            values = dumps(list(z))
+            self.__lru_set(self.__values, self.maxsize, values_key, values)
+        else:
+            metrics.inc('figure_cache_requests_total', part='values', result='hit')
+
+        prefix, mid_1, mid_2, suffix = shell
+        geojson_json, locations_json = geometry
+        return ''.join((prefix, geojson_json, mid_1, locations_json, mid_2, values, suffix))
+
+    def __str__(self):
+        return 'FigureCache(shells: %d, geometries: %d, values: %d)' % (len(self.__shells), len(self.__geometry), len(self.__values))
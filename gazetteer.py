@@ -0,0 +1,300 @@
+# Generated by make_gazetteer.py from UG_MFL_2021-04-01_nopoly.csv - do not edit by hand.
+# Regenerate with: python make_gazetteer.py <MFL csv>  (or: python dhis2.py --gazetteer)
+
+REGIONS = ('Central Region', 'Eastern Region', 'Northern Region', 'Western Region')
+
+SUBREGION_REGION = {
+    'Acholi': 'Northern Region',
+    'Ankole': 'Western Region',
+    'Bugisu': 'Eastern Region',
+    'Bukedi': 'Eastern Region',
+    'Bunyoro': 'Western Region',
+    'Busoga': 'Eastern Region',
+    'Kampala': 'Central Region',
+    'Karamoja': 'Northern Region',
+    'Kigezi': 'Western Region',
+    'Lango': 'Northern Region',
+    'North Central': 'Central Region',
+    'South Central': 'Central Region',
+    'Teso': 'Eastern Region',
+    'Tooro': 'Western Region',
+    'West Nile': 'Northern Region',
+}
+
+DISTRICT_SUBREGION = {
+    'Abim District': 'Karamoja',
+    'Adjumani District': 'West Nile',
+    'Agago District': 'Acholi',
+    'Alebtong District': 'Lango',
+    'Amolatar District': 'Lango',
+    'Amudat District': 'Karamoja',
+    'Amuria District': 'Teso',
+    'Amuru District': 'Acholi',
+    'Apac District': 'Lango',
+    'Arua District': 'West Nile',
+    'Budaka District': 'Bukedi',
+    'Bududa District': 'Bugisu',
+    'Bugiri District': 'Busoga',
+    'Bugweri District': 'Busoga',
+    'Buhweju District': 'Ankole',
+    'Buikwe District': 'North Central',
+    'Bukedea District': 'Teso',
+    'Bukomansimbi District': 'South Central',
+    'Bukwo District': 'Bugisu',
+    'Bulambuli District': 'Bugisu',
+    'Buliisa District': 'Bunyoro',
+    'Bundibugyo District': 'Tooro',
+    'Bunyangabu District': 'Tooro',
+    'Bushenyi District': 'Ankole',
+    'Busia District': 'Bukedi',
+    'Butaleja District': 'Bukedi',
+    'Butambala District': 'South Central',
+    'Butebo District': 'Bukedi',
+    'Buvuma District': 'North Central',
+    'Buyende District': 'Busoga',
+    'Dokolo District': 'Lango',
+    'Gomba District': 'South Central',
+    'Gulu District': 'Acholi',
+    'Hoima District': 'Bunyoro',
+    'Ibanda District': 'Ankole',
+    'Iganga District': 'Busoga',
+    'Isingiro District': 'Ankole',
+    'Jinja District': 'Busoga',
+    'Kaabong District': 'Karamoja',
+    'Kabale District': 'Kigezi',
+    'Kabarole District': 'Tooro',
+    'Kaberamaido District': 'Teso',
+    'Kagadi District': 'Bunyoro',
+    'Kakumiro District': 'Bunyoro',
+    'Kalaki District': 'Teso',
+    'Kalangala District': 'South Central',
+    'Kaliro District': 'Busoga',
+    'Kalungu District': 'South Central',
+    'Kampala District': 'Kampala',
+    'Kamuli District': 'Busoga',
+    'Kamwenge District': 'Tooro',
+    'Kanungu District': 'Kigezi',
+    'Kapchorwa District': 'Bugisu',
+    'Kapelebyong District': 'Teso',
+    'Karenga District': 'Karamoja',
+    'Kasese District': 'Tooro',
+    'Kassanda District': 'North Central',
+    'Katakwi District': 'Teso',
+    'Kayunga District': 'North Central',
+    'Kazo District': 'Ankole',
+    'Kibaale District': 'Bunyoro',
+    'Kiboga District': 'North Central',
+    'Kibuku District': 'Bukedi',
+    'Kikuube District': 'Bunyoro',
+    'Kiruhura District': 'Ankole',
+    'Kiryandongo District': 'Bunyoro',
+    'Kisoro District': 'Kigezi',
+    'Kitagwenda District': 'Tooro',
+    'Kitgum District': 'Acholi',
+    'Koboko District': 'West Nile',
+    'Kole District': 'Lango',
+    'Kotido District': 'Karamoja',
+    'Kumi District': 'Teso',
+    'Kwania District': 'Lango',
+    'Kween District': 'Bugisu',
+    'Kyankwanzi District': 'North Central',
+    'Kyegegwa District': 'Tooro',
+    'Kyenjojo District': 'Tooro',
+    'Kyotera District': 'South Central',
+    'Lamwo District': 'Acholi',
+    'Lira District': 'Lango',
+    'Luuka District': 'Busoga',
+    'Luwero District': 'North Central',
+    'Lwengo District': 'South Central',
+    'Lyantonde District': 'South Central',
+    'Madi-Okollo District': 'West Nile',
+    'Manafwa District': 'Bugisu',
+    'Maracha District': 'West Nile',
+    'Masaka District': 'South Central',
+    'Masindi District': 'Bunyoro',
+    'Mayuge District': 'Busoga',
+    'Mbale District': 'Bugisu',
+    'Mbarara District': 'Ankole',
+    'Mitooma District': 'Ankole',
+    'Mityana District': 'North Central',
+    'Moroto District': 'Karamoja',
+    'Moyo District': 'West Nile',
+    'Mpigi District': 'South Central',
+    'Mubende District': 'North Central',
+    'Mukono District': 'North Central',
+    'Nabilatuk District': 'Karamoja',
+    'Nakapiripirit District': 'Karamoja',
+    'Nakaseke District': 'North Central',
+    'Nakasongola District': 'North Central',
+    'Namayingo District': 'Busoga',
+    'Namisindwa District': 'Bugisu',
+    'Namutumba District': 'Busoga',
+    'Napak District': 'Karamoja',
+    'Nebbi District': 'West Nile',
+    'Ngora District': 'Teso',
+    'Ntoroko District': 'Tooro',
+    'Ntungamo District': 'Ankole',
+    'Nwoya District': 'Acholi',
+    'Obongi District': 'West Nile',
+    'Omoro District': 'Acholi',
+    'Otuke District': 'Lango',
+    'Oyam District': 'Lango',
+    'Pader District': 'Acholi',
+    'Pakwach District': 'West Nile',
+    'Pallisa District': 'Bukedi',
+    'Rakai District': 'South Central',
+    'Rubanda District': 'Kigezi',
+    'Rubirizi District': 'Ankole',
+    'Rukiga District': 'Kigezi',
+    'Rukungiri District': 'Kigezi',
+    'Rwampara District': 'Ankole',
+    'Sembabule District': 'South Central',
+    'Serere District': 'Teso',
+    'Sheema District': 'Ankole',
+    'Sironko District': 'Bugisu',
+    'Soroti District': 'Teso',
+    'Terego District': 'West Nile',
+    'Tororo District': 'Bukedi',
+    'Wakiso District': 'South Central',
+    'Yumbe District': 'West Nile',
+    'Zombo District': 'West Nile',
+}
+
+DISTRICT_REGION = {
+    'Abim District': 'Northern Region',
+    'Adjumani District': 'Northern Region',
+    'Agago District': 'Northern Region',
+    'Alebtong District': 'Northern Region',
+    'Amolatar District': 'Northern Region',
+    'Amudat District': 'Northern Region',
+    'Amuria District': 'Eastern Region',
+    'Amuru District': 'Northern Region',
+    'Apac District': 'Northern Region',
+    'Arua District': 'Northern Region',
+    'Budaka District': 'Eastern Region',
+    'Bududa District': 'Eastern Region',
+    'Bugiri District': 'Eastern Region',
+    'Bugweri District': 'Eastern Region',
+    'Buhweju District': 'Western Region',
+    'Buikwe District': 'Central Region',
+    'Bukedea District': 'Eastern Region',
+    'Bukomansimbi District': 'Central Region',
+    'Bukwo District': 'Eastern Region',
+    'Bulambuli District': 'Eastern Region',
+    'Buliisa District': 'Western Region',
+    'Bundibugyo District': 'Western Region',
+    'Bunyangabu District': 'Western Region',
+    'Bushenyi District': 'Western Region',
+    'Busia District': 'Eastern Region',
+    'Butaleja District': 'Eastern Region',
+    'Butambala District': 'Central Region',
+    'Butebo District': 'Eastern Region',
+    'Buvuma District': 'Central Region',
+    'Buyende District': 'Eastern Region',
+    'Dokolo District': 'Northern Region',
+    'Gomba District': 'Central Region',
+    'Gulu District': 'Northern Region',
+    'Hoima District': 'Western Region',
+    'Ibanda District': 'Western Region',
+    'Iganga District': 'Eastern Region',
+    'Isingiro District': 'Western Region',
+    'Jinja District': 'Eastern Region',
+    'Kaabong District': 'Northern Region',
+    'Kabale District': 'Western Region',
+    'Kabarole District': 'Western Region',
+    'Kaberamaido District': 'Eastern Region',
+    'Kagadi District': 'Western Region',
+    'Kakumiro District': 'Western Region',
+    'Kalaki District': 'Eastern Region',
+    'Kalangala District': 'Central Region',
+    'Kaliro District': 'Eastern Region',
+    'Kalungu District': 'Central Region',
+    'Kampala District': 'Central Region',
+    'Kamuli District': 'Eastern Region',
+    'Kamwenge District': 'Western Region',
+    'Kanungu District': 'Western Region',
+    'Kapchorwa District': 'Eastern Region',
+    'Kapelebyong District': 'Eastern Region',
+    'Karenga District': 'Northern Region',
+    'Kasese District': 'Western Region',
+    'Kassanda District': 'Central Region',
+    'Katakwi District': 'Eastern Region',
+    'Kayunga District': 'Central Region',
+    'Kazo District': 'Western Region',
+    'Kibaale District': 'Western Region',
+    'Kiboga District': 'Central Region',
+    'Kibuku District': 'Eastern Region',
+    'Kikuube District': 'Western Region',
+    'Kiruhura District': 'Western Region',
+    'Kiryandongo District': 'Western Region',
+    'Kisoro District': 'Western Region',
+    'Kitagwenda District': 'Western Region',
+    'Kitgum District': 'Northern Region',
+    'Koboko District': 'Northern Region',
+    'Kole District': 'Northern Region',
+    'Kotido District': 'Northern Region',
+    'Kumi District': 'Eastern Region',
+    'Kwania District': 'Northern Region',
+    'Kween District': 'Eastern Region',
+    'Kyankwanzi District': 'Central Region',
+    'Kyegegwa District': 'Western Region',
+    'Kyenjojo District': 'Western Region',
+    'Kyotera District': 'Central Region',
+    'Lamwo District': 'Northern Region',
+    'Lira District': 'Northern Region',
+    'Luuka District': 'Eastern Region',
+    'Luwero District': 'Central Region',
+    'Lwengo District': 'Central Region',
+    'Lyantonde District': 'Central Region',
+    'Madi-Okollo District': 'Northern Region',
+    'Manafwa District': 'Eastern Region',
+    'Maracha District': 'Northern Region',
+    'Masaka District': 'Central Region',
+    'Masindi District': 'Western Region',
+    'Mayuge District': 'Eastern Region',
+    'Mbale District': 'Eastern Region',
+    'Mbarara District': 'Western Region',
+    'Mitooma District': 'Western Region',
+    'Mityana District': 'Central Region',
+    'Moroto District': 'Northern Region',
+    'Moyo District': 'Northern Region',
+    'Mpigi District': 'Central Region',
+    'Mubende District': 'Central Region',
+    'Mukono District': 'Central Region',
+    'Nabilatuk District': 'Northern Region',
+    'Nakapiripirit District': 'Northern Region',
+    'Nakaseke District': 'Central Region',
+    'Nakasongola District': 'Central Region',
+    'Namayingo District': 'Eastern Region',
+    'Namisindwa District': 'Eastern Region',
+    'Namutumba District': 'Eastern Region',
+    'Napak District': 'Northern Region',
+    'Nebbi District': 'Northern Region',
+    'Ngora District': 'Eastern Region',
+    'Ntoroko District': 'Western Region',
+    'Ntungamo District': 'Western Region',
+    'Nwoya District': 'Northern Region',
+    'Obongi District': 'Northern Region',
+    'Omoro District': 'Northern Region',
+    'Otuke District': 'Northern Region',
+    'Oyam District': 'Northern Region',
+    'Pader District': 'Northern Region',
+    'Pakwach District': 'Northern Region',
+    'Pallisa District': 'Eastern Region',
+    'Rakai District': 'Central Region',
+    'Rubanda District': 'Western Region',
+    'Rubirizi District': 'Western Region',
+    'Rukiga District': 'Western Region',
+    'Rukungiri District': 'Western Region',
+    'Rwampara District': 'Western Region',
+    'Sembabule District': 'Central Region',
+    'Serere District': 'Eastern Region',
+    'Sheema District': 'Western Region',
+    'Sironko District': 'Eastern Region',
+    'Soroti District': 'Eastern Region',
+    'Terego District': 'Northern Region',
+    'Tororo District': 'Eastern Region',
+    'Wakiso District': 'Central Region',
+    'Yumbe District': 'Northern Region',
+    'Zombo District': 'Northern Region',
+}
@@ -0,0 +1,243 @@
+import numpy as np
+
+# GeoJSON geometries packed into flat arrays: every coordinate pair in one (N, 2) array, with offset
+# arrays marking where each ring, polygon part and geometry starts. Whole-collection operations
+# (areas, simplification) then run as a handful of numpy calls instead of Python loops over polygons.
+
+EARTH_RADIUS_KM = 6371.0088
+
+POINT, LINESTRING, POLYGON, MULTIPOINT, MULTILINESTRING, MULTIPOLYGON = range(6)
+GEOMETRY_TYPES = ('Point', 'LineString', 'Polygon', 'MultiPoint', 'MultiLineString', 'MultiPolygon')
+GEOMETRY_TYPE_CODES = { name: code for code, name in enumerate(GEOMETRY_TYPES) }
+
+class PackedGeometry(object):
+    def __init__(self, coords, ring_offsets, part_offsets, geom_offsets, geom_types):
+        self.coords = coords # (N, 2) lon, lat
+        self.ring_offsets = ring_offsets # (R + 1,) first coordinate of each ring
+        self.part_offsets = part_offsets # (P + 1,) first ring of each part (polygon, line or point)
+        self.geom_offsets = geom_offsets # (G + 1,) first part of each geometry
+        self.geom_types = geom_types # (G,) GEOMETRY_TYPES codes, -1 for a missing geometry
+
+    def __len__(self):
+        return len(self.geom_types)
+
+    def ring_lengths(self):
+        return np.diff(self.ring_offsets)
+
+    def ring_geometry_index(self):
+        parts_per_geom = np.diff(self.geom_offsets)
+        part_geom = np.repeat(np.arange(len(self.geom_types)), parts_per_geom)
+        return np.repeat(part_geom, np.diff(self.part_offsets))
+
+    def coord_offsets(self):
+        # (G + 1,) first coordinate of each geometry
+        return self.ring_offsets[self.part_offsets[self.geom_offsets]]
+
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.coords, self.ring_offsets, self.part_offsets, self.geom_offsets, self.geom_types))
+
+    def ring_is_exterior(self):
+        is_exterior = np.zeros(len(self.ring_offsets) - 1, dtype=bool)
+        is_exterior[self.part_offsets[:-1][np.diff(self.part_offsets) > 0]] = True
+        return is_exterior
+
+    def __str__(self):
+        return 'PackedGeometry(geometries: %d, parts: %d, rings: %d, coordinates: %d)' % (len(self.geom_types), len(self.part_offsets) - 1, len(self.ring_offsets) - 1, len(self.coords))
+
+def _parts(geometry):
+    # (type code, [part: [ring: [[lon, lat], ...]]]) with points and lines as single-ring parts
+    if not geometry:
+        return -1, []
+    gtype, coordinates = GEOMETRY_TYPE_CODES[geometry['type']], geometry['coordinates']
+    if gtype == POINT:
+        return gtype, [[[coordinates]]]
+    if gtype in (LINESTRING, MULTIPOINT):
+        return gtype, [[coordinates]] if gtype == LINESTRING else [[[c]] for c in coordinates]
+    if gtype == POLYGON:
+        return gtype, [coordinates]
+    if gtype == MULTILINESTRING:
+        return gtype, [[line] for line in coordinates]
+    return gtype, coordinates
+
+def pack(geometries, dtype=np.float64):
+    # geometries are GeoJSON geometry dicts, or None for orgunits without one. unpack() gives back the same
+    # structure with float coordinates: float input (what DHIS2 returns) round-trips exactly at float64,
+    # integer coordinates come back as floats (30 -> 30.0) and float32 rounds to ~1e-7 degrees
+    coords, ring_lengths, rings_per_part, parts_per_geom, geom_types = list(), list(), list(), list(), list()
+    for geometry in geometries:
+        gtype, parts = _parts(geometry)
+        geom_types.append(gtype)
+        parts_per_geom.append(len(parts))
+        for part in parts:
+            rings_per_part.append(len(part))
+            for ring in part:
+                ring_lengths.append(len(ring))
+                coords.extend(ring)
+
+    def offsets(lengths):
+        out = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=out[1:])
+        return out
+
+    coords = np.asarray(coords, dtype=dtype).reshape(-1, 2)
+    return PackedGeometry(coords, offsets(ring_lengths), offsets(rings_per_part), offsets(parts_per_geom), np.asarray(geom_types, dtype=np.int8))
+
+def unpack(packed, i):
+    gtype = int(packed.geom_types[i])
+    if gtype < 0:
+        return None
+    parts = list()
+    for p in range(packed.geom_offsets[i], packed.geom_offsets[i + 1]):
+        part = [packed.coords[packed.ring_offsets[r]:packed.ring_offsets[r + 1]].tolist() for r in range(packed.part_offsets[p], packed.part_offsets[p + 1])]
+        parts.append(part)
+    if gtype == POINT:
+        coordinates = parts[0][0][0]
+    elif gtype == LINESTRING:
+        coordinates = parts[0][0]
+    elif gtype == MULTIPOINT:
+        coordinates = [part[0][0] for part in parts]
+    elif gtype == POLYGON:
+        coordinates = parts[0]
+    elif gtype == MULTILINESTRING:
+        coordinates = [part[0] for part in parts]
+    else:
+        coordinates = parts
+    return { 'type': GEOMETRY_TYPES[gtype], 'coordinates': coordinates }
+
+def unpack_all(packed):
+    return [unpack(packed, i) for i in range(len(packed))]
+
+def geodesic_areas_km2(packed):
+    # spherical polygon area per ring, sum_i (lon_j - lon_i) * (2 + sin lat_i + sin lat_j) * R^2 / 2, with
+    # j the next vertex in the same ring; exterior rings add, holes subtract, points and lines have no area
+    n_geoms = len(packed.geom_types)
+    if len(packed.coords) == 0:
+        return np.zeros(n_geoms)
+
+    lon, lat = np.radians(packed.coords[:, 0].astype(np.float64)), np.radians(packed.coords[:, 1].astype(np.float64))
+    ring_lengths = packed.ring_lengths()
+    ring_index = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+
+    next_index = np.arange(1, len(lon) + 1)
+    ring_last = packed.ring_offsets[1:] - 1
+    ring_last = ring_last[ring_lengths > 0]
+    next_index[ring_last] = packed.ring_offsets[:-1][ring_lengths > 0] # wrap around within each ring
+
+    sin_lat = np.sin(lat)
+    terms = (lon[next_index] - lon) * (2.0 + sin_lat + sin_lat[next_index])
+    ring_areas = np.abs(np.bincount(ring_index, weights=terms, minlength=len(ring_lengths))) * EARTH_RADIUS_KM ** 2 / 2.0
+
+    ring_sign = np.where(packed.ring_is_exterior(), 1.0, -1.0)
+    ring_geom = packed.ring_geometry_index()
+    polygonal = np.isin(packed.geom_types, (POLYGON, MULTIPOLYGON))
+    areas = np.bincount(ring_geom, weights=ring_sign * ring_areas, minlength=n_geoms)
+    return np.where(polygonal, areas, 0.0)
+
+def bboxes(packed):
+    # (G, 4) min lon, min lat, max lon, max lat per geometry, NaN for geometries without coordinates
+    offsets = packed.coord_offsets()
+    out = np.full((len(packed.geom_types), 4), np.nan)
+    has_coords = offsets[1:] > offsets[:-1]
+    if has_coords.any():
+        starts = offsets[:-1][has_coords] # empty geometries hold no coordinates, so the segments stay contiguous
+        out[has_coords, :2] = np.minimum.reduceat(packed.coords, starts, axis=0)
+        out[has_coords, 2:] = np.maximum.reduceat(packed.coords, starts, axis=0)
+    return out
+
+def bbox_mask(boxes, min_lon, min_lat, max_lon, max_lat):
+    # geometries whose bounding box intersects the given one (NaN boxes never do)
+    return (boxes[:, 0] <= max_lon) & (boxes[:, 2] >= min_lon) & (boxes[:, 1] <= max_lat) & (boxes[:, 3] >= min_lat)
+
+def centroids(packed):
+    # (G, 2) planar centroids in degrees: area-weighted over the rings for polygons (holes subtract), the
+    # mean vertex for points, lines and degenerate polygons, NaN for geometries without coordinates
+    n_geoms = len(packed.geom_types)
+    out = np.full((n_geoms, 2), np.nan)
+    if len(packed.coords) == 0:
+        return out
+
+    coords = packed.coords.astype(np.float64)
+    coord_geom = np.repeat(np.arange(n_geoms), np.diff(packed.coord_offsets()))
+    counts = np.bincount(coord_geom, minlength=n_geoms)
+    has_coords = counts > 0
+    for axis in (0, 1):
+        out[has_coords, axis] = np.bincount(coord_geom, weights=coords[:, axis], minlength=n_geoms)[has_coords] / counts[has_coords]
+
+    ring_lengths = packed.ring_lengths()
+    ring_index = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+    next_index = np.arange(1, len(coords) + 1)
+    next_index[packed.ring_offsets[1:][ring_lengths > 0] - 1] = packed.ring_offsets[:-1][ring_lengths > 0]
+    x, y = coords[:, 0], coords[:, 1]
+    cross = x * y[next_index] - x[next_index] * y
+    ring_area = np.bincount(ring_index, weights=cross, minlength=len(ring_lengths)) / 2.0
+    ring_mx = np.bincount(ring_index, weights=(x + x[next_index]) * cross, minlength=len(ring_lengths)) / 6.0
+    ring_my = np.bincount(ring_index, weights=(y + y[next_index]) * cross, minlength=len(ring_lengths)) / 6.0
+    # orientation-independent: every ring counts positive, then holes are subtracted
+    sign = np.where(ring_area < 0, -1.0, 1.0) * np.where(packed.ring_is_exterior(), 1.0, -1.0)
+    ring_geom = packed.ring_geometry_index()
+    area = np.bincount(ring_geom, weights=sign * ring_area, minlength=n_geoms)
+    mx = np.bincount(ring_geom, weights=sign * ring_mx, minlength=n_geoms)
+    my = np.bincount(ring_geom, weights=sign * ring_my, minlength=n_geoms)
+    polygonal = np.isin(packed.geom_types, (POLYGON, MULTIPOLYGON)) & (area > 0)
+    out[polygonal, 0] = mx[polygonal] / area[polygonal]
+    out[polygonal, 1] = my[polygonal] / area[polygonal]
+    return out
+
+def simplify(packed, decimals=3):
+    # snap to a 10^-decimals degree grid (~110 m at 3) and drop the vertices that collapse onto their
+    # predecessor; rings that would fall below 4 vertices are kept whole
+    coords = np.round(packed.coords, decimals)
+    ring_lengths = packed.ring_lengths()
+    n = len(coords)
+    if n == 0:
+        return PackedGeometry(coords, packed.ring_offsets, packed.part_offsets, packed.geom_offsets, packed.geom_types)
+
+    keep = np.ones(n, dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    starts = packed.ring_offsets[:-1][ring_lengths > 0]
+    ends = packed.ring_offsets[1:][ring_lengths > 0] - 1
+    keep[starts] = True
+    keep[ends] = True # keeps polygon rings closed
+
+    ring_index = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+    kept_lengths = np.bincount(ring_index, weights=keep, minlength=len(ring_lengths)).astype(np.int64)
+    polygon_ring = np.repeat(np.isin(packed.geom_types, (POLYGON, MULTIPOLYGON)), np.diff(packed.geom_offsets))
+    polygon_ring = np.repeat(polygon_ring, np.diff(packed.part_offsets))
+    restore = polygon_ring & (kept_lengths < 4) & (ring_lengths >= 4)
+    keep |= np.repeat(restore, ring_lengths)
+    kept_lengths = np.bincount(ring_index, weights=keep, minlength=len(ring_lengths)).astype(np.int64)
+
+    ring_offsets = np.zeros(len(ring_lengths) + 1, dtype=np.int64)
+    np.cumsum(kept_lengths, out=ring_offsets[1:])
+    return PackedGeometry(coords[keep], ring_offsets, packed.part_offsets, packed.geom_offsets, packed.geom_types)
+
+def points_in_geometries(packed, geom_index, points, max_pairs=2000000):
+    # even-odd rule: point i is tested against every ring of geometry geom_index[i] (-1 for none), all of one
+    # geometry's points against all of its edges at once, in chunks of at most max_pairs point-edge pairs
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    geom_index = np.asarray(geom_index, dtype=np.int64)
+    inside = np.zeros(len(points), dtype=bool)
+    ring_geom = packed.ring_geometry_index()
+    ring_starts = np.zeros(len(packed.coords) + 1, dtype=bool)
+    ring_starts[packed.ring_offsets] = True
+    polygonal = np.isin(packed.geom_types, (POLYGON, MULTIPOLYGON))
+
+    order = np.argsort(geom_index, kind='stable')
+    bounds = np.searchsorted(geom_index[order], np.arange(len(packed.geom_types) + 1))
+    for g in np.nonzero(polygonal & (bounds[1:] > bounds[:-1]))[0]:
+        rings = np.nonzero(ring_geom == g)[0]
+        first, last = packed.ring_offsets[rings[0]], packed.ring_offsets[rings[-1] + 1]
+        edge_starts = np.arange(first, last - 1)
+        edge_starts = edge_starts[~ring_starts[edge_starts + 1]] # no edges from one ring's last vertex to the next ring
+        a, b = packed.coords[edge_starts].astype(np.float64), packed.coords[edge_starts + 1].astype(np.float64)
+        dy = b[:, 1] - a[:, 1]
+        dy[dy == 0] = np.inf # horizontal edges never straddle a point's latitude
+        idx = order[bounds[g]:bounds[g + 1]]
+        step = max(1, max_pairs // max(1, len(edge_starts)))
+        for i in range(0, len(idx), step):
+            chunk = idx[i:i + step]
+            px, py = points[chunk, 0:1], points[chunk, 1:2]
+            straddles = (a[:, 1] > py) != (b[:, 1] > py)
+            x_cross = a[:, 0] + (py - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy
+            inside[chunk] = np.count_nonzero(straddles & (px < x_cross), axis=1) % 2 == 1
+    return inside
@@ -0,0 +1,59 @@
+import argparse
+import csv
+from pathlib import Path
+
+# Writes gazetteer.py: plain dict literals for the region > sub-region > district hierarchy, so that
+# importing it costs a single module load and every lookup is a hash probe. Orgunit UIDs are left to the
+# live metadata: an MFL export only names a district's UID on its district row, which not every export has.
+
+HEADER = '''# Generated by make_gazetteer.py from %s - do not edit by hand.
+# Regenerate with: python make_gazetteer.py <MFL csv>  (or: python dhis2.py --gazetteer)
+
+'''
+
+def format_dict(name, d):
+    lines = ['%s = {' % (name,)]
+    lines.extend('    %r: %r,' % (k, d[k]) for k in sorted(d))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def render(source, subregion_region, district_subregion):
+    district_region = { d: subregion_region[s] for d, s in district_subregion.items() if s in subregion_region }
+    return ''.join((
+        HEADER % (source,),
+        'REGIONS = %r\n\n' % (tuple(sorted(set(subregion_region.values()))),),
+        format_dict('SUBREGION_REGION', subregion_region), '\n',
+        format_dict('DISTRICT_SUBREGION', district_subregion), '\n',
+        format_dict('DISTRICT_REGION', district_region),
+    ))
+
+def from_orgunits(orgunits, subregion_region):
+    # the DHIS2 tree is national > sub-region > district > ..., regions only exist in SUBREGION_REGION
+    district_subregion = dict()
+    for ou in orgunits:
+        if len(ou['ancestors']) == 2:
+            _, subregion = ou.ancestor_path()
+            district_subregion[ou['name']] = subregion
+    return subregion_region, district_subregion
+
+def from_mfl(mfl_path):
+    subregion_region, district_subregion = dict(), dict()
+    with open(mfl_path) as mfl_file:
+        for row in csv.DictReader(mfl_file):
+            if not row['DISTRICT']:
+                continue
+            subregion_region[row['SUB_REGION']] = row['REGION']
+            district_subregion[row['DISTRICT']] = row['SUB_REGION']
+    return subregion_region, district_subregion
+
+def write_gazetteer(output_path, source, subregion_region, district_subregion):
+    with open(output_path, mode='w') as output_file:
+        output_file.write(render(source, subregion_region, district_subregion))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='make_gazetteer')
+    parser.add_argument('mfl_path', help='MFL csv exported by dhis2.py')
+    parser.add_argument('--output', default=str(Path(__file__).resolve().parent / 'gazetteer.py'))
+    args = parser.parse_args()
+
+    write_gazetteer(args.output, Path(args.mfl_path).name, *from_mfl(args.mfl_path))
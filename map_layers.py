@@ -0,0 +1,157 @@
+from collections import Counter
+import json
+
+import pandas as pd
+
+from admin_names import compact_admin_name, loose_admin_name, municipal_division_name, normalise_admin_name
+import geometry
+
+# Choropleth layers below district level: UBOS populations joined onto orgunit polygons by normalised
+# (district, subcounty[, parish]) names, with geodesic areas for the density metric.
+
+LEVELS = ('District', 'Subcounty', 'Parish')
+
+MAP_METRICS = (
+    ('Pop_Total', 'Population'),
+    ('density', 'Population density (per km²)'),
+    ('Pop_Ratio', 'Sex ratio (males per 100 females)'),
+    ('tested_per_1000', 'Infants tested per 1,000 population'),
+)
+MAP_METRIC_TITLES = dict(MAP_METRICS)
+
+POP_COLUMNS = ['Pop_Male', 'Pop_Female', 'Pop_Total']
+
+def _match_names(candidates, pending, key, unique, matches, claimed):
+    # candidates: (scope, UBOS pair), pending: (scope, MFL pair, MFL subcounty); names only match within a scope
+    # and a key of None never matches
+    ubos_keys = Counter((scope, key(s)) for scope, (d, s) in candidates if (d, s) not in claimed)
+    ubos_pairs = { (scope, key(s)): (d, s) for scope, (d, s) in candidates if (d, s) not in claimed }
+    mfl_keys = Counter((scope, key(subcounty)) for scope, pair, subcounty in pending if pair not in matches)
+    for scope, pair, subcounty in pending:
+        k = (scope, key(subcounty))
+        if pair in matches or k[1] is None or k not in ubos_pairs:
+            continue
+        if not unique or (ubos_keys[k] == 1 and mfl_keys[k] == 1):
+            matches[pair] = ubos_pairs[k]
+            claimed.add(ubos_pairs[k])
+
+def match_subcounties(df_parish, pairs, across_districts=False):
+    # {(MFL district, MFL subcounty): (UBOS district, UBOS subcounty)}, the MFL carries the eHMIS spelling. Exact
+    # normalised names first, then looser ones (doubled letters, no 'Town Council' or 'Division', ...) only where they
+    # pick out a single subcounty on both sides that no earlier match has claimed. across_districts also places
+    # subcounties of districts created after the census by a name unique among all the unclaimed UBOS ones
+    ubos_pairs = list(df_parish[['District', 'Subcounty']].drop_duplicates().itertuples(index=False, name=None))
+    ubos_districts = dict()
+    for district in dict.fromkeys(d for d, _ in ubos_pairs):
+        ubos_districts.setdefault(normalise_admin_name(district), district)
+        ubos_districts.setdefault(loose_admin_name(district), district)
+
+    pending = list()
+    for district, subcounty in dict.fromkeys(pairs):
+        ubos_district = ubos_districts.get(normalise_admin_name(district)) or ubos_districts.get(loose_admin_name(district))
+        pending.append((ubos_district, (district, subcounty), subcounty))
+
+    matches, claimed = dict(), set()
+    candidates = [(d, (d, s)) for d, s in ubos_pairs]
+    _match_names(candidates, pending, normalise_admin_name, False, matches, claimed)
+    for key in (compact_admin_name, loose_admin_name, municipal_division_name):
+        _match_names(candidates, pending, key, True, matches, claimed)
+    if across_districts:
+        candidates = [(None, pair) for pair in ubos_pairs]
+        pending = [(None, pair, subcounty) for ubos_district, pair, subcounty in pending if ubos_district is None]
+        for key in (normalise_admin_name, compact_admin_name, loose_admin_name):
+            _match_names(candidates, pending, key, True, matches, claimed)
+    return matches
+
+def mfl_pairs(df_mfl):
+    return list(df_mfl[['DISTRICT', 'SUBCOUNTY']].dropna().drop_duplicates().itertuples(index=False, name=None))
+
+def mfl_subcounty_lookup(df_parish, df_mfl):
+    # (MFL district, MFL subcounty) -> UBOS subcounty name within the same district, as the selectors list them
+    return { pair: subcounty for pair, (_, subcounty) in match_subcounties(df_parish, mfl_pairs(df_mfl)).items() }
+
+def population_rollup(df_parish, keys):
+    df = df_parish.groupby(keys, as_index=False)[POP_COLUMNS].sum()
+    df['Pop_Ratio'] = (100.0 * df['Pop_Male'] / df['Pop_Female'].where(df['Pop_Female'] > 0)).round(1)
+    return df
+
+def add_areas(df, geometries, simplify_decimals=3):
+    # one packed pass over every polygon for the areas, the simplified copy is what gets sent to the browser
+    packed = geometry.pack(geometries)
+    df['area_km2'] = geometry.geodesic_areas_km2(packed)
+    df['density'] = df['Pop_Total'] / df['area_km2'].where(df['area_km2'] > 0)
+    if simplify_decimals is not None:
+        packed = geometry.simplify(packed, simplify_decimals)
+    return geometry.unpack_all(packed)
+
+def feature_collection(locations, geometries):
+    return { 'type': 'FeatureCollection', 'features': [{ 'type': 'Feature', 'id': loc, 'geometry': geom, 'properties': {} } for loc, geom in zip(locations, geometries)] }
+
+def polygon_or_none(coordinates):
+    if not isinstance(coordinates, str) or coordinates in ('', '""'):
+        return None
+    geom = json.loads(coordinates)
+    if not geom or geom.get('type') not in ('Polygon', 'MultiPolygon'):
+        return None
+    return geom
+
+def district_layer(df_districts, district_geojson):
+    geometries = { f['id']: f['geometry'] for f in district_geojson['features'] }
+    df = df_districts[['DISTRICT', 'UID', *POP_COLUMNS]].copy()
+    df['Pop_Ratio'] = (100.0 * df['Pop_Male'] / df['Pop_Female'].where(df['Pop_Female'] > 0)).round(1)
+    df['location'] = df['DISTRICT']
+    df['label'] = df['DISTRICT']
+    df = df[df['location'].map(lambda x: bool(geometries.get(x)))].reset_index(drop=True)
+    simplified = add_areas(df, [geometries[x] for x in df['location']])
+    return feature_collection(df['location'], simplified), df
+
+def subcounty_layer(df_mfl, df_parish):
+    # subcounty polygons are the MFL rows that have a SUBCOUNTY but no facility NAME
+    df_sc = df_mfl[df_mfl['NAME'].isnull() & df_mfl['SUBCOUNTY'].notnull()][['DISTRICT', 'SUBCOUNTY', 'UID', 'COORDINATES']].copy()
+    df_sc['geometry'] = df_sc['COORDINATES'].map(polygon_or_none)
+    df_sc = df_sc[df_sc['geometry'].notnull()]
+    matches = match_subcounties(df_parish, list(df_sc[['DISTRICT', 'SUBCOUNTY']].itertuples(index=False, name=None)), across_districts=True)
+    matched = [matches.get(pair, (None, None)) for pair in df_sc[['DISTRICT', 'SUBCOUNTY']].itertuples(index=False, name=None)]
+    df_sc['District'] = [district for district, _ in matched]
+    df_sc['Subcounty'] = [subcounty for _, subcounty in matched]
+
+    df_pop = population_rollup(df_parish, ['District', 'Subcounty'])
+    df = pd.merge(df_sc, df_pop, on=['District', 'Subcounty']).drop_duplicates(subset=['UID']).reset_index(drop=True)
+    df['location'] = df['UID']
+    df['label'] = df['Subcounty'] + ', ' + df['District']
+    simplified = add_areas(df, list(df['geometry']))
+    return feature_collection(df['location'], simplified), df.drop(columns=['geometry', 'COORDINATES'])
+
+def parish_layer(parish_geojson_path, df_parish, name_properties=('District', 'Subcounty', 'Parish')):
+    # parishes are not part of the eHMIS orgunit tree, their polygons come from a UBOS boundary file
+    with open(parish_geojson_path) as geojson_file:
+        features = json.load(geojson_file)['features']
+    district_prop, subcounty_prop, parish_prop = name_properties
+    df_geo = pd.DataFrame({
+        'district_key': [normalise_admin_name(f['properties'].get(district_prop, '')) for f in features],
+        'subcounty_key': [normalise_admin_name(f['properties'].get(subcounty_prop, '')) for f in features],
+        'parish_key': [normalise_admin_name(f['properties'].get(parish_prop, '')) for f in features],
+        'geometry': [f.get('geometry') for f in features],
+    })
+
+    df_pop = df_parish[['District', 'County', 'Subcounty', 'Parish', *POP_COLUMNS]].copy()
+    df_pop['Pop_Ratio'] = (100.0 * df_pop['Pop_Male'] / df_pop['Pop_Female'].where(df_pop['Pop_Female'] > 0)).round(1)
+    for column, key in (('District', 'district_key'), ('Subcounty', 'subcounty_key'), ('Parish', 'parish_key')):
+        df_pop[key] = df_pop[column].map(normalise_admin_name)
+
+    df = pd.merge(df_geo, df_pop, on=['district_key', 'subcounty_key', 'parish_key']).reset_index(drop=True)
+    df['location'] = df['District'] + '/' + df['Subcounty'] + '/' + df['Parish']
+    df = df.drop_duplicates(subset=['location']).reset_index(drop=True)
+    df['label'] = df['Parish'] + ', ' + df['Subcounty'] + ', ' + df['District']
+    simplified = add_areas(df, list(df['geometry']))
+    return feature_collection(df['location'], simplified), df.drop(columns=['geometry'])
+
+def add_tested_per_1000(df, df_optionb_all, tested_de_uids, uid_map):
+    # OptionB+ values are reported against OptionB district UIDs, uid_map translates from eHMIS ones
+    tested = df_optionb_all[df_optionb_all['Data'].isin(tested_de_uids)].groupby('Organisation unit')['Value'].sum()
+    optionb_uids = df['UID'].map(lambda x: uid_map.get(x, x))
+    df['tested_per_1000'] = 1000.0 * optionb_uids.map(tested) / df['Pop_Total'].where(df['Pop_Total'] > 0)
+    return df
+
+def layer_metrics(df):
+    return [(key, title) for key, title in MAP_METRICS if key in df.columns and df[key].notnull().any()]
@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+import os
+import pickle
+import sqlite3
+import threading
+from time import sleep, time
+import uuid
+import zlib
+
+import metrics
+
+# Cache entries are stored per (namespace, key) together with the version they were computed for.
+# A lookup for any other version is a miss, and the next store replaces the stale entry.
+#
+# get_or_set runs the loader for one (namespace, key) at a time: concurrent misses wait for the load in
+# progress and then read its result, between the threads of a process and, for SQLiteCache, between every
+# process sharing the database file.
+#
+# What SQLiteCache shares is the work of loading, not memory: every get() unpickles a fresh copy, so each
+# server process holds its own copy of whatever it keeps (each Refresher keeps its current snapshot), and N
+# processes need about N times the memory of one. The copies are independent, mutating one changes nothing
+# in the cache or in the other processes.
+
+MISS = object() # get() default that tells a miss apart from a stored None
+LOCK_SECONDS = 600.0 # lease of a cross-process load lock, a crashed loader's lock expires after this
+LOCK_POLL_SECONDS = 0.05
+
+__key_locks = dict()
+__key_locks_lock = threading.Lock()
+
+def key_lock(backend, namespace, key):
+    with __key_locks_lock:
+        return __key_locks.setdefault((id(backend), namespace, key), threading.Lock())
+
+class CacheBackend(object):
+    def get(self, namespace, key, version, default=None):
+        raise NotImplementedError()
+
+    def set(self, namespace, key, version, value):
+        raise NotImplementedError()
+
+    def clear(self, namespace=None):
+        raise NotImplementedError()
+
+    @contextmanager
+    def lock(self, namespace, key):
+        # serialises the loads of one entry between the threads of this process
+        with key_lock(self, namespace, key):
+            yield
+
+    def get_or_set(self, namespace, key, version, loader):
+        value = self.get(namespace, key, version, MISS)
+        if value is MISS:
+            with self.lock(namespace, key):
+                value = self.get(namespace, key, version, MISS) # loaded by whoever held the lock before us
+                if value is MISS:
+                    metrics.inc('cache_requests_total', namespace=namespace, result='miss')
+                    with metrics.span('cache_load', namespace=namespace):
+                        value = loader()
+                    self.set(namespace, key, version, value)
+                    return value
+        metrics.inc('cache_requests_total', namespace=namespace, result='hit')
+        return value
+
+def dumps(value):
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+def loads(blob):
+    return pickle.loads(zlib.decompress(blob))
+
+class MemoryCache(CacheBackend):
+    def __init__(self):
+        self.__entries = dict()
+        self.__lock = threading.Lock()
+
+    def get(self, namespace, key, version, default=None):
+        with self.__lock:
+            entry = self.__entries.get((namespace, key))
+        if entry is None or entry[0] != version:
+            return default
+        return entry[1]
+
+    def set(self, namespace, key, version, value):
+        with self.__lock:
+            self.__entries[(namespace, key)] = (version, value)
+
+    def clear(self, namespace=None):
+        with self.__lock:
+            if namespace is None:
+                self.__entries.clear()
+            else:
+                for k in [k for k in self.__entries if k[0] == namespace]:
+                    del self.__entries[k]
+
+    def __str__(self):
+        return 'MemoryCache(size: %d)' % (len(self.__entries),)
+
+class SQLiteCache(CacheBackend):
+    def __init__(self, db_path, timeout=30.0):
+        self.db_path = str(db_path)
+        self.timeout = timeout
+        self.__local = threading.local() # sqlite3 connections can not be shared between threads
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entries (namespace TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, created REAL NOT NULL, value BLOB NOT NULL, PRIMARY KEY (namespace, key))')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_locks (namespace TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL, expires REAL NOT NULL, PRIMARY KEY (namespace, key))')
+
+    def connection(self):
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.execute('PRAGMA journal_mode=WAL') # readers in other processes don't block on a writer
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+        return conn
+
+    def get(self, namespace, key, version, default=None):
+        row = self.connection().execute('SELECT version, value FROM cache_entries WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        if row is None or row[0] != version:
+            return default
+        return loads(row[1])
+
+    @contextmanager
+    def lock(self, namespace, key):
+        # a lock row with a lease: the process that inserts it loads, the others poll until it is deleted
+        with super().lock(namespace, key):
+            owner = '%d:%s' % (os.getpid(), uuid.uuid4().hex)
+            waited = False
+            while True:
+                with self.connection() as conn:
+                    conn.execute('DELETE FROM cache_locks WHERE namespace = ? AND key = ? AND expires < ?', (namespace, key, time()))
+                    acquired = conn.execute('INSERT OR IGNORE INTO cache_locks (namespace, key, owner, expires) VALUES (?, ?, ?, ?)', (namespace, key, owner, time() + LOCK_SECONDS)).rowcount == 1
+                if acquired:
+                    break
+                if not waited:
+                    metrics.inc('cache_lock_waits_total', namespace=namespace)
+                    waited = True
+                sleep(LOCK_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                with self.connection() as conn:
+                    conn.execute('DELETE FROM cache_locks WHERE namespace = ? AND key = ? AND owner = ?', (namespace, key, owner))
+
+    def set(self, namespace, key, version, value):
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entries (namespace, key, version, created, value) VALUES (?, ?, ?, ?, ?)', (namespace, key, version, time(), dumps(value)))
+
+    def clear(self, namespace=None):
+        with self.connection() as conn:
+            if namespace is None:
+                conn.execute('DELETE FROM cache_entries')
+            else:
+                conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+
+    def __str__(self):
+        return 'SQLiteCache(%s)' % (self.db_path,)
+
+def open_cache(cache_url):
+    if not cache_url:
+        return None
+    if cache_url == 'memory:':
+        return MemoryCache()
+    if cache_url.startswith('sqlite:///'):
+        return SQLiteCache(cache_url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported cache URL "{cache_url}" (expected "memory:" or "sqlite:///<path>")')
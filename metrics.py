@@ -0,0 +1,176 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import json
+import math
+import re
+import threading
+from time import perf_counter, time
+
+METRIC_PREFIX = 'parish_demo_'
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+UID_PATTERN = re.compile(r'(?<![A-Za-z0-9])[A-Za-z][A-Za-z0-9]{10}(?![A-Za-z0-9])')
+
+def url_template(path):
+    # collapse DHIS2 UIDs so that per-object requests aggregate under one label
+    return UID_PATTERN.sub('{uid}', path)
+
+def label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for le, c in zip(self.buckets, self.counts):
+            total += c
+            yield le, total
+
+class Metrics(object):
+    def __init__(self, max_spans=10000):
+        self.__lock = threading.Lock()
+        self.counters = dict()
+        self.histograms = dict()
+        self.spans = deque(maxlen=max_spans)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.__lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.__lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        # attributes set on the yielded dict (e.g. bytes) are kept with the span record
+        attrs = dict()
+        ts, start = perf_counter(), time()
+        try:
+            yield attrs
+        finally:
+            seconds = perf_counter() - ts
+            self.observe(name + '_seconds', seconds, **labels)
+            with self.__lock:
+                self.spans.append({ 'name': name, 'labels': dict(labels), 'start': start, 'seconds': seconds, **attrs })
+
+    def timed(self, name, **labels):
+        def decorator(f):
+            @wraps(f)
+            def wrap(*args, **kw):
+                with self.span(name, function=f.__name__, **labels):
+                    return f(*args, **kw)
+            return wrap
+        return decorator
+
+    def reset(self):
+        with self.__lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+    def to_prometheus(self):
+        lines = list()
+        with self.__lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda kv: kv[0])
+        for name in sorted(set(n for (n, _), _ in counters)):
+            lines.append('# TYPE %s%s counter' % (METRIC_PREFIX, name))
+            for (n, labels), value in counters:
+                if n == name:
+                    lines.append('%s%s%s %s' % (METRIC_PREFIX, name, format_labels(labels), value))
+        for name in sorted(set(n for (n, _), _ in histograms)):
+            lines.append('# TYPE %s%s histogram' % (METRIC_PREFIX, name))
+            for (n, labels), hist in histograms:
+                if n != name:
+                    continue
+                for le, total in hist.cumulative():
+                    lines.append('%s%s_bucket%s %d' % (METRIC_PREFIX, name, format_labels(labels + (('le', '+Inf' if le == math.inf else repr(le)),)), total))
+                lines.append('%s%s_sum%s %r' % (METRIC_PREFIX, name, format_labels(labels), hist.sum))
+                lines.append('%s%s_count%s %d' % (METRIC_PREFIX, name, format_labels(labels), hist.count))
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        with self.__lock:
+            return {
+                'counters': [{ 'name': n, 'labels': dict(l), 'value': v } for (n, l), v in self.counters.items()],
+                'histograms': [{ 'name': n, 'labels': dict(l), 'count': h.count, 'sum': h.sum, 'buckets': [['+Inf' if le == math.inf else le, c] for le, c in h.cumulative()] } for (n, l), h in self.histograms.items()],
+                'spans': list(self.spans),
+            }
+
+    def dump_json(self, json_path):
+        with open(json_path, mode='w') as json_file:
+            json.dump(self.to_json(), json_file, indent=1)
+
+    def serve(self, port, host='127.0.0.1'):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, content_type = json.dumps(metrics.to_json()).encode('utf-8'), 'application/json'
+                else:
+                    body, content_type = metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+        return server
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % (','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels),)
+
+class Stages(object):
+    # times consecutive sections of a script without re-indenting them: each lap() closes the running stage
+    def __init__(self, name, metrics=None, **labels):
+        self.name = name
+        self.metrics = metrics or REGISTRY
+        self.labels = labels
+        self.laps = list()
+        self.__ts = perf_counter()
+
+    def lap(self, stage):
+        now = perf_counter()
+        seconds = now - self.__ts
+        self.__ts = now
+        self.laps.append((stage, seconds))
+        self.metrics.observe(self.name + '_seconds', seconds, stage=stage, **self.labels)
+        return seconds
+
+    def restart(self):
+        self.__ts = perf_counter()
+
+REGISTRY = Metrics()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+span = REGISTRY.span
+timed = REGISTRY.timed
@@ -0,0 +1,106 @@
+# OptionB+ (PMTCT) definitions shared by the dashboard and the bundle builder: the EID data elements, the
+# eHMIS -> OptionB district UID table and the cascade cards computed from them.
+
+UG_OU_UID = 'akV6429SUqu'
+
+_PCR_DE_UIDS = [
+    ('I0MEbZSbEVs', 'Exposed Infants due for a test (1st PCR, 2nd PCR, 3rd PCR, & Rapid Test)'),
+    ('y2G5UdgSfuk', '1st PCR'),
+    ('XroPkgIGjVS', '2nd PCR'),
+    ('tEYLrsgH6aO', '3rd PCR'),
+    ('oX344XVLe1V', 'Rapid Test'),
+    ('T2UepjeVadz', 'Positive Linked to ART'),
+    ('o9Yy4ibSCWE', 'Positive'),
+]
+
+PCR_DE_UIDS = [ de_id for de_id, de_name in _PCR_DE_UIDS ]
+PCR_DE_NAMES = dict(_PCR_DE_UIDS)
+
+#TODO: national eHMIS and OptionB don't agree on Kampala District (and others??)
+TT_1 = [
+    ('Amudat District', 'a8RHFdF4DXL', 'h8RHFdF4DXL'),
+    ('Bugweri District', 'AIonX4LaJeU', 'JzUtuySAs8W'),
+    ('Bunyangabu District', 'iTfbtn6JUsN', 'uAUn3ZcQ6Kt'),
+    ('Butebo District', 'FDPqRvcW3NN', 'y2TckWz9CPy'),
+    ('Buvuma District', 'aZLZPPjqft0', 'bZLZPPjqft0'),
+    ('Jinja District', 'aJR2ZxSH7g4', 'gJR2ZxSH7g4'),
+    ('Kabarole District', 'm77oR1YJESj', 'fIbu0dVl0gz'),
+    ('Kagadi District', 'orgY0d5MJa9', 'LtyM5HnzFui'),
+    ('Kakumiro District', 'Lnewt3iIJaK', 'HRakdY52JPf'),
+    ('Kalaki District', 'KOnkIf4N6jA', 'TCtwiCWcvMh'),
+    ('Kampala District', 'aXmBzv61LbM', 'rzsbhKKYISq'),
+    ('Kamwenge District', 'uCVQXAdKqL9', 'VbX669lGEiY'),
+    ('Kanungu District', 'aphcy5JTnd6', 'ophcy5JTnd6'),
+    ('Kapchorwa District', 'aginheWSLef', 'iginheWSLef'),
+    ('Kapelebyong District', 'mvN9LBbpf7X', 'OK3JLtXYKzL'),
+    ('Karenga District', 'Hmh5JQLls1d', 'XrzjPNEakFG'),
+    ('Kasese District', 'aa8xVDzSpte', 'fa8xVDzSpte'),
+    ('Kazo District', 'AS2Seq1grGE', 'BJ9capKA8Kg'),
+    ('Kibaale District', 'tM3DsJxMaMX', 'AtnLKczpkvP'),
+    ('Kikuube District', 'L5WBetpBpY3', 'fXT6ayIyYeH'),
+    ('Kisoro District', 'aPhSZRinfbg', 'dPhSZRinfbg'),
+    ('Kitagwenda District', 'qKmESX5Owwr', 'ROQiyOthHFm'),
+    ('Kwania District', 'gCN6sU5BjlR', 'es2NjGbxNBy'),
+    ('Kyegegwa District', 'a9tQqo1rSj7', 'g9tQqo1rSj7'),
+    ('Kyotera District', 'REJuxCmTwXG', 'UcOzqLVFJVo'),
+    ('Lwengo District', 'aqpd0Y9eXZ2', 'bqpd0Y9eXZ2'),
+    ('Lyantonde District', 'aPRNSGUR3vk', 'ePRNSGUR3vk'),
+    ('Madi-Okollo District', 'bLoH4VbxCGI', 'eqfJd1Yk9u4'),
+    ('Mbarara District', 'auswb7JO9wY', 'huswb7JO9wY'),
+    ('Mpigi District', 'YMMexeHFUay', 'bFlqjkzbC8N'),
+    ('Mukono District', 'a0DfYpC2Rwl', 'd0DfYpC2Rwl'),
+    ('Nabilatuk District', 'mOXva2xiwQv', 'Ma6LKsXVlDm'),
+    ('Nakaseke District', 'aSbgVKaeCP0', 'oSbgVKaeCP0'),
+    ('Nakasongola District', 'aUcYGQCK9ub', 'hUcYGQCK9ub'),
+    ('Namisindwa District', 'TGzZPOmbgn8', 's3X2onnu3iE'),
+    ('Ngora District', 'aj4hsYK3dVm', 'hj4hsYK3dVm'),
+    ('Omoro District', 'S5fvUXgY54J', 'yIWARgfOvr1'),
+    ('Otuke District', 'aXjub1BYn1y', 'dXjub1BYn1y'),
+    ('Pader District', 'aBrjuZk0W31', 'gBrjuZk0W31'),
+    ('Pakwach District', 'uqUyTPvQKII', 'StgiDC6czID'),
+    ('Rubanda District', 'wZrfAgC3WrU', 'N9zP0kGK7Ld'),
+    ('Rukiga District', 'fsP0Wxie1UW', 'mb3idsHFRl6'),
+    ('Rwampara District', 'tsugXWRXwGu', 'WDgr6qVSjB6'),
+]
+EHMIS_OPTIONB_MAP = { ehmis_uid:optionb_uid for _, ehmis_uid, optionb_uid in TT_1 }
+
+def short_name(de_name):
+    # 'EID - Tested 1st PCR' -> '1st PCR'
+    return de_name[6:].replace('Tested ', '', 1).replace('Total Number ', '', 1)
+
+def de_short_names(dataelements):
+    # { data element UID: short name } from the eHMIS data element names, as the cascade cards label them
+    return { de_uid: short_name(dataelements[de_uid]['name']) for de_uid in PCR_DE_UIDS }
+
+def cascade_values(df_optionb_all, optionb_uid, de_names):
+    # { data element UID: (short name, value) } for one OptionB+ orgunit
+    df_optionb = df_optionb_all[df_optionb_all['Organisation unit'] == optionb_uid]
+    return { de_uid: (de_names[de_uid], value) for de_uid, value in zip(df_optionb['Data'], df_optionb['Value']) if de_uid in de_names }
+
+def pmtct_cards(values, district_name):
+    pcr_cascade = [values.get(uid) for uid in PCR_DE_UIDS[:5]] # first 5 form the cascade
+    linkage_cascade = [values.get(uid) for uid in PCR_DE_UIDS[5:]] # last 2 form the linkage
+    pmtct_title = f'HIV Mother-to-Child: 2021W16 ({district_name})'
+    if (not all(pcr_cascade) or not all(linkage_cascade)): # TODO: very conservative check!
+        return pmtct_title, {
+            'Reporting Rate': [ 'N/A', 'No data available' ],
+            'Babies tested': [ 'N/A', 'No data available' ],
+            'HIV+ infants linked to care': [ 'N/A', 'No data available' ],
+        }
+
+    (_, pcr_eid), *pcr_cascade = pcr_cascade
+    pcr_cascade_text = ', '.join([f'<span><a>{int(val)}</a></span> :{name}' for name, val in pcr_cascade])
+    pcr_rate = sum((v for _, v in pcr_cascade)) / int(pcr_eid)
+
+    linkage_cascade_text = ', of '.join([f'<span><a>{int(val)}</a></span> {name}' for name, val in linkage_cascade])
+    if linkage_cascade[1][1] == 0:
+        linkage_rate = 1
+        linkage_cascade_text = 'Zero HIV+ cases found in Exposed Infants'
+    else:
+        linkage_rate = linkage_cascade[0][1] / linkage_cascade[1][1]
+
+    return pmtct_title, {
+        'Reporting Rate': [ '19%', '<a href="#">317</a> of <a href="#">1648</a> reports received' ],
+        'Babies tested': [ f'{pcr_rate:.1%}', f'({pcr_cascade_text}) of {int(pcr_eid)} Exposed Infants' ],
+        'HIV+ infants linked to care': [ f'{linkage_rate:.1%}', linkage_cascade_text ],
+    }
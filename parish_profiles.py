@@ -0,0 +1,99 @@
+from functools import lru_cache
+from html import escape
+import json
+from pathlib import Path
+from string import Template
+
+PILLARS = (
+    ('production', 'Production, Processing, Value Addition and Marketing'),
+    ('infrastructure', 'Infrastructure and Economic Services'),
+    ('financial_inclusion', 'Financial Inclusion'),
+    ('health', 'Health'),
+    ('education', 'Education'),
+    ('social_services', 'Social Services Delivery'),
+    ('community_information', 'Community Information'),
+    ('governance', 'Governance and Administration'),
+    ('mindset_change', 'Mindset Change'),
+)
+
+PILLAR_TITLES = dict(PILLARS)
+EXPANDER_TITLES = dict(PILLARS, social_services='Social Service Delivery') # the parish page's labels
+
+# templates are compiled once at import, rendering only substitutes into them
+PILLAR_TMPL = Template('<ol>\n$sections</ol>\n')
+SECTION_TMPL = Template('    <li><h3>$title</h3>\n$groups    </li>\n')
+GROUPS_TMPL = Template('        <ul>\n$groups        </ul>\n')
+GROUP_TMPL = Template('        <li>$title\n            <ul>\n$items            </ul>\n        </li>\n')
+ITEM_TMPL = Template('                <li>\n$title$fields                </li>\n')
+ITEM_TITLE_TMPL = Template('                <div>$title</div>\n')
+FIELDS_TMPL = Template('                <p>\n$lines                </p>\n')
+FIELD_TMPL = Template('                $label: $value<br/>\n')
+LINE_TMPL = Template('                $line<br/>\n')
+
+def parish_key(parish_path):
+    if isinstance(parish_path, str):
+        return parish_path
+    return '/'.join(parish_path)
+
+def _render_field(field):
+    if isinstance(field, str):
+        return LINE_TMPL.substitute(line=escape(field))
+    label, value = field
+    return FIELD_TMPL.substitute(label=escape(label), value=escape('' if value is None else str(value)))
+
+def _render_item(item):
+    if isinstance(item, str):
+        return f'                <li>{escape(item)}</li>\n'
+    title = ITEM_TITLE_TMPL.substitute(title=escape(item['title'])) if item.get('title') else ''
+    fields = item.get('fields', [])
+    lines = FIELDS_TMPL.substitute(lines=''.join(_render_field(f) for f in fields)) if fields else ''
+    return ITEM_TMPL.substitute(title=title, fields=lines)
+
+def _render_group(group):
+    return GROUP_TMPL.substitute(title=escape(group['title']), items=''.join(_render_item(i) for i in group.get('items', [])))
+
+def _render_section(section):
+    groups = section.get('groups', [])
+    groups_html = GROUPS_TMPL.substitute(groups=''.join(_render_group(g) for g in groups)) if groups else ''
+    return SECTION_TMPL.substitute(title=escape(section['title']), groups=groups_html)
+
+def render_pillar(sections):
+    return PILLAR_TMPL.substitute(sections=''.join(_render_section(s) for s in sections))
+
+class ParishProfiles(object):
+    def __init__(self, profiles_path):
+        self.profiles_path = Path(profiles_path)
+        if self.profiles_path.exists():
+            with open(self.profiles_path) as profiles_file:
+                self.__profiles = json.load(profiles_file)
+        else:
+            self.__profiles = dict()
+
+    def __contains__(self, parish_path):
+        return parish_key(parish_path) in self.__profiles
+
+    def __getitem__(self, parish_path):
+        return self.__profiles[parish_key(parish_path)]
+
+    def __len__(self):
+        return len(self.__profiles)
+
+    def profile(self, parish_path):
+        # an empty profile for a parish without one, the page then says 'No data available' for every pillar
+        return self.__profiles.get(parish_key(parish_path), {})
+
+    def pillars(self, parish_path):
+        profile = self.profile(parish_path)
+        return [(key, title) for key, title in PILLARS if profile.get(key)]
+
+    @lru_cache(maxsize=1024)
+    def render(self, parish_path, pillar):
+        if pillar not in PILLAR_TITLES:
+            raise KeyError(pillar)
+        sections = self.profile(parish_path).get(pillar)
+        if not sections:
+            return None
+        return render_pillar(sections)
+
+    def __str__(self):
+        return 'profiles_path: %s, size: %d' % (self.profiles_path, len(self.__profiles))
@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import re
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import geometry
+import map_layers
+import metrics
+import optionb
+
+# Data-quality rules over the MFL, UBOS and OptionB+ inputs. Each rule is a pandas expression evaluated
+# column-wise over a whole table (DataFrame.eval), true for the rows that pass; rows with a missing value
+# in any column the rule uses are not checked. Derived columns (point in district polygon, UID known to
+# DHIS2, ...) are computed once per table by build_tables, so the rules themselves stay declarative.
+#
+#   python quality.py --mfl UG_MFL_2021-04-21.csv --output violations.csv
+
+class Rule(object):
+    def __init__(self, name, table, expr, description, severity='error'):
+        self.name = name
+        self.table = table
+        self.expr = expr
+        self.description = description
+        self.severity = severity
+
+    def columns(self, df):
+        return [c for c in dict.fromkeys(re.findall(r'[A-Za-z_]\w*', self.expr)) if c in df.columns]
+
+    def __str__(self):
+        return 'Rule(%s: %s)' % (self.name, self.expr)
+
+RULES = (
+    Rule('ubos_population_sum', 'ubos', 'Pop_Male + Pop_Female == Pop_Total', 'Male and female populations add up to the total'),
+    Rule('ubos_population_positive', 'ubos', 'Pop_Total > 0', 'Parish has a population', 'warning'),
+    Rule('ubos_parish_unique', 'ubos', 'unique_parish', 'District, subcounty and parish name identify one row'),
+    Rule('optionb_positive_le_tested', 'optionb', 'positive <= tested', 'HIV+ infants do not exceed infants tested'),
+    Rule('optionb_linked_le_positive', 'optionb', 'linked <= positive', 'Infants linked to ART do not exceed HIV+ infants'),
+    Rule('optionb_tested_le_due', 'optionb', 'tested <= due', 'Infants tested do not exceed infants due for a test', 'warning'),
+    Rule('optionb_cascade_complete', 'optionb', 'reported == %d' % (len(optionb.PCR_DE_UIDS),), 'Every EID data element is reported', 'warning'),
+    Rule('optionb_orgunit_in_mfl', 'optionb', 'orgunit_in_mfl', 'OptionB+ orgunit maps onto an MFL district'),
+    Rule('district_mappable', 'districts', 'has_geometry', 'District has a boundary polygon', 'warning'),
+    Rule('district_has_population', 'districts', 'has_population', 'District has UBOS parish populations', 'warning'),
+    Rule('district_has_optionb', 'districts', 'has_optionb', 'District has OptionB+ values', 'warning'),
+    Rule('subcounty_in_ubos', 'subcounties', 'in_ubos', 'MFL subcounty matches a UBOS subcounty by name', 'warning'),
+    Rule('facility_in_district', 'facilities', 'in_district', 'Facility location lies inside its district polygon'),
+    Rule('mfl_uid_in_orgunits', 'mfl', 'uid_in_orgunits', 'MFL UID is an orgunit in DHIS2'),
+)
+
+TABLE_KEYS = {
+    'ubos': ['District', 'Subcounty', 'Parish'],
+    'optionb': ['orgunit'],
+    'districts': ['DISTRICT', 'UID'],
+    'subcounties': ['DISTRICT', 'SUBCOUNTY'],
+    'facilities': ['DISTRICT', 'NAME', 'UID'],
+    'mfl': ['DISTRICT', 'SUBCOUNTY', 'NAME', 'UID'],
+}
+
+DISTRICT_COVERAGE = 0.9 # share of the facilities' districts that need a district row before OptionB+ orgunits are checked against them
+
+OPTIONB_COLUMNS = dict(zip(optionb.PCR_DE_UIDS, ('due', 'pcr_1', 'pcr_2', 'pcr_3', 'rapid', 'linked', 'positive')))
+
+def has_geometry(coordinates):
+    return coordinates.notnull() & ~coordinates.isin(['', '""', 'null'])
+
+def point_or_nan(coordinates):
+    geom = json.loads(coordinates) if isinstance(coordinates, str) and coordinates not in ('', '""') else None
+    if geom and geom.get('type') == 'Point':
+        return geom['coordinates'][:2]
+    return [np.nan, np.nan]
+
+def ubos_table(df_parish):
+    df = df_parish.copy()
+    df['unique_parish'] = ~df.duplicated(subset=TABLE_KEYS['ubos'], keep=False)
+    return df
+
+def optionb_table(df_optionb_all, district_uids=None, uid_map=optionb.EHMIS_OPTIONB_MAP):
+    # one row per OptionB+ orgunit, one column per EID data element
+    df = df_optionb_all[df_optionb_all['Data'].isin(OPTIONB_COLUMNS)].pivot_table(index='Organisation unit', columns='Data', values='Value', aggfunc='sum')
+    df = df.rename(columns=OPTIONB_COLUMNS).reindex(columns=list(OPTIONB_COLUMNS.values()))
+    df['reported'] = df.notnull().sum(axis=1)
+    df['tested'] = df[['pcr_1', 'pcr_2', 'pcr_3', 'rapid']].sum(axis=1, min_count=1)
+    df = df.rename_axis(columns=None).reset_index().rename(columns={ 'Organisation unit': 'orgunit' })
+    if district_uids is not None:
+        optionb_uids = set(uid_map.get(uid, uid) for uid in district_uids) | { optionb.UG_OU_UID }
+        df['orgunit_in_mfl'] = df['orgunit'].isin(optionb_uids)
+    return df
+
+def subcounty_table(df_mfl, df_parish):
+    # one row per MFL (district, subcounty), in_ubos as the subcounty map layer matches them
+    pairs = map_layers.mfl_pairs(df_mfl)
+    matches = map_layers.match_subcounties(df_parish, pairs, across_districts=True)
+    return pd.DataFrame({
+        'DISTRICT': [d for d, _ in pairs],
+        'SUBCOUNTY': [s for _, s in pairs],
+        'in_ubos': [pair in matches for pair in pairs],
+    })
+
+def mfl_tables(df_mfl, df_parish=None, df_optionb_all=None, uid_map=optionb.EHMIS_OPTIONB_MAP):
+    is_district = df_mfl['NAME'].isnull() & df_mfl['SUBCOUNTY'].isnull() & df_mfl['DISTRICT'].notnull()
+    df_districts = df_mfl[is_district].reset_index(drop=True)
+    df_districts['has_geometry'] = has_geometry(df_districts['COORDINATES'])
+    if df_parish is not None:
+        df_districts['has_population'] = df_districts['DISTRICT'].isin(set(df_parish['District'] + ' District'))
+    if df_optionb_all is not None:
+        df_districts['has_optionb'] = df_districts['UID'].map(lambda x: uid_map.get(x, x)).isin(set(df_optionb_all['Organisation unit']))
+
+    df_facilities = df_mfl[df_mfl['NAME'].notnull()].reset_index(drop=True)
+    points = np.array([point_or_nan(c) for c in df_facilities['COORDINATES']], dtype=np.float64).reshape(-1, 2)
+    district_geometries = [json.loads(c) if mappable else None for c, mappable in zip(df_districts['COORDINATES'], df_districts['has_geometry'])]
+    district_index = pd.Series(np.arange(len(df_districts)), index=df_districts['DISTRICT'])
+    district_index = district_index[~district_index.index.duplicated()]
+    geom_index = df_facilities['DISTRICT'].map(district_index).fillna(-1).astype(np.int64).values
+    located = ~np.isnan(points[:, 0]) & (geom_index >= 0)
+    located &= df_districts['has_geometry'].values[np.maximum(geom_index, 0)] if len(df_districts) else False
+    if located.any():
+        inside = geometry.points_in_geometries(geometry.pack(district_geometries), np.where(located, geom_index, -1), np.nan_to_num(points))
+        df_facilities['in_district'] = pd.Series(inside, dtype=object).where(located, None)
+    return df_districts, df_facilities
+
+def district_coverage(df_districts, df_facilities):
+    # (facility districts with a district row, facility districts); exports filtered by dhis2.py --limit have few
+    facility_districts = set(df_facilities['DISTRICT'].dropna())
+    return len(facility_districts & set(df_districts['DISTRICT'])), len(facility_districts)
+
+def build_tables(df_mfl=None, df_parish=None, df_optionb_all=None, orgunit_ids=None):
+    # orgunit_ids: UIDs known to DHIS2 (e.g. the ids of Dhis2.orgunits()), enables mfl_uid_in_orgunits
+    tables = dict()
+    if df_parish is not None:
+        tables['ubos'] = ubos_table(df_parish)
+    if df_mfl is not None:
+        tables['districts'], tables['facilities'] = mfl_tables(df_mfl, df_parish, df_optionb_all)
+        if df_parish is not None:
+            tables['subcounties'] = subcounty_table(df_mfl, df_parish)
+        if orgunit_ids is not None:
+            tables['mfl'] = df_mfl.assign(uid_in_orgunits=df_mfl['UID'].isin(set(orgunit_ids)))
+    if df_optionb_all is not None:
+        # against a partial MFL nearly every orgunit would fail, so orgunit_in_mfl is left out and its rule skipped
+        covered, total = district_coverage(tables['districts'], tables['facilities']) if 'districts' in tables else (0, 0)
+        complete = total > 0 and covered >= DISTRICT_COVERAGE * total
+        tables['optionb'] = optionb_table(df_optionb_all, tables['districts']['UID'] if complete else None)
+    return tables
+
+def missing_columns(rule, df):
+    names = set(re.findall(r'[A-Za-z_]\w*', rule.expr)) - { 'and', 'or', 'not', 'True', 'False' }
+    return sorted(names - set(df.columns))
+
+def evaluate(rule, df):
+    # (rows checked, violating rows) or None when the table lacks a column the rule needs
+    if missing_columns(rule, df):
+        return None
+    columns = rule.columns(df)
+    checked = df[columns].notnull().all(axis=1)
+    passed = df.eval(rule.expr)
+    return int(checked.sum()), df[checked & ~passed.astype(bool)]
+
+def describe_values(df, columns):
+    return [', '.join('%s=%s' % (c, v) for c, v in zip(columns, row)) for row in df[columns].itertuples(index=False)]
+
+def validate(tables, rules=RULES, workers=4):
+    # returns (violations, summary); rules are independent and run concurrently
+    def run_rule(rule):
+        ts = perf_counter()
+        df = tables.get(rule.table)
+        result = evaluate(rule, df) if df is not None else None
+        return rule, result, perf_counter() - ts
+
+    with metrics.span('quality_validate', rules=len(rules)):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quality') as executor:
+            results = list(executor.map(run_rule, rules))
+
+    violations, summary = list(), list()
+    for rule, result, seconds in results:
+        if result is None:
+            df = tables.get(rule.table)
+            reason = 'no %s table' % (rule.table,) if df is None else 'no %s column' % (', '.join(missing_columns(rule, df)),)
+            summary.append({ 'rule': rule.name, 'table': rule.table, 'severity': rule.severity, 'checked': 0, 'violations': 0, 'seconds': seconds, 'skipped': reason })
+            continue
+        checked, df_bad = result
+        metrics.inc('quality_violations_total', len(df_bad), rule=rule.name, severity=rule.severity)
+        summary.append({ 'rule': rule.name, 'table': rule.table, 'severity': rule.severity, 'checked': checked, 'violations': len(df_bad), 'seconds': seconds, 'skipped': '' })
+        if len(df_bad):
+            keys = [k for k in TABLE_KEYS[rule.table] if k in df_bad.columns]
+            violations.append(pd.DataFrame({
+                'rule': rule.name,
+                'severity': rule.severity,
+                'table': rule.table,
+                'key': df_bad[keys].astype(str).agg(' / '.join, axis=1).values,
+                'values': describe_values(df_bad, rule.columns(df_bad)),
+                'description': rule.description,
+            }))
+    columns = ['rule', 'severity', 'table', 'key', 'values', 'description']
+    df_violations = pd.concat(violations, ignore_index=True) if violations else pd.DataFrame(columns=columns)
+    return df_violations, pd.DataFrame(summary)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='quality')
+    parser.add_argument('--mfl', default='UG_MFL_2021-04-01_nopoly.csv', help='MFL export (dhis2.py), the copy in the repository by default')
+    parser.add_argument('--parish', default='ubos_parish/ALL_POP.csv', help='UBOS parish populations')
+    parser.add_argument('--optionb', default='optionb_plus2.csv', help='OptionB+ values by data element and orgunit')
+    parser.add_argument('--cassette', help='Check MFL UIDs against DHIS2 orgunits replayed from this cassette URL (see cassette.py)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', help='Write the violations as CSV to OUTPUT')
+    args = parser.parse_args()
+
+    ts = perf_counter()
+    orgunit_ids = None
+    if args.cassette:
+        import cassette
+        import dhis2
+        instance = dhis2.Dhis2('http://replay.invalid/', ('', ''), cassette=cassette.open_cassette(args.cassette))
+        orgunit_ids = [ou['id'] for ou in instance.orgunits(fields='id')]
+    tables = build_tables(pd.read_csv(args.mfl), pd.read_csv(args.parish), pd.read_csv(args.optionb), orgunit_ids)
+    df_violations, df_summary = validate(tables, workers=args.workers)
+    print(df_summary.to_string(index=False))
+    covered, total = district_coverage(tables['districts'], tables['facilities'])
+    partial = list()
+    if covered < DISTRICT_COVERAGE * total:
+        partial.append('%s has district rows for %d of the %d facility districts, optionb_orgunit_in_mfl is skipped' % (args.mfl, covered, total))
+    if 'in_district' not in tables['facilities']:
+        partial.append('%s has no district polygons to place facilities in, facility_in_district is skipped' % (args.mfl,))
+    if partial:
+        print('\n'.join(partial + ['Export a complete MFL with dhis2.py and pass it as --mfl to run these rules']))
+    print('%d violations in %.2fs' % (len(df_violations), perf_counter() - ts))
+    if args.output:
+        df_violations.to_csv(args.output, index=False)
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from time import monotonic, perf_counter, time
+
+import metrics
+
+# Stale-while-revalidate for the dashboard data. A Refresher holds the last good snapshot of one dataset
+# and a Scheduler thread reloads it every `interval` seconds; readers always get the current snapshot
+# straight away and a new one replaces it in a single reference swap, so a rerun never waits on DHIS2.
+#
+# Only the very first read of a process can block: it restores the snapshot persisted in the metadata
+# cache by an earlier process, or else runs the quick `initial` loader (e.g. a filtered query) and leaves
+# the full load to the scheduler. A `version` callable (metadata_version, file_version) makes a refresh
+# that finds nothing new skip the load; a failed refresh keeps the old snapshot and is retried sooner.
+#
+#   scheduler = refresh.scheduler('default', cache)
+#   orgunits = scheduler.add('orgunits', instance.orgunits, 900, version=lambda: instance.metadata_version('organisationUnits'))
+#   orgunits.get()
+
+SNAPSHOT_FORMAT = '1' # the cache version, a string like every other (SQLiteCache stores it as TEXT)
+RETRY_SECONDS = 60.0
+
+__schedulers = dict()
+__schedulers_lock = threading.Lock()
+
+class Snapshot(object):
+    def __init__(self, value, version, loaded_at, complete=True):
+        self.value = value
+        self.version = version
+        self.loaded_at = loaded_at # epoch seconds
+        self.complete = complete # False for the result of the `initial` loader
+
+    def age(self):
+        return time() - self.loaded_at
+
+    def __str__(self):
+        return 'Snapshot(version: %s, age: %.0fs%s)' % (self.version, self.age(), '' if self.complete else ', partial')
+
+class Refresher(object):
+    def __init__(self, name, loader, interval, version=None, initial=None, cache=None, on_loaded=None):
+        self.name = name
+        self.loader = loader
+        self.interval = interval
+        self.version = version
+        self.initial = initial
+        self.cache = cache # metadata_cache backend the snapshots are persisted in, None to keep them in memory only
+        self.on_loaded = on_loaded # called after the first snapshot is in place (wakes the scheduler)
+        self.error = None
+        self.due = monotonic() + interval
+        self.__snapshot = None
+        self.__first = threading.Lock()
+        self.__running = threading.Lock()
+
+    def snapshot(self):
+        snapshot = self.__snapshot
+        if snapshot is None:
+            with self.__first:
+                if self.__snapshot is None:
+                    self.__snapshot = self.__first_snapshot()
+                    if self.on_loaded is not None:
+                        self.on_loaded()
+            snapshot = self.__snapshot
+        return snapshot
+
+    def get(self):
+        return self.snapshot().value
+
+    def loaded(self):
+        return self.__snapshot is not None
+
+    def ready(self):
+        return self.__snapshot is not None and self.__snapshot.complete
+
+    def __first_snapshot(self):
+        with metrics.span('refresh_first_load', dataset=self.name):
+            if self.cache is not None:
+                stored = self.cache.get('refresh_snapshots', self.name, SNAPSHOT_FORMAT)
+                if stored is not None:
+                    metrics.inc('refresh_total', dataset=self.name, result='restored')
+                    self.due = monotonic() # revalidated by the scheduler right away
+                    return stored
+            if self.initial is not None:
+                metrics.inc('refresh_total', dataset=self.name, result='initial')
+                self.due = monotonic()
+                return Snapshot(self.initial(), None, time(), complete=False)
+        snapshot = self.__load(self.version() if self.version else None)
+        self.due = monotonic() + self.interval
+        return snapshot
+
+    def __load(self, version):
+        snapshot = Snapshot(self.loader(), version, time())
+        if self.cache is not None:
+            self.cache.set('refresh_snapshots', self.name, SNAPSHOT_FORMAT, snapshot)
+        return snapshot
+
+    def refresh(self):
+        # runs on the scheduler's threads; a refresh already in progress is not started twice
+        if not self.__running.acquire(blocking=False):
+            return None
+        ts = perf_counter()
+        try:
+            current = self.__snapshot
+            version = self.version() if self.version else None
+            if current is not None and current.complete and version is not None and version == current.version:
+                current.loaded_at = time()
+                result = 'unchanged'
+            else:
+                self.__snapshot = self.__load(version)
+                result = 'updated'
+            self.error = None
+            self.due = monotonic() + self.interval
+        except Exception as e:
+            self.error = e
+            self.due = monotonic() + min(self.interval, RETRY_SECONDS)
+            result = 'error'
+        finally:
+            self.__running.release()
+        metrics.inc('refresh_total', dataset=self.name, result=result)
+        metrics.observe('refresh_seconds', perf_counter() - ts, dataset=self.name, result=result)
+        return result
+
+    def __str__(self):
+        return 'Refresher(%s, every %gs, %s%s)' % (self.name, self.interval, self.__snapshot or 'not loaded', ', error: %s' % (self.error,) if self.error else '')
+
+class Scheduler(object):
+    def __init__(self, cache=None, workers=2):
+        self.cache = cache
+        self.refreshers = dict()
+        self.__lock = threading.Lock()
+        self.__wake = threading.Event()
+        self.__stop = threading.Event()
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='refresh')
+        self.__thread = None
+
+    def add(self, name, loader, interval, version=None, initial=None, persist=True):
+        # returns the existing refresher when one is registered under the name already
+        with self.__lock:
+            if name not in self.refreshers:
+                self.refreshers[name] = Refresher(name, loader, interval, version, initial, self.cache if persist else None, self.__wake.set)
+            refresher = self.refreshers[name]
+        self.__wake.set()
+        return refresher
+
+    def refresh_now(self, name=None):
+        for refresher in ([self.refreshers[name]] if name else list(self.refreshers.values())):
+            refresher.due = 0.0
+        self.__wake.set()
+
+    def __run(self):
+        # sleeps until the earliest due refresher; adding one, a first read and a finished refresh wake it up
+        pending = dict()
+        while not self.__stop.is_set():
+            self.__wake.clear()
+            for name in [n for n, f in pending.items() if f.done()]:
+                del pending[name]
+            now = monotonic()
+            waits = list()
+            for name, refresher in list(self.refreshers.items()):
+                if name in pending or not refresher.loaded():
+                    continue # nothing is loaded before the first read, which picks restore, initial or full load
+                if refresher.due <= now:
+                    try:
+                        pending[name] = self.__executor.submit(refresher.refresh)
+                    except RuntimeError: # the interpreter is shutting down
+                        return
+                    pending[name].add_done_callback(lambda f: self.__wake.set())
+                else:
+                    waits.append(refresher.due - now)
+            self.__wake.wait(min(waits) if waits else None)
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name='refresh-scheduler', daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        self.__wake.set()
+        self.__executor.shutdown(wait=False)
+
+    def __str__(self):
+        return 'Scheduler(%s)' % (', '.join(str(r) for r in self.refreshers.values()),)
+
+def scheduler(key, cache=None, workers=2):
+    # one running Scheduler per key and process: a caller memoising the result (st.cache) may forget it,
+    # and starting another would leave the old thread refreshing forever
+    with __schedulers_lock:
+        if key not in __schedulers:
+            __schedulers[key] = Scheduler(cache, workers).start()
+        return __schedulers[key]
@@ -1,27 +1,25 @@
 import streamlit as st
 
 import json
-from collections import defaultdict
+from pathlib import Path
 
-import pandas as pd
-import plotly.graph_objs as go
+import streamlit.components.v1 as components
 
+import bundles
+import cassette
 import dhis2
+import federation
+import figures
+import metadata_cache
+import metrics
+import optionb
+import parish_profiles
+import refresh
+import search_index
 #import dhis_mets_or_ug
+from optionb import UG_OU_UID, PCR_DE_UIDS, EHMIS_OPTIONB_MAP
 
-UG_OU_UID = 'akV6429SUqu'
-
-_PCR_DE_UIDS = [
-    ('I0MEbZSbEVs', 'Exposed Infants due for a test (1st PCR, 2nd PCR, 3rd PCR, & Rapid Test)'),
-    ('y2G5UdgSfuk', '1st PCR'),
-    ('XroPkgIGjVS', '2nd PCR'),
-    ('tEYLrsgH6aO', '3rd PCR'),
-    ('oX344XVLe1V', 'Rapid Test'),
-    ('T2UepjeVadz', 'Positive Linked to ART'),
-    ('o9Yy4ibSCWE', 'Positive'),
-]
-
-PCR_DE_UIDS = [ de_id for de_id, de_name in _PCR_DE_UIDS ]
+stages = metrics.Stages('demo_stage') # per-rerun timings of the sections below
 
 
 def render_card_row(row_description, card_details):
@@ -54,14 +52,75 @@ def render_card_row(row_description, card_details):
             st.write(card_html, unsafe_allow_html=True)
 
 
-@st.cache
-def load_dhis2_data(server_url, credentials):
-    instance = dhis2.Dhis2(server_url, credentials)
-    dataelements = instance.dataelements()
-    orgunits = instance.orgunits()
+DISTRICT_LEVEL = 3 # Uganda > sub-region > district > subcounty > facility
+REFRESH_SECONDS = 900.0
+
+@st.cache(allow_output_mutation=True)
+def load_metadata_cache(cache_url):
+    return metadata_cache.open_cache(cache_url)
+
+def load_scheduler(cache_url):
+    # one background refresh thread per server process, snapshots persisted in the metadata cache; kept in
+    # refresh's registry rather than st.cache, so clearing the cache does not start a second one
+    return refresh.scheduler(cache_url, load_metadata_cache(cache_url))
+
+@st.cache(allow_output_mutation=True)
+def load_dhis2_data(server_url, credentials, cache_url=None, cassette_url=None, refresh_seconds=REFRESH_SECONDS):
+    # refreshers, not collections: the first paint only fetches the filtered collections (or restores the
+    # last snapshot), the full ones are loaded and kept current in the background
+    instance = dhis2.Dhis2(server_url, credentials, cache=load_metadata_cache(cache_url), cassette=cassette.open_cassette(cassette_url))
+    scheduler = load_scheduler(cache_url)
+    dataelements = scheduler.add(f'dataelements@{server_url}', instance.dataelements, refresh_seconds,
+        version=lambda: instance.metadata_version('dataElements'), initial=lambda: instance.dataelements(ids=PCR_DE_UIDS, fields='id,name'))
+    orgunits = scheduler.add(f'orgunits@{server_url}', instance.orgunits, refresh_seconds,
+        version=lambda: instance.metadata_version('organisationUnits'), initial=lambda: instance.orgunits(level=DISTRICT_LEVEL, fields='id,name,parent'))
 
     return (instance, dataelements, orgunits)
 
+@st.cache(allow_output_mutation=True)
+def load_optionb_uid_map(server_url, credentials, optionb_server_url, optionb_credentials, cache_url=None, cassette_url=None, optionb_cassette_url=None, refresh_seconds=REFRESH_SECONDS):
+    # eHMIS UIDs are canonical; the OptionB+ UIDs are matched onto them, TT_1 overrides the matching and
+    # stands in until the first match has been made
+    cache = load_metadata_cache(cache_url)
+    fed = federation.optionb_federation(
+        dhis2.Dhis2(server_url, credentials, cache=cache, cassette=cassette.open_cassette(cassette_url)),
+        dhis2.Dhis2(optionb_server_url, optionb_credentials, cache=cache, cassette=cassette.open_cassette(optionb_cassette_url)))
+    return load_scheduler(cache_url).add(f'optionb_uid_map@{optionb_server_url}', lambda: fed.load().uid_map('optionb'), refresh_seconds, initial=lambda: dict(EHMIS_OPTIONB_MAP))
+
+@st.cache(allow_output_mutation=True)
+def load_parish_profiles(profiles_path):
+    return parish_profiles.ParishProfiles(profiles_path)
+
+@st.cache(allow_output_mutation=True)
+def load_figure_cache():
+    return figures.FigureCache()
+
+@st.cache(allow_output_mutation=True)
+def load_map_component():
+    # a static component: Streamlit serves its plotly.js once and the browser caches it
+    return components.declare_component('choropleth_map', path=str(figures.component_dir()))
+
+@st.cache(allow_output_mutation=True)
+def load_search_index(parish_path, mfl_path):
+    df_parish = pd.read_csv(parish_path)
+    df_mfl = pd.read_csv(mfl_path, usecols=['DISTRICT', 'SUBCOUNTY', 'NAME'])
+    # facilities carry eHMIS subcounty names, the selectors use the UBOS ones
+    return search_index.build_search_index(df_parish, df_mfl, map_layers.mfl_subcounty_lookup(df_parish, df_mfl))
+
+@st.cache(allow_output_mutation=True, max_entries=2)
+def load_bundle_store(bundle_dir, index_version):
+    # index_version: a rebuilt bundle directory is picked up on the next rerun
+    return bundles.open_bundle_store(bundle_dir)
+
+def bundle_index_version(bundle_dir):
+    index_path = Path(bundle_dir) / bundles.INDEX_NAME
+    return index_path.stat().st_mtime_ns if index_path.exists() else None
+
+@st.cache(allow_output_mutation=True)
+def start_metrics_server(port):
+    # Prometheus text on /metrics, the raw spans on /metrics.json
+    return metrics.REGISTRY.serve(port)
+
 st.set_page_config(layout='wide', page_title='Shema-Rwahi Demo')
 
 query_params = st.experimental_get_query_params()
@@ -78,6 +137,12 @@ if 'u_passcode' not in st.session_state:
         else:
             st.stop()
 
+# pandas and numpy (with map_layers, which needs both) are only imported once the passcode has been
+# accepted; plotly only when a figure shell is built
+import pandas as pd
+
+import map_layers
+
 #with open('Coat_of_arms_of_Uganda.svg', 'r') as uganda_arms_file:
 #    st.sidebar.image((''.join(l for l in uganda_arms_file))[113:], caption='Government of Uganda', width=48)
 left_col, centre_col, right_col = st.beta_columns([1, 1, 1])
@@ -87,90 +152,201 @@ with left_col:
 with centre_col:
     st.title('MIS dashboard demo')
 
+if st.secrets.get('METRICS_PORT'):
+    start_metrics_server(int(st.secrets['METRICS_PORT']))
+
+stages.lap('page_setup')
+
 #mets_inst, dataelements, orgunits = load_dhis2_data(dhis_mets_or_ug.DHIS2_SERVER_URL, dhis_mets_or_ug.credentials)
-mets_inst, dataelements, orgunits = load_dhis2_data(st.secrets['DHIS2_SERVER_URL'], tuple(st.secrets['credentials']))
+METADATA_CACHE_URL = st.secrets.get('METADATA_CACHE') # e.g. 'sqlite:////var/cache/parish_demo/metadata.sqlite', shared by every server process on the host
+
+DHIS2_CASSETTE_URL = st.secrets.get('DHIS2_CASSETTE') # e.g. 'replay:///cassettes/ehmis' to run without the server (see cassette.py)
+OPTIONB_CASSETTE_URL = st.secrets.get('OPTIONB_CASSETTE') # the same for the OptionB+ server
+BUNDLE_DIR = st.secrets.get('BUNDLE_DIR') # read-only mode: every view is served from the bundles written by bundles.py
+REFRESH_SECONDS = float(st.secrets.get('REFRESH_SECONDS', REFRESH_SECONDS)) # background refresh interval of the DHIS2 metadata and the input files
+
+store = load_bundle_store(BUNDLE_DIR, bundle_index_version(BUNDLE_DIR)) if BUNDLE_DIR else None
+if BUNDLE_DIR and store is None:
+    # no build yet (or bundles.py is still writing the first one): render from the live sources instead
+    st.warning(f'No bundles in {BUNDLE_DIR}, showing live data')
+    BUNDLE_DIR = None
+if not BUNDLE_DIR:
+    mets_inst, dataelements_refresher, orgunits_refresher = load_dhis2_data(st.secrets['DHIS2_SERVER_URL'], tuple(st.secrets['credentials']), METADATA_CACHE_URL, DHIS2_CASSETTE_URL, REFRESH_SECONDS)
+    # one snapshot per rerun, a refresh finishing halfway through only shows on the next one
+    dataelements, orgunits = dataelements_refresher.get(), orgunits_refresher.get()
 #st.write([(de['id'], de['name']) for de in (dataelements[de_id] for de_id in PCR_DE_UIDS)])
+OPTIONB_UID_MAP = EHMIS_OPTIONB_MAP
+if st.secrets.get('OPTIONB_SERVER_URL') and not BUNDLE_DIR:
+    OPTIONB_UID_MAP = load_optionb_uid_map(st.secrets['DHIS2_SERVER_URL'], tuple(st.secrets['credentials']), st.secrets['OPTIONB_SERVER_URL'], tuple(st.secrets['optionb_credentials']), METADATA_CACHE_URL, DHIS2_CASSETTE_URL, OPTIONB_CASSETTE_URL, REFRESH_SECONDS).get()
+stages.lap('load_dhis2_data')
 
+profiles = load_parish_profiles('parish_profiles.json')
 
-df_mfl = pd.read_csv('UG_MFL_2021-04-21.csv')
-
-df_districts = df_mfl[df_mfl['NAME'].isnull() & df_mfl['SUBCOUNTY'].isnull()].dropna(subset=['DISTRICT'])
 REGIONS = [
     'Northern Region',
     'Eastern Region',
     'Central Region',
     'Western Region',
 ]
-df_districts['region_index'] = df_districts['REGION'].map(lambda x: REGIONS.index(x) * 4)
-#st.write(df_districts)
-
-# st.write(f'Number of districts: {len(df_districts)}')
 
+MFL_PATH = st.secrets.get('MFL_PATH', 'UG_MFL_2021-04-21.csv')
+OPTIONB_PATH = st.secrets.get('OPTIONB_PATH', 'optionb_plus2.csv')
+PARISH_GEOJSON_PATH = st.secrets.get('PARISH_GEOJSON_PATH') # UBOS parish boundaries with District/Subcounty/Parish properties
 UBOS_PARISH_PATH = 'ubos_parish'
 parish_path = 'ubos_parish/ALL_POP.csv'
 
-df_parish = pd.read_csv(parish_path)
-#st.write(df_parish)
-df_district_pop = df_parish[['District','Pop_Total']].groupby(['District',], as_index=False).sum()
-df_district_pop['DISTRICT'] = df_district_pop['District'].apply(lambda x: x + ' District')
-# st.write(df_district_pop)
-df_districts = pd.merge(df_districts, df_district_pop, on=['DISTRICT',])
-# st.write(df_districts)
-
-df_districts_unmappable = df_districts[df_districts['COORDINATES'] == '""']
-df_districts_mappable = df_districts[df_districts['COORDINATES'] != '""']
-
-# st.write('Unmappable districts:')
-# st.write(df_districts_unmappable[['REGION', 'SUB_REGION', 'DISTRICT', 'COORDINATES']])
-
-district_geojson = { 'type': 'FeatureCollection', 'features': list() }
-mappable_district_uids = list()
-
-for row in df_districts.itertuples():
-    d = {
-    'type': 'Feature',
-    'geometry': json.loads(row.COORDINATES),
-    'properties': { 'name': row.DISTRICT, 'region': row.REGION, 'subregion': row.SUB_REGION, 'uid': row.UID },
-    'id': row.DISTRICT,
-    }
-    district_geojson['features'].append(d)
-    if row.UID not in ['bJgx6UjvyoP']:
-        mappable_district_uids.append(row.UID)
+def build_district_tables(mfl_path, parish_path):
+    build = metrics.Stages('demo_build')
+    df_mfl = pd.read_csv(mfl_path)
+    build.lap('read_mfl')
+
+    df_districts = df_mfl[df_mfl['NAME'].isnull() & df_mfl['SUBCOUNTY'].isnull()].dropna(subset=['DISTRICT'])
+    df_districts['region_index'] = df_districts['REGION'].map(lambda x: REGIONS.index(x) * 4)
+    #st.write(df_districts)
+
+    # st.write(f'Number of districts: {len(df_districts)}')
+
+    build.lap('filter_districts')
+
+    df_parish = pd.read_csv(parish_path)
+    build.lap('read_ubos')
+    #st.write(df_parish)
+    df_district_pop = df_parish[['District','Pop_Male','Pop_Female','Pop_Total']].groupby(['District',], as_index=False).sum()
+    df_district_pop['DISTRICT'] = df_district_pop['District'].apply(lambda x: x + ' District')
+    # st.write(df_district_pop)
+    df_districts = pd.merge(df_districts, df_district_pop, on=['DISTRICT',])
+    # st.write(df_districts)
+    build.lap('groupby_population')
+
+    df_districts_unmappable = df_districts[df_districts['COORDINATES'] == '""']
+    df_districts_mappable = df_districts[df_districts['COORDINATES'] != '""']
+
+    # st.write('Unmappable districts:')
+    # st.write(df_districts_unmappable[['REGION', 'SUB_REGION', 'DISTRICT', 'COORDINATES']])
+
+    district_geojson = { 'type': 'FeatureCollection', 'features': list() }
+    mappable_district_uids = list()
+
+    for row in df_districts.itertuples():
+        d = {
+        'type': 'Feature',
+        'geometry': json.loads(row.COORDINATES),
+        'properties': { 'name': row.DISTRICT, 'region': row.REGION, 'subregion': row.SUB_REGION, 'uid': row.UID },
+        'id': row.DISTRICT,
+        }
+        district_geojson['features'].append(d)
+        if row.UID not in ['bJgx6UjvyoP']:
+            mappable_district_uids.append(row.UID)
+    build.lap('geojson')
+
+    return (df_parish, df_districts, df_districts_mappable, district_geojson)
+
+def file_version(*paths):
+    return ';'.join('%s:%d:%d' % (p, Path(p).stat().st_mtime_ns, Path(p).stat().st_size) for p in paths)
+
+@st.cache(allow_output_mutation=True)
+def load_district_tables(mfl_path, parish_path, cache_url, refresh_seconds=REFRESH_SECONDS):
+    # rebuilt in the background when an input file changes; derived tables are shared between server
+    # processes through the metadata cache, keyed on the input files
+    cache = load_metadata_cache(cache_url)
+    def build():
+        if cache is None:
+            return build_district_tables(mfl_path, parish_path)
+        return cache.get_or_set('district_tables', f'{mfl_path}|{parish_path}', file_version(mfl_path, parish_path), lambda: build_district_tables(mfl_path, parish_path))
+    return load_scheduler(cache_url).add(f'district_tables@{mfl_path}|{parish_path}', build, refresh_seconds, version=lambda: file_version(mfl_path, parish_path), persist=False)
+
+@st.cache(allow_output_mutation=True)
+def load_optionb_values(optionb_path, cache_url, refresh_seconds=REFRESH_SECONDS):
+    return load_scheduler(cache_url).add(f'optionb_values@{optionb_path}', lambda: pd.read_csv(optionb_path), refresh_seconds, version=lambda: file_version(optionb_path), persist=False)
+
+if not BUNDLE_DIR:
+    district_tables = load_district_tables(MFL_PATH, parish_path, METADATA_CACHE_URL, REFRESH_SECONDS).snapshot()
+    optionb_values = load_optionb_values(OPTIONB_PATH, METADATA_CACHE_URL, REFRESH_SECONDS).snapshot()
+    df_parish, df_districts, df_districts_mappable, district_geojson = district_tables.value
+    df_optionb_all = optionb_values.value
+
+@st.cache(allow_output_mutation=True, max_entries=len(map_layers.LEVELS) * 2, hash_funcs={ refresh.Snapshot: lambda snapshot: snapshot.version })
+def load_map_layer(level, mfl_path, parish_path, parish_geojson_path, optionb_uid_map, district_tables, optionb_values):
+    # the snapshots are hashed by their version and no module global holding data is read here: st.cache
+    # hashes those on every call, which would cost a pass over the district GeoJSON on each rerun
+    if level == 'Parish':
+        return map_layers.parish_layer(parish_geojson_path, pd.read_csv(parish_path))
+    if level == 'Subcounty':
+        return map_layers.subcounty_layer(pd.read_csv(mfl_path), pd.read_csv(parish_path))
+    _, _, df_districts_mappable, district_geojson = district_tables.value
+    layer_geojson, df_layer = map_layers.district_layer(df_districts_mappable, district_geojson)
+    map_layers.add_tested_per_1000(df_layer, optionb_values.value, optionb.PCR_DE_UIDS[1:5], optionb_uid_map)
+    return layer_geojson, df_layer
+stages.lap('load_district_tables')
 
 # st.write(district_geojson['features'][:2])
 
 left_col, center_col, right_col = st.beta_columns([4, 1, 4])
 with right_col:
-    st.write("<b>1 - Production, Processing, Value Addition and Marketing</b>", unsafe_allow_html=True)
-    st.write("<b>2 - Infrastructure and Economic Services</b>", unsafe_allow_html=True)
-    st.write("<b>3 - Financial Inclusion</b>", unsafe_allow_html=True)
-    st.write("<b>4 - Health</b>", unsafe_allow_html=True)
-    st.write("<b>5 - Education</b>", unsafe_allow_html=True)
-    st.write("<b>6 - Social Services Delivery</b>", unsafe_allow_html=True)
-    st.write("<b>7 - Community Information</b>", unsafe_allow_html=True)
-    st.write("<b>8 - Governance and Administration</b>", unsafe_allow_html=True)
-    st.write("<b>9 - Mindset Change</b>", unsafe_allow_html=True)
-
-fig = go.Figure(go.Choroplethmapbox(geojson=district_geojson, locations=df_districts_mappable.DISTRICT, z=df_districts.Pop_Total, colorscale='temps', marker_opacity=0.5, marker_line_width=0))
-fig.update_layout(mapbox_style="carto-positron", mapbox_zoom=5.5, mapbox_center = {"lat": 0.6226, "lon": 32.3271})
-fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-left_col.write(fig)
+    for i, (_, pillar_title) in enumerate(parish_profiles.PILLARS, start=1):
+        st.write(f"<b>{i} - {pillar_title}</b>", unsafe_allow_html=True)
 
+with left_col:
+    if BUNDLE_DIR:
+        map_level = st.selectbox('Map level:', options=store.map_levels())
+        layer_geojson, df_layer = store.map_layer(map_level)
+    else:
+        map_level = st.selectbox('Map level:', options=[l for l in map_layers.LEVELS if l != 'Parish' or PARISH_GEOJSON_PATH])
+        layer_geojson, df_layer = load_map_layer(map_level, MFL_PATH, parish_path, PARISH_GEOJSON_PATH, OPTIONB_UID_MAP, district_tables, optionb_values)
+    layer_metrics = map_layers.layer_metrics(df_layer)
+    if layer_metrics:
+        map_metric, _ = st.selectbox('Map metric:', options=layer_metrics, format_func=lambda x: x[1])
+
+        # the figure JSON is cached per (level, metric, geometry version), only the z values differ between metrics
+        figure_cache = load_figure_cache()
+        if BUNDLE_DIR:
+            geometry_version = values_version = store.version()
+        else:
+            # the layers are joined onto the UBOS parish table, its version decides the locations as much as the boundaries do
+            geometry_version = district_tables.version if map_level != 'Parish' else file_version(PARISH_GEOJSON_PATH, parish_path)
+            values_version = '%s|%s' % (district_tables.version, optionb_values.version)
+        map_json = figure_cache.figure_json(map_level, f'{map_metric}@{values_version}', geometry_version, layer_geojson, df_layer['location'], df_layer[map_metric], colorscale='temps', marker_opacity=0.5, marker_line_width=0)
+        load_map_component()(figure=map_json, height=450, key='map', default=None)
+    else:
+        st.write(f'No {map_level.lower()} boundaries could be matched to population data')
+stages.lap('map_figure')
 
 
-district_tuples = [tuple(x) for _, *x in df_districts.filter(items=['DISTRICT', 'UID']).itertuples()]
 
 MISSING_DISTRICTS = ('Kassanda District', 'Obongi District', 'Terego District') # eHMIS districts that are not in OptionB
-MISMATCH_DISTRICTS = [(x_name, x_uid) for x_name, x_uid in district_tuples if x_uid not in orgunits]
+if BUNDLE_DIR:
+    district_tuples = store.districts()
+else:
+    district_tuples = [tuple(x) for _, *x in df_districts.filter(items=['DISTRICT', 'UID']).itertuples()]
+    MISMATCH_DISTRICTS = [(x_name, x_uid) for x_name, x_uid in district_tuples if x_uid not in orgunits]
 # for x_name, x_uid in MISMATCH_DISTRICTS:
 #     #st.write((x_name, x_uid))
 #     if x_name not in MISSING_DISTRICTS:
 #         x_ou = orgunits.lookup_name(x_name)
 #         st.write((x_name, x_uid, x_ou['id']))
 
+# type-ahead jump: picking a match preselects the district, subcounty and parish selectors below
+places = store.search_index() if BUNDLE_DIR else load_search_index(parish_path, MFL_PATH)
+search_col, match_col = st.beta_columns([1, 2])
+with search_col:
+    search_text = st.text_input('Jump to a place:')
+if search_text:
+    with match_col:
+        with metrics.span('search_query'):
+            matches = places.query(search_text, limit=20)
+        match_selected = st.selectbox('Matches:', options=[None, *matches], format_func=lambda x: '' if x is None else places.label(x))
+    if match_selected is not None:
+        st.session_state['jump_target'] = places.paths[match_selected]
+jump_district, jump_subcounty, jump_parish = st.session_state.get('jump_target', (None, None, None))
+
+def option_index(options, wanted, format_func=str):
+    return next((i for i, option in enumerate(options) if wanted is not None and format_func(option) == wanted), 0)
+stages.lap('search')
+
 left_col, center_col, right_col = st.beta_columns([1, 1, 1])
 with left_col:
-    district_selected = st.selectbox('Select a district:', options=[('<No District>', UG_OU_UID),*district_tuples], format_func=lambda x: x[0])
+    district_options = [('<No District>', UG_OU_UID),*district_tuples]
+    district_selected = st.selectbox('Select a district:', options=district_options, index=option_index(district_options, jump_district, lambda x: x[0]), format_func=lambda x: x[0])
 
 district_name, district_uid = district_selected
 if district_uid != UG_OU_UID:
@@ -180,69 +356,30 @@ else:
     district_name = 'Uganda'
     # st.write(f'No Chosen District (defaulting to National {district_name})')
 
-#TODO: national eHMIS and OptionB don't agree on Kampala District (and others??)
-TT_1 = [
-    ('Amudat District', 'a8RHFdF4DXL', 'h8RHFdF4DXL'),
-    ('Bugweri District', 'AIonX4LaJeU', 'JzUtuySAs8W'),
-    ('Bunyangabu District', 'iTfbtn6JUsN', 'uAUn3ZcQ6Kt'),
-    ('Butebo District', 'FDPqRvcW3NN', 'y2TckWz9CPy'),
-    ('Buvuma District', 'aZLZPPjqft0', 'bZLZPPjqft0'),
-    ('Jinja District', 'aJR2ZxSH7g4', 'gJR2ZxSH7g4'),
-    ('Kabarole District', 'm77oR1YJESj', 'fIbu0dVl0gz'),
-    ('Kagadi District', 'orgY0d5MJa9', 'LtyM5HnzFui'),
-    ('Kakumiro District', 'Lnewt3iIJaK', 'HRakdY52JPf'),
-    ('Kalaki District', 'KOnkIf4N6jA', 'TCtwiCWcvMh'),
-    ('Kampala District', 'aXmBzv61LbM', 'rzsbhKKYISq'),
-    ('Kamwenge District', 'uCVQXAdKqL9', 'VbX669lGEiY'),
-    ('Kanungu District', 'aphcy5JTnd6', 'ophcy5JTnd6'),
-    ('Kapchorwa District', 'aginheWSLef', 'iginheWSLef'),
-    ('Kapelebyong District', 'mvN9LBbpf7X', 'OK3JLtXYKzL'),
-    ('Karenga District', 'Hmh5JQLls1d', 'XrzjPNEakFG'),
-    ('Kasese District', 'aa8xVDzSpte', 'fa8xVDzSpte'),
-    ('Kazo District', 'AS2Seq1grGE', 'BJ9capKA8Kg'),
-    ('Kibaale District', 'tM3DsJxMaMX', 'AtnLKczpkvP'),
-    ('Kikuube District', 'L5WBetpBpY3', 'fXT6ayIyYeH'),
-    ('Kisoro District', 'aPhSZRinfbg', 'dPhSZRinfbg'),
-    ('Kitagwenda District', 'qKmESX5Owwr', 'ROQiyOthHFm'),
-    ('Kwania District', 'gCN6sU5BjlR', 'es2NjGbxNBy'),
-    ('Kyegegwa District', 'a9tQqo1rSj7', 'g9tQqo1rSj7'),
-    ('Kyotera District', 'REJuxCmTwXG', 'UcOzqLVFJVo'),
-    ('Lwengo District', 'aqpd0Y9eXZ2', 'bqpd0Y9eXZ2'),
-    ('Lyantonde District', 'aPRNSGUR3vk', 'ePRNSGUR3vk'),
-    ('Madi-Okollo District', 'bLoH4VbxCGI', 'eqfJd1Yk9u4'),
-    ('Mbarara District', 'auswb7JO9wY', 'huswb7JO9wY'),
-    ('Mpigi District', 'YMMexeHFUay', 'bFlqjkzbC8N'),
-    ('Mukono District', 'a0DfYpC2Rwl', 'd0DfYpC2Rwl'),
-    ('Nabilatuk District', 'mOXva2xiwQv', 'Ma6LKsXVlDm'),
-    ('Nakaseke District', 'aSbgVKaeCP0', 'oSbgVKaeCP0'),
-    ('Nakasongola District', 'aUcYGQCK9ub', 'hUcYGQCK9ub'),
-    ('Namisindwa District', 'TGzZPOmbgn8', 's3X2onnu3iE'),
-    ('Ngora District', 'aj4hsYK3dVm', 'hj4hsYK3dVm'),
-    ('Omoro District', 'S5fvUXgY54J', 'yIWARgfOvr1'),
-    ('Otuke District', 'aXjub1BYn1y', 'dXjub1BYn1y'),
-    ('Pader District', 'aBrjuZk0W31', 'gBrjuZk0W31'),
-    ('Pakwach District', 'uqUyTPvQKII', 'StgiDC6czID'),
-    ('Rubanda District', 'wZrfAgC3WrU', 'N9zP0kGK7Ld'),
-    ('Rukiga District', 'fsP0Wxie1UW', 'mb3idsHFRl6'),
-    ('Rwampara District', 'tsugXWRXwGu', 'WDgr6qVSjB6'),
-]
-EHMIS_OPTIONB_MAP = { ehmis_uid:optionb_uid for _, ehmis_uid, optionb_uid in TT_1 }
-if district_uid in EHMIS_OPTIONB_MAP:
-    district_uid = EHMIS_OPTIONB_MAP[district_uid]
+if district_uid in OPTIONB_UID_MAP:
+    district_uid = OPTIONB_UID_MAP[district_uid]
 #if district_uid == 'aXmBzv61LbM': # Kampala
 #    district_uid = 'rzsbhKKYISq'
 #if district_uid == 'Gwk4wkLz7EW': # Gulu
 #    district_uid = 'tEYLrsgH6aO'
 
 if district_name != 'Uganda':
-    df_district_parishes = df_parish[df_parish['District'] == district_name.replace(' District', '')]
+    if BUNDLE_DIR:
+        district_bundle = store.district(district_name)
+        district_subcounties = district_bundle['subcounties'] if district_bundle is not None else list()
+    else:
+        df_district_parishes = df_parish[df_parish['District'] == district_name.replace(' District', '')]
     # st.write(df_district_parishes)
     
     with center_col:
-        subcounty_arr = df_district_parishes['Subcounty'].unique()
+        if BUNDLE_DIR:
+            subcounty_arr = [sc['name'] for sc in district_subcounties]
+        else:
+            subcounty_arr = df_district_parishes['Subcounty'].unique()
         # st.write(subcounty_arr)
         subcounty_tuples = [(x,x) for x in subcounty_arr]
-        subcounty_selected = st.selectbox('Select subcounty:', options=['<No Subcounty>', *subcounty_arr])
+        subcounty_options = ['<No Subcounty>', *subcounty_arr]
+        subcounty_selected = st.selectbox('Select subcounty:', options=subcounty_options, index=option_index(subcounty_options, jump_subcounty if jump_district == district_name else None))
         if subcounty_selected != '<No Subcounty>':
             subcounty_name = str(subcounty_selected)
         else:
@@ -250,318 +387,74 @@ if district_name != 'Uganda':
 
     if subcounty_name:
         with right_col:
-            parish_arr = df_district_parishes[df_district_parishes['Subcounty'] == subcounty_name]['Parish'].unique()
+            if BUNDLE_DIR:
+                parish_arr = [p['name'] for sc in district_subcounties if sc['name'] == subcounty_name for p in sc['parishes']]
+            else:
+                parish_arr = df_district_parishes[df_district_parishes['Subcounty'] == subcounty_name]['Parish'].unique()
             # st.write(parish_arr)
             parish_tuples = [(x,x) for x in parish_arr]
-            parish_selected = st.selectbox('Select parish:', options=['<No parish>', *parish_arr])
+            parish_options = ['<No parish>', *parish_arr]
+            parish_selected = st.selectbox('Select parish:', options=parish_options, index=option_index(parish_options, jump_parish if jump_subcounty == subcounty_name else None))
             if parish_selected != '<No parish>':
                 parish_name = str(parish_selected)
             else:
                 parish_name = None
     
-    df_subcounty_pop = df_district_parishes[['District', 'County', 'Subcounty', 'Parish', 'Pop_Total']].groupby(['District', 'County', 'Subcounty']).sum()
-    # st.write(df_subcounty_pop)
+    if not BUNDLE_DIR:
+        df_subcounty_pop = df_district_parishes[['District', 'County', 'Subcounty', 'Parish', 'Pop_Total']].groupby(['District', 'County', 'Subcounty']).sum()
+        # st.write(df_subcounty_pop)
 
-    # for row in df_subcounty_pop.itertuples():
-    #     st.write(row)
+        # for row in df_subcounty_pop.itertuples():
+        #     st.write(row)
 
-    # st.write({ row[0][-1]: [row[1],] for row in df_subcounty_pop.itertuples() })
-    tt = df_district_parishes[['Subcounty', 'Parish', 'Pop_Total']].groupby(['Subcounty',]).agg(parish_list=('Parish', lambda x: ', '.join(x)), subcounty_pop=('Pop_Total', sum))
-    # st.write(tt)
-    # st.write({ row[0]: [row[2], row[1]] for row in tt.itertuples() })
+        # st.write({ row[0][-1]: [row[1],] for row in df_subcounty_pop.itertuples() })
+        tt = df_district_parishes[['Subcounty', 'Parish', 'Pop_Total']].groupby(['Subcounty',]).agg(parish_list=('Parish', lambda x: ', '.join(x)), subcounty_pop=('Pop_Total', sum))
+        # st.write(tt)
+        # st.write({ row[0]: [row[2], row[1]] for row in tt.itertuples() })
     # render_card_row(f'Population Statistics [{len(df_subcounty_pop)} subcounties, {len(df_district_parishes)} parishes]', { row[0]: [row[2], row[1]] for row in tt.itertuples() })
 else:
     subcounty_name = None
     parish_name = None
 
-# df_optionb_all = pd.read_csv('optionb_plus.csv')
-df_optionb_all = pd.read_csv('optionb_plus2.csv')
-df_optionb = df_optionb_all[df_optionb_all['Organisation unit'] == district_uid]
-df_optionb['shortName'] = df_optionb['Data'].map(lambda x: dataelements[x]['name'][6:].replace('Tested ', '', 1).replace('Total Number ', '', 1))
-# st.write(df_optionb) # DEBUG: OptionB+ cascade for selected district
-
-xx = { a: (d, c) for _, a, b, c, d in df_optionb.itertuples() }
-
-pcr_cascade = [xx.get(uid) for uid in PCR_DE_UIDS[:5]] # first 5 form the cascade
-linkage_cascade = [xx.get(uid) for uid in PCR_DE_UIDS[5:]] # last 2 form the linkage
-if (not all(pcr_cascade) or not all(linkage_cascade)): # TODO: very conservative check!
-    pmtct_title = f'HIV Mother-to-Child: 2021W16 ({district_name})'
-    pmtct = {
-        'Reporting Rate': [ 'N/A', 'No data available' ],
-        'Babies tested': [ 'N/A', 'No data available' ],
-        'HIV+ infants linked to care': [ 'N/A', 'No data available' ],
-    }
-else:
-    (_, pcr_eid), *pcr_cascade = pcr_cascade
-    pcr_cascade_text = ', '.join([f'<span><a>{int(val)}</a></span> :{name}' for name, val in pcr_cascade])
-    pcr_rate = sum((v for _, v in pcr_cascade)) / int(pcr_eid)
-
-    linkage_cascade_text = ', of '.join([f'<span><a>{int(val)}</a></span> {name}' for name, val in linkage_cascade])
-    if linkage_cascade[1][1] == 0:
-        linkage_rate = 1
-        linkage_cascade_text = 'Zero HIV+ cases found in Exposed Infants'
-    else:
-        linkage_rate = linkage_cascade[0][1] / linkage_cascade[1][1]
-
-    #st.write(pcr_cascade, pcr_rate)
-    #st.write(pcr_cascade_text, unsafe_allow_html=True)
-    #st.write(linkage_cascade, linkage_rate)
-    #st.write(linkage_cascade_text, unsafe_allow_html=True)
-
-    pmtct_title = f'HIV Mother-to-Child: 2021W16 ({district_name})'
-    pmtct = {
-        'Reporting Rate': [ '19%', '<a href="#">317</a> of <a href="#">1648</a> reports received' ],
-        'Babies tested': [ f'{pcr_rate:.1%}', f'({pcr_cascade_text}) of {int(pcr_eid)} Exposed Infants' ],
-        'HIV+ infants linked to care': [ f'{linkage_rate:.1%}', linkage_cascade_text ],
-    }
+stages.lap('selection')
 
+if BUNDLE_DIR:
+    if district_name == 'Uganda':
+        pmtct_title, pmtct = store.national_pmtct()
+    elif district_bundle is not None:
+        pmtct_title, pmtct = district_bundle['pmtct']
+    else: # a district the bundles were built without: the 'No data available' cards
+        pmtct_title, pmtct = optionb.pmtct_cards(dict(), district_name)
+else:
+    # df_optionb_all = pd.read_csv('optionb_plus.csv')
+    pmtct_title, pmtct = optionb.pmtct_cards(optionb.cascade_values(df_optionb_all, district_uid, optionb.de_short_names(dataelements)), district_name)
+    # st.write(pmtct) # DEBUG: OptionB+ cascade for selected district
 
 # render_card_row(pmtct_title, pmtct)
+stages.lap('optionb_cascade')
 
 if district_name and subcounty_name and parish_name:
     # st.write(df_subcounty_pop)
-    tt = df_district_parishes[(df_district_parishes['District'] == district_name.replace(' District', '')) & (df_district_parishes['Subcounty'] == subcounty_name) & (df_district_parishes['Parish'] == parish_name)]
-    parish_pop = tt['Pop_Total'].values[0]
+    if BUNDLE_DIR:
+        parish_bundle = store.parish(district_name, subcounty_name, parish_name) or { 'population': { 'Pop_Total': 'N/A' }, 'profile': dict() }
+        parish_pop = parish_bundle['population']['Pop_Total']
+    else:
+        tt = df_district_parishes[(df_district_parishes['District'] == district_name.replace(' District', '')) & (df_district_parishes['Subcounty'] == subcounty_name) & (df_district_parishes['Parish'] == parish_name)]
+        parish_pop = tt['Pop_Total'].values[0]
     # st.write(tt)
     st.header(f"{parish_name} Parish [Population: {parish_pop}] - {subcounty_name}, {district_name}")
     # st.header("Katooma Parish [Population: 5589] - Rwahi Town Council, Ntungamo District")
 
-    with st.beta_expander("Production, Processing, Value Addition and Marketing"):
-        st.write("""
-<ol>
-    <li><h3>Production</h3>
-        <ul>
-        <li>Crops Grown for Commercial purposes
-            <ul>
-                <li>
-                <div>Onions</div>
-                <p>
-                Number of registered growers: 411<br/>
-                Number of registered grower associations: 17<br/>
-                Number of approved storage facilities: 2<br/>
-                Quantity (tonnes) sold: 1754.5<br/>
-                Farm gate price (UGX/tonnes): 70000<br/>
-                </p>
-                </li>
-                <li>Sweet Potatoes</li>
-                <li>Cabbages</li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Processing</h3>
-        <ul>
-        <li>Processed Agricultural Produce
-            <ul>
-                <li>
-                <div>Onions (Sun-dried)</div>
-                Quantity (tonnes): 600</br>
-                </li>
-                <li>
-                <div>Onion slices (package)</div>
-                Quantity (tonnes): 97</br>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Value Addition</h3>
-        <ul>
-        <li>Value Added Agricultural Produce
-            <ul>
-                <li>
-                <div>Onion Powder</div>
-                Quantity (tonnes): 230</br>
-                Value-adding groups/entities: Rwahi Spice Cooperative</br>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Marketing</h3>
-        <ul>
-        <li>Marketing Association
-            <ul>
-                <li>
-                <div>Onions</div>
-                Farmers Cooperative: Banyankole Kweterana</br>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-</ol>
-"""
-        , unsafe_allow_html=True)
-    with st.beta_expander("Infrastructure and Economic Services"):
-        st.write("""
-<ol>
-    <li><h3>Electricity</h3>
-        <ul>
-        <li>Electricity Coverage
-            <ul>
-                <li>
-                <p>
-                Number of households connected to grid power: 411<br/>
-                Number of households using solar: 17<br/>
-                Number of using traditional lighting (tadooba etc): 2<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Roads</h3>
-        <ul>
-        <li>Road Coverage
-            <ul>
-                <li>
-                Tarmac Road (kms): 12</br>
-                Murram Road (kms): 10</br>
-                Impassable Road (kms): 8</br>
-                </li>
-            </ul>
-        </li>
-        <li>Bridges
-            <ul>
-                <li>
-                Existing: 1</br>
-                Needed: 1</br>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Markets</h3>
-        <ul>
-        <li>Regular Goods Markets
-            <ul>
-                <li>
-                <p>
-                Weekly Markets: 2<br/>
-                Permanent Markets: 1<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-</ol>
-"""
-        , unsafe_allow_html=True)
-    with st.beta_expander("Financial Inclusion"):
-        st.write("""
-<ol>
-    <li><h3>Banks and Savings Societies</h3>
-    </li>
-    <li><h3>Access to Credit</h3>
-        <ul>
-        <li>SACCOs and Cooperatives
-            <ul>
-                <li>
-                <p>
-                Number of savings organisations: 411<br/>
-                Number of savers/participants: 411<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        <li>Grants, Youth Development funds
-            <ul>
-                <li><div>Youth Development Loans/Grants</div>
-                <p>
-                Number of youth associations that have received loans: 17<br/>
-                Number of youth associations that have received loans: 17<br/>
-                </p>
-                </li>
-                <li><div>Emyooga<div>
-                <p>
-                Number of beneficiary associations: 411<br/>
-                Number of members of beneficiary associations: 17<br/>
-                </p>
-                </li>
-                <li><div>Byona Bagagawale<div>
-                <p>
-                Number of beneficiary associations: 411<br/>
-                Number of members of beneficiary associations: 17<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-</ol>
-"""
-        , unsafe_allow_html=True)
-    with st.beta_expander("Health"):
-        pass
-    with st.beta_expander("Education"):
-        pass
-    with st.beta_expander("Social Service Delivery"):
-        st.write("""
-<ol>
-    <li><h3>Water and Sanitation</h3>
-        <ul>
-        <li>Water Sources
-            <ul>
-                <li>
-                <p>
-                Piped and Tap: 411<br/>
-                Boreholes: 411<br/>
-                Wells: 411<br/>
-                Open Waterbodies (lakes, rivers, streams): <br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        <li>Hygiene
-            <ul>
-                <li><div>Access to Toilet facilities</div>
-                <p>
-                Modern Latrine: 17<br/>
-                Other toilet facility: 17<br/>
-                </p>
-                </li>
-                <li><div>Manner of Waste Disposal<div>
-                <p>
-                Percentage of households that properly dispose of solid waste: 17<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-    <li><h3>Social Development Services</h3>
-    </li>
-</ol>
-"""
-        , unsafe_allow_html=True)
-    with st.beta_expander("Community Information"):
-        pass
-    with st.beta_expander("Governance and Administration"):
-        st.write("""
-<ol>
-    <li><h3>Local Government</h3>
-        <ul>
-        <li>Local Leadership
-            <ul>
-                <li>
-                <p>
-                Number of local council officials: 6<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                &lt;Name&gt; &lt;Designation&gt;<br/>
-                </p>
-                </li>
-            </ul>
-        </li>
-        </ul>
-    </li>
-</ol>
-"""
-        , unsafe_allow_html=True)
-    with st.beta_expander("Mindset Change"):
-        pass
+    selected_parish = (district_name.replace(' District', ''), subcounty_name, parish_name)
+    for pillar_key, _ in parish_profiles.PILLARS:
+        with st.beta_expander(parish_profiles.EXPANDER_TITLES[pillar_key]):
+            pillar_html = parish_bundle['profile'].get(pillar_key) if BUNDLE_DIR else profiles.render(selected_parish, pillar_key)
+            if pillar_html:
+                st.write(pillar_html, unsafe_allow_html=True)
+            else:
+                st.write('No data available')
+
+stages.lap('parish_profile')
+metrics.observe('demo_rerun_seconds', sum(seconds for _, seconds in stages.laps))
+if st.secrets.get('METRICS_JSON'):
+    metrics.REGISTRY.dump_json(st.secrets['METRICS_JSON'])
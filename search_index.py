@@ -0,0 +1,146 @@
+from bisect import bisect_left
+from collections import Counter
+import re
+
+# Type-ahead search over every district, county, subcounty, parish and facility name. Built once;
+# queries are bisections into sorted name and word-suffix lists, with a trigram index as the
+# fallback for misspellings.
+
+LEVELS = ('District', 'County', 'Subcounty', 'Parish', 'Facility')
+LEVEL_RANK = { level: rank for rank, level in enumerate(LEVELS) }
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+COMMON_TRIGRAM_POSTINGS = 1000
+
+def normalise(text):
+    return NON_ALNUM.sub(' ', str(text).casefold()).strip()
+
+def trigrams(text):
+    padded = '  %s ' % (text,)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class SearchIndex(object):
+    def __init__(self):
+        self.names = list()
+        self.levels = list()
+        self.paths = list() # (district, subcounty, parish) as used by the dashboard selectors
+        self.labels = list()
+        self.contexts = list()
+        self.__keys = set()
+        self.__built = False
+
+    def add(self, name, level, path, context=()):
+        key = (normalise(name), level, path)
+        if key in self.__keys:
+            return
+        self.__keys.add(key)
+        self.names.append(str(name))
+        self.levels.append(level)
+        self.paths.append(path)
+        self.contexts.append(tuple(context))
+        qualifier = ', '.join(str(c) for c in context if c)
+        self.labels.append('%s (%s)%s' % (name, level, ' - ' + qualifier if qualifier else ''))
+        self.__built = False
+
+    def build(self):
+        # per level, sorted (normalised name, id) for whole-name prefixes and (word suffix, id) for word prefixes
+        self.__prefix = { level: [] for level in LEVELS }
+        self.__words = { level: [] for level in LEVELS }
+        self.__trigrams = dict()
+        self.__entry_trigrams = list()
+        for i, (name, level) in enumerate(zip(self.names, self.levels)):
+            norm = normalise(name)
+            self.__prefix[level].append((norm, i))
+            for m in re.finditer(r'(?<![0-9a-z])[0-9a-z]', norm):
+                if m.start() > 0:
+                    self.__words[level].append((norm[m.start():], i))
+            grams = trigrams(norm)
+            self.__entry_trigrams.append(grams)
+            for g in grams:
+                self.__trigrams.setdefault(g, []).append(i)
+        for level in LEVELS:
+            self.__prefix[level].sort()
+            self.__words[level].sort()
+        self.__built = True
+        return self
+
+    def __prefix_range(self, entries, q, limit, seen, out):
+        i = bisect_left(entries, (q,))
+        while i < len(entries) and len(out) < limit and entries[i][0].startswith(q):
+            entry_id = entries[i][1]
+            if entry_id not in seen:
+                seen.add(entry_id)
+                out.append(entry_id)
+            i += 1
+
+    def query(self, text, limit=10):
+        # ranked: whole-name prefix, then word prefix (each district first, facility last), then trigram similarity
+        if not self.__built:
+            self.build()
+        q = normalise(text)
+        if not q:
+            return []
+        seen, out = set(), list()
+        for index in (self.__prefix, self.__words):
+            for level in LEVELS:
+                self.__prefix_range(index[level], q, limit, seen, out)
+                if len(out) >= limit:
+                    return out
+
+        if len(q) >= 3:
+            q_grams = trigrams(q)
+            # very common trigrams (' ho', 'ict', ...) say little and cost the most to count, so they are skipped
+            postings = [p for p in (self.__trigrams.get(g, ()) for g in q_grams) if len(p) <= COMMON_TRIGRAM_POSTINGS]
+            hits = Counter()
+            for posting in postings:
+                hits.update(posting)
+            # share of the query's trigrams found in the name, ties broken by overall similarity
+            min_hits = max(2, int(0.5 * len(postings) + 0.5))
+            scored = list()
+            for entry_id, n in hits.items():
+                if n >= min_hits and entry_id not in seen:
+                    grams = self.__entry_trigrams[entry_id]
+                    scored.append((-n, -n / len(grams), LEVEL_RANK[self.levels[entry_id]], entry_id))
+            scored.sort()
+            out.extend(entry_id for *_, entry_id in scored[:limit - len(out)])
+        return out
+
+    def label(self, entry_id):
+        return self.labels[entry_id]
+
+    def entries(self):
+        # (name, level, path, context) as passed to add(), for storing a built index
+        return list(zip(self.names, self.levels, self.paths, self.contexts))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __str__(self):
+        return 'SearchIndex(entries: %d)' % (len(self.names),)
+
+def from_entries(entries):
+    index = SearchIndex()
+    for name, level, path, context in entries:
+        index.add(name, level, tuple(path), context)
+    return index.build()
+
+def build_search_index(df_parish, df_mfl=None, subcounty_lookup=None):
+    # df_parish is the UBOS table, df_mfl adds facilities; subcounty_lookup maps an MFL (district, subcounty)
+    # onto the UBOS subcounty name so that facilities can jump to the matching selectors
+    index = SearchIndex()
+    for district, county, subcounty, parish in df_parish[['District', 'County', 'Subcounty', 'Parish']].itertuples(index=False):
+        district_name = district + ' District'
+        index.add(district_name, 'District', (district_name, None, None))
+        index.add(county, 'County', (district_name, None, None), (district_name,))
+        index.add(subcounty, 'Subcounty', (district_name, subcounty, None), (county, district_name))
+        index.add(parish, 'Parish', (district_name, subcounty, parish), (subcounty, county, district_name))
+
+    if df_mfl is not None:
+        df_facilities = df_mfl[df_mfl['NAME'].notnull()][['NAME', 'DISTRICT', 'SUBCOUNTY']]
+        for name, district, subcounty in df_facilities.itertuples(index=False):
+            if not isinstance(district, str):
+                continue
+            subcounty = subcounty if isinstance(subcounty, str) else None
+            ubos_subcounty = subcounty_lookup.get((district, subcounty)) if subcounty_lookup and subcounty else None
+            index.add(name, 'Facility', (district, ubos_subcounty, None), (subcounty, district))
+    return index.build()
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the modules live flat in the repository root, next to run_demo.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+
+@pytest.fixture
+def counter():
+    # counter(name, **labels) -> value recorded in the metrics registry since the test started
+    metrics.REGISTRY.reset()
+    yield lambda name, **labels: metrics.REGISTRY.counters.get((name, metrics.label_key(labels)), 0)
+    metrics.REGISTRY.reset()
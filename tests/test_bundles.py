@@ -0,0 +1,67 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from benchmarks import bench_render
+import bundles
+
+ROOT = Path(__file__).resolve().parent.parent
+DISTRICTS = ('Abim', 'Ntungamo')
+
+@pytest.fixture(scope='module')
+def bundle_dir(tmp_path_factory):
+    # the bench fixtures over two districts of the UBOS table
+    tmp_path = tmp_path_factory.mktemp('bundles')
+    parish_path = tmp_path / 'parishes.csv'
+    with open(ROOT / 'ubos_parish' / 'ALL_POP.csv') as src, open(parish_path, mode='w') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, reader.fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(row for row in reader if row['District'] in DISTRICTS)
+    mfl_path, optionb_path, _ = bench_render.write_fixtures(tmp_path, parish_path)
+    bundles.build_bundles(tmp_path / 'out', mfl_path, parish_path, optionb_path, profiles_path=str(ROOT / 'parish_profiles.json'), workers=1)
+    return tmp_path / 'out'
+
+def test_slug_paths():
+    assert bundles.slug('Kyamate/Kagamba (Rural)') == 'kyamate-kagamba-rural'
+    assert bundles.parish_bundle_path('Arua District', 'Aii-Vu', 'Alia') == Path('parishes/arua-district/aii-vu--alia.json.gz')
+    # '--' only ever separates the subcounty from the parish, slugs collapse separators to a single '-'
+    assert bundles.parish_bundle_path('X', 'a--b', 'c') != bundles.parish_bundle_path('X', 'a', 'b--c')
+
+def test_build_and_load(bundle_dir):
+    store = bundles.open_bundle_store(bundle_dir)
+    assert [name for name, _ in store.districts()] == ['Abim District', 'Ntungamo District']
+    assert store.map_levels() == ['District', 'Subcounty']
+    geojson, df_layer = store.map_layer('District')
+    assert len(geojson['features']) == len(df_layer) == 2
+
+    district = store.district('Ntungamo District')
+    subcounties = { sc['name']: sc for sc in district['subcounties'] }
+    assert 'Kayonza' in subcounties
+    assert district['population']['Pop_Total'] == sum(sc['population']['Pop_Total'] for sc in district['subcounties'])
+    title, cards = district['pmtct']
+    assert 'Ntungamo District' in title
+    assert store.district('Gulu District') is None
+
+def test_parish_bundles_follow_the_selector_names(bundle_dir):
+    store = bundles.open_bundle_store(bundle_dir)
+    for district_name, _ in store.districts():
+        for sc in store.district(district_name)['subcounties']:
+            for parish in sc['parishes']:
+                bundle = store.parish(district_name, sc['name'], parish['name'])
+                assert (bundle['subcounty'], bundle['parish']) == (sc['name'], parish['name'])
+                assert bundle['population'] == parish['population']
+    katooma = store.parish('Ntungamo District', 'Kayonza', 'Katooma')
+    assert katooma['profile']['production'] and katooma['profile']['health'] is None
+    assert not any(store.parish('Abim District', 'Lotukei', 'Awach')['profile'].values())
+    assert store.parish('Ntungamo District', 'Kayonza', 'Nowhere') is None
+
+def test_search_entries_round_trip(bundle_dir):
+    places = bundles.open_bundle_store(bundle_dir).search_index()
+    matches = places.query('katooma')
+    assert ('Ntungamo District', 'Kayonza', 'Katooma') in [places.paths[i] for i in matches]
+
+def test_missing_index_opens_no_store(tmp_path):
+    assert bundles.open_bundle_store(tmp_path) is None
+    assert bundles.open_bundle_store(tmp_path / 'not-built') is None
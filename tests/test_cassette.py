@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from benchmarks.stub_dhis2 import StubDhis2
+import cassette
+import dhis2
+
+@pytest.fixture(scope='module')
+def stub():
+    with StubDhis2.synthetic(scale=0.02) as stub:
+        yield stub
+
+@pytest.fixture
+def recorded(stub, tmp_path):
+    instance = dhis2.Dhis2(stub.url, ('admin', 'district'), cassette=cassette.Cassette(tmp_path, 'record'))
+    orgunits = [ou['id'] for ou in instance.orgunits()]
+    dataelements = len(instance.dataelements())
+    return tmp_path, orgunits, dataelements
+
+def replay(cassette_dir, scale=1):
+    return dhis2.Dhis2('http://replay.invalid/', ('', ''), cassette=cassette.Cassette(cassette_dir, 'replay', scale))
+
+def test_record_replay_round_trip(stub, recorded):
+    cassette_dir, orgunits, dataelements = recorded
+    n_requests = len(stub.requests)
+    instance = replay(cassette_dir)
+    assert [ou['id'] for ou in instance.orgunits()] == orgunits
+    assert len(instance.dataelements()) == dataelements
+    assert len(stub.requests) == n_requests
+    with pytest.raises(cassette.CassetteMiss):
+        instance.orgunits(level=5)
+
+def test_scaled_replay(recorded):
+    cassette_dir, orgunits, _ = recorded
+    scaled = [ou['id'] for ou in replay(cassette_dir, scale=3).orgunits()]
+    shared = cassette.Cassette(cassette_dir, 'replay').shared()
+    assert 0 < len(shared) < len(orgunits)
+    assert len(scaled) == len(orgunits) + 2 * (len(orgunits) - len(shared))
+    assert len(set(scaled)) == len(scaled)
+    assert set(cassette.original_uid(uid) for uid in scaled) == set(orgunits)
+    assert set(uid for uid in scaled if '~' not in uid) == set(orgunits)
+
+def test_scaling_needs_replay(tmp_path):
+    with pytest.raises(ValueError):
+        cassette.Cassette(tmp_path, 'record', scale=2)
+    with pytest.raises(FileNotFoundError):
+        cassette.Cassette(tmp_path, 'replay')
+
+def test_concurrent_recorders_keep_each_others_entries(tmp_path):
+    def send(body):
+        return lambda: cassette.response(200, body, 'application/json', 'http://stub.invalid/')
+
+    first, second = cassette.Cassette(tmp_path, 'record'), cassette.Cassette(tmp_path, 'record')
+    first.request('GET', '/api/a.json', send=send(b'{"a": 1}'))
+    second.request('GET', '/api/b.json', send=send(b'{"b": 2}'))
+    first.request('GET', '/api/c.json', send=send(b'{"c": 3}'))
+    with open(tmp_path / 'index.json') as index_file:
+        index = json.load(index_file)
+    assert sorted(index['interactions']) == ['GET /api/a.json', 'GET /api/b.json', 'GET /api/c.json']
+    assert not list(tmp_path.glob('*.tmp'))
+    replayed = cassette.Cassette(tmp_path, 'replay')
+    assert len(replayed) == 3
+    assert replayed.request('GET', '/api/b.json').json() == { 'b': 2 }
@@ -0,0 +1,29 @@
+import zlib
+
+import pytest
+
+from benchmarks.stub_dhis2 import StubDhis2
+import dhis2
+import metadata_cache
+import refresh
+
+PASSWORD = 'not-in-the-cache-0451'
+
+@pytest.fixture(scope='module')
+def stub():
+    with StubDhis2.synthetic(scale=0.02) as stub:
+        yield stub
+
+def test_persisted_snapshots_hold_no_credentials(stub, tmp_path):
+    cache = metadata_cache.open_cache('sqlite:///%s' % (tmp_path / 'metadata.sqlite',))
+    instance = dhis2.Dhis2(stub.url, ('admin', PASSWORD))
+    for name, loader in (('orgunits', instance.orgunits), ('dataelements', instance.dataelements)):
+        refresh.Refresher(name, loader, 60, cache=cache).get()
+        blob = cache.connection().execute('SELECT value FROM cache_entries WHERE key = ?', (name,)).fetchone()[0]
+        assert PASSWORD.encode('utf-8') not in zlib.decompress(blob)
+
+    restored = refresh.Refresher('orgunits', instance.orgunits, 60, cache=cache).get()
+    assert restored.server_instance.server_url == stub.url
+    assert restored.server_instance.credentials is None
+    assert str(restored)
+    assert instance.credentials == ('admin', PASSWORD) # the live instance keeps them
@@ -0,0 +1,73 @@
+import federation
+
+def ou(uid, name, parent=None, level=None):
+    orgunit = { 'id': uid, 'name': name, 'parent': { 'id': parent } if parent else None }
+    if level is not None:
+        orgunit['level'] = level
+    return orgunit
+
+# national > sub-region > district > subcounty, as on the eHMIS
+CANONICAL = [
+    ou('UG', 'Uganda'),
+    ou('ACH', 'Acholi', 'UG'),
+    ou('ANK', 'Ankole', 'UG'),
+    ou('GUL', 'Gulu District', 'ACH'),
+    ou('KIT', 'Kitgum District', 'ACH'),
+    ou('NTU', 'Ntungamo District', 'ANK'),
+    ou('BAR', 'Bar-Dege Division', 'GUL'),
+    ou('KAY', 'Kayonza Subcounty', 'NTU'),
+    ou('KITTC', 'Kitgum Town Council', 'KIT'),
+]
+
+def test_exact_names_match_down_the_tree():
+    foreign = [
+        ou('ug', 'Uganda'),
+        ou('ach', 'Acholi', 'ug'),
+        ou('ank', 'Ankole', 'ug'),
+        ou('gul', 'Gulu', 'ach'),
+        ou('ntu', 'Ntungamo', 'ank'),
+        ou('kay', 'Kayonza', 'ntu'),
+    ]
+    assert federation.match_orgunits(CANONICAL, foreign) == { 'ug': 'UG', 'ach': 'ACH', 'ank': 'ANK', 'gul': 'GUL', 'ntu': 'NTU', 'kay': 'KAY' }
+
+def test_renamed_and_moved_orgunits():
+    # Kitgum sits under the wrong sub-region, so it and its town council are matched by name within their level
+    foreign = [
+        ou('ug', 'Uganda', level=1),
+        ou('ach', 'Acholi Region', 'ug', level=2),
+        ou('ank', 'Ankole', 'ug', level=2),
+        ou('kit', 'Kitgum District', 'ank', level=3),
+        ou('ntu', 'Ntungamo District', 'ank', level=3),
+        ou('kittc', 'Kitgum T/C', 'kit', level=4),
+    ]
+    mapping = federation.match_orgunits(CANONICAL, foreign)
+    assert mapping['kit'] == 'KIT'
+    assert mapping['kittc'] == 'KITTC'
+    assert mapping['ntu'] == 'NTU'
+    assert 'ach' not in mapping # renamed beyond normalisation
+
+def test_flatter_hierarchy_matches_on_the_offset_level():
+    # no sub-regions: districts at level 2 and subcounties at level 3 map one level down
+    foreign = [
+        ou('ug', 'Uganda', level=1),
+        ou('gul', 'Gulu', 'ug', level=2),
+        ou('kit', 'Kitgum', 'ug', level=2),
+        ou('ntu', 'Ntungamo', 'ug', level=2),
+        ou('kay', 'Kayonza', 'ntu', level=3),
+        ou('bar', 'Bar Dege Division', 'gul', level=3),
+    ]
+    mapping = federation.match_orgunits(CANONICAL, foreign)
+    assert mapping == { 'ug': 'UG', 'gul': 'GUL', 'kit': 'KIT', 'ntu': 'NTU', 'kay': 'KAY', 'bar': 'BAR' }
+
+def test_unmatched_and_cross_level_names_stay_unmatched():
+    # a facility named like a sub-region must not be paired with it
+    foreign = [
+        ou('ug', 'Uganda', level=1),
+        ou('ank', 'Ankole', 'ug', level=2),
+        ou('ntu', 'Ntungamo', 'ank', level=3),
+        ou('kay', 'Kayonza', 'ntu', level=4),
+        ou('fac', 'Acholi', 'kay', level=5),
+        ou('new', 'Rubaare Town Council', 'ntu', level=4),
+    ]
+    mapping = federation.match_orgunits(CANONICAL, foreign)
+    assert mapping == { 'ug': 'UG', 'ank': 'ANK', 'ntu': 'NTU', 'kay': 'KAY' }
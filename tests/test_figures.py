@@ -0,0 +1,62 @@
+import json
+
+import figures
+
+def square(lon, lat):
+    return { 'type': 'Polygon', 'coordinates': [[[lon, lat], [lon + 1, lat], [lon + 1, lat + 1], [lon, lat + 1], [lon, lat]]] }
+
+def layer(names):
+    return { 'type': 'FeatureCollection', 'features': [{ 'type': 'Feature', 'id': name, 'geometry': square(i, 0), 'properties': {} } for i, name in enumerate(names)] }
+
+def trace(figure_json):
+    return json.loads(figure_json)['data'][0]
+
+def test_metrics_share_geometry_and_stay_aligned(counter):
+    cache = figures.FigureCache()
+    names = ['Abim District', 'Gulu District', 'Ntungamo District']
+    population = trace(cache.figure_json('District', 'Pop_Total', 'g1', layer(names), names, [10, 20, 30], colorscale='temps'))
+    density = trace(cache.figure_json('District', 'density', 'g1', layer(names), names, [1.5, 2.5, 3.5], colorscale='temps'))
+    assert population['locations'] == density['locations'] == names
+    assert population['z'] == [10, 20, 30]
+    assert density['z'] == [1.5, 2.5, 3.5]
+    assert [f['id'] for f in density['geojson']['features']] == names
+    assert counter('figure_cache_requests_total', part='geometry', result='miss') == 1
+    assert counter('figure_cache_requests_total', part='geometry', result='hit') == 1
+    assert counter('figure_cache_requests_total', part='shell', result='miss') == 1
+    assert counter('figure_cache_requests_total', part='shell', result='hit') == 1
+
+def test_new_geometry_version_replaces_locations():
+    cache = figures.FigureCache()
+    cache.figure_json('District', 'Pop_Total', 'g1', layer(['A', 'B']), ['A', 'B'], [1, 2])
+    figure = trace(cache.figure_json('District', 'Pop_Total', 'g2', layer(['B', 'C', 'A']), ['B', 'C', 'A'], [2, 3, 1]))
+    assert figure['locations'] == ['B', 'C', 'A']
+    assert figure['z'] == [2, 3, 1]
+
+def test_matches_plotly_figure():
+    import plotly.graph_objs as go
+
+    names = ['A', 'B']
+    kwargs = dict(colorscale='temps', marker_opacity=0.5, marker_line_width=0)
+    cached = json.loads(figures.FigureCache().figure_json('District', 'm', 'g', layer(names), names, [1, 2], **kwargs))
+    expected = go.Figure(go.Choroplethmapbox(geojson=layer(names), locations=names, z=[1, 2], **kwargs), layout=figures.MAP_LAYOUT).to_plotly_json()
+    assert cached['data'][0] == json.loads(figures.dumps(expected['data'][0]))
+
+def test_parts_are_bounded():
+    cache = figures.FigureCache(maxsize=2, max_geometries=1)
+    for version in ('g1', 'g2', 'g3'):
+        for metric in ('a', 'b', 'c'):
+            cache.figure_json('District', metric, version, layer(['A']), ['A'], [1])
+    assert str(cache) == 'FigureCache(shells: 1, geometries: 1, values: 2)'
+
+def test_script_end_tag_is_escaped():
+    names = ['</script><script>alert(1)</script>']
+    figure_json = figures.FigureCache().figure_json('District', 'm', 'g', layer(names), names, [1])
+    assert '</' not in figure_json
+    assert trace(figure_json)['locations'] == names
+
+def test_component_dir(tmp_path):
+    path = figures.component_dir(tmp_path)
+    assert (path / 'plotly.min.js').stat().st_size > 1000000
+    assert '<script src="plotly.min.js"></script>' in (path / 'index.html').read_text()
+    assert figures.component_dir(tmp_path) == path # written once
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
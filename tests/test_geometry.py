@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pytest
+
+import dhis2
+import geometry
+
+SQUARE = [[30.0, 1.0], [31.0, 1.0], [31.0, 2.0], [30.0, 2.0], [30.0, 1.0]]
+HOLE = [[30.25, 1.25], [30.25, 1.75], [30.75, 1.75], [30.75, 1.25], [30.25, 1.25]]
+
+GEOMETRIES = [
+    { 'type': 'Point', 'coordinates': [32.5825, 0.3476] },
+    { 'type': 'LineString', 'coordinates': [[30.1, 1.1], [30.2, 1.3], [30.4, 1.2]] },
+    { 'type': 'Polygon', 'coordinates': [SQUARE, HOLE] },
+    { 'type': 'MultiPoint', 'coordinates': [[30.1, 1.1], [30.2, 1.2]] },
+    { 'type': 'MultiLineString', 'coordinates': [[[30.1, 1.1], [30.2, 1.2]], [[30.3, 1.3], [30.4, 1.4], [30.5, 1.3]]] },
+    { 'type': 'MultiPolygon', 'coordinates': [[SQUARE, HOLE], [[[33.0, 2.0], [33.5, 2.0], [33.5, 2.5], [33.0, 2.0]]]] },
+    None,
+]
+
+def test_pack_unpack_round_trip():
+    packed = geometry.pack(GEOMETRIES)
+    assert len(packed) == len(GEOMETRIES)
+    assert geometry.unpack_all(packed) == GEOMETRIES
+    assert json.dumps(geometry.unpack_all(packed)) == json.dumps(GEOMETRIES)
+
+def test_integer_coordinates_come_back_as_floats():
+    point = { 'type': 'Point', 'coordinates': [30, 1] }
+    unpacked = geometry.unpack(geometry.pack([point]), 0)
+    assert unpacked == point
+    assert json.dumps(unpacked) == '{"type": "Point", "coordinates": [30.0, 1.0]}'
+
+def test_float32_round_trip_is_approximate():
+    unpacked = geometry.unpack(geometry.pack([GEOMETRIES[0]], dtype=np.float32), 0)
+    assert unpacked['coordinates'] == pytest.approx(GEOMETRIES[0]['coordinates'], abs=1e-5)
+
+def test_bboxes_and_centroids():
+    packed = geometry.pack(GEOMETRIES)
+    boxes = geometry.bboxes(packed)
+    assert boxes[2].tolist() == [30.0, 1.0, 31.0, 2.0]
+    assert np.isnan(boxes[6]).all()
+    centroids = geometry.centroids(packed)
+    assert centroids[0].tolist() == [32.5825, 0.3476]
+    assert centroids[2] == pytest.approx([30.5, 1.5]) # a centred hole leaves the centroid in place
+    assert np.isnan(centroids[6]).all()
+
+class Server(object):
+    # answers OrgUnits' one metadata request
+    server_url = 'http://dhis2.test/'
+
+    def __init__(self, orgunits):
+        self.orgunits = orgunits
+
+    def get_metadata(self, collection, params):
+        return { collection: self.orgunits }
+
+def test_orgunits_in_bbox_and_centroids():
+    response = [
+        { 'id': 'district1', 'name': 'West District', 'geometry': GEOMETRIES[2] },
+        { 'id': 'facility1', 'name': 'East HC', 'geometry': GEOMETRIES[0] },
+        { 'id': 'unmapped1', 'name': 'Unmapped' },
+    ]
+    orgunits = dhis2.OrgUnits(Server(response), fields='id,name,geometry')
+    assert [ou['id'] for ou in orgunits.in_bbox(30.9, 1.9, 31.5, 2.5)] == ['district1']
+    assert [ou['id'] for ou in orgunits.in_bbox(32.0, 0.0, 33.0, 1.0)] == ['facility1']
+    assert orgunits.in_bbox(0.0, 0.0, 1.0, 1.0) == []
+    centroids = orgunits.centroids()
+    assert centroids[0] == pytest.approx([30.5, 1.5])
+    assert np.isnan(centroids[2]).all()
+    assert orgunits['district1']['geometry'] == GEOMETRIES[2]
+    assert orgunits['unmapped1'].geometry() is None
+    assert 'geometry' in response[0] # the response is shared with the metadata cache and is not edited
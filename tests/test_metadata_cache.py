@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+import metadata_cache
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return metadata_cache.open_cache('memory:')
+    return metadata_cache.open_cache('sqlite:///%s' % (tmp_path / 'metadata.sqlite',))
+
+class Loader(object):
+    def __init__(self, value, delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self):
+        with self.__lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+def test_miss_then_hit(cache, counter):
+    loader = Loader({ 'id': 'abc', 'children': [1, 2] })
+    assert cache.get_or_set('ns', 'k', 'v1', loader) == { 'id': 'abc', 'children': [1, 2] }
+    assert cache.get_or_set('ns', 'k', 'v1', loader) == { 'id': 'abc', 'children': [1, 2] }
+    assert loader.calls == 1
+    assert counter('cache_requests_total', namespace='ns', result='miss') == 1
+    assert counter('cache_requests_total', namespace='ns', result='hit') == 1
+
+def test_version_change_reloads(cache):
+    old, new = Loader('old'), Loader('new')
+    assert cache.get_or_set('ns', 'k', 'v1', old) == 'old'
+    assert cache.get_or_set('ns', 'k', 'v2', new) == 'new'
+    assert cache.get('ns', 'k', 'v1') is None
+    assert cache.get('ns', 'k', 'v2') == 'new'
+    assert (old.calls, new.calls) == (1, 1)
+
+def test_keys_and_namespaces_are_separate(cache):
+    cache.set('a', 'k', 'v', 1)
+    cache.set('b', 'k', 'v', 2)
+    cache.set('a', 'j', 'v', 3)
+    assert [cache.get('a', 'k', 'v'), cache.get('b', 'k', 'v'), cache.get('a', 'j', 'v')] == [1, 2, 3]
+
+def test_none_is_cached(cache):
+    loader = Loader(None)
+    assert cache.get_or_set('ns', 'k', 'v', loader) is None
+    assert cache.get_or_set('ns', 'k', 'v', loader) is None
+    assert loader.calls == 1
+    assert cache.get('ns', 'missing', 'v', metadata_cache.MISS) is metadata_cache.MISS
+
+def test_concurrent_misses_load_once(cache):
+    loader = Loader('value', delay=0.2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: cache.get_or_set('ns', 'k', 'v', loader), range(8)))
+    assert results == ['value'] * 8
+    assert loader.calls == 1
+
+def test_sqlite_is_shared_between_backends(tmp_path):
+    # two backends on one file stand in for two server processes
+    url = 'sqlite:///%s' % (tmp_path / 'metadata.sqlite',)
+    first, second = metadata_cache.open_cache(url), metadata_cache.open_cache(url)
+    loader = Loader([1, 2, 3])
+    first.get_or_set('ns', 'k', 'v', loader)
+    assert second.get_or_set('ns', 'k', 'v', loader) == [1, 2, 3]
+    assert loader.calls == 1
+
+def test_sqlite_stale_lock_expires(tmp_path):
+    cache = metadata_cache.open_cache('sqlite:///%s' % (tmp_path / 'metadata.sqlite',))
+    with cache.connection() as conn:
+        conn.execute('INSERT INTO cache_locks (namespace, key, owner, expires) VALUES (?, ?, ?, ?)', ('ns', 'k', 'crashed', time.time() - 1))
+    assert cache.get_or_set('ns', 'k', 'v', Loader('value')) == 'value'
+
+def load_in_process(url, loads_path, results_path):
+    # runs in a child process: the loader leaves a mark per call, the result is written for the parent
+    def loader():
+        with open(loads_path, mode='a') as loads_file:
+            loads_file.write('x')
+        time.sleep(0.5)
+        return { 'pid': os.getpid() }
+
+    value = metadata_cache.open_cache(url).get_or_set('ns', 'k', 'v', loader)
+    with open(results_path, mode='a') as results_file:
+        results_file.write('%d\n' % (value['pid'],))
+
+def test_sqlite_lease_serialises_loads_across_processes(tmp_path):
+    url = 'sqlite:///%s' % (tmp_path / 'metadata.sqlite',)
+    metadata_cache.open_cache(url) # creates the tables before the processes race for the lock
+    loads_path, results_path = tmp_path / 'loads', tmp_path / 'results'
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=load_in_process, args=(url, loads_path, results_path)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+    assert [process.exitcode for process in processes] == [0, 0]
+    assert loads_path.read_text() == 'x'
+    # both processes return the one loaded value, each from its own unpickled copy
+    pids = results_path.read_text().split()
+    assert len(pids) == 2 and len(set(pids)) == 1
+    assert int(pids[0]) in [process.pid for process in processes]
+    with metadata_cache.open_cache(url).connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM cache_locks').fetchone()[0] == 0
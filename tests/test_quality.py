@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pandas as pd
+
+import quality
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def summary_by_rule(tables):
+    df_violations, df_summary = quality.validate(tables, workers=2)
+    return df_violations, df_summary.set_index('rule')
+
+def test_partial_mfl_skips_district_rules():
+    tables = quality.build_tables(pd.read_csv(ROOT / 'UG_MFL_2021-04-01_nopoly.csv'), None, pd.read_csv(ROOT / 'optionb_plus2.csv'))
+    covered, total = quality.district_coverage(tables['districts'], tables['facilities'])
+    assert covered < quality.DISTRICT_COVERAGE * total
+    df_violations, summary = summary_by_rule(tables)
+    assert summary.loc['optionb_orgunit_in_mfl', 'skipped'] == 'no orgunit_in_mfl column'
+    assert summary.loc['facility_in_district', 'skipped'] == 'no in_district column'
+    assert summary.loc['mfl_uid_in_orgunits', 'skipped'] == 'no mfl table'
+    assert not (df_violations['rule'] == 'optionb_orgunit_in_mfl').any()
+    assert summary.loc['optionb_positive_le_tested', 'skipped'] == ''
+
+def test_complete_mfl_checks_optionb_orgunits():
+    df_mfl = pd.DataFrame({
+        'DISTRICT': ['Abim District', 'Abim District', 'Gulu District', 'Gulu District'],
+        'SUBCOUNTY': [None, 'Abim Town Council', None, 'Bar-Dege Division'],
+        'NAME': [None, 'Abim Hospital', None, 'Gulu Hospital'],
+        'UID': ['abimDistrct', 'abimHospitl', 'guluDistrct', 'guluHospitl'],
+        'COORDINATES': ['""'] * 4,
+    })
+    df_optionb_all = pd.DataFrame({
+        'Data': [quality.optionb.PCR_DE_UIDS[1]] * 2,
+        'Organisation unit': ['abimDistrct', 'otherOrgUnt'],
+        'Value': [3, 4],
+    })
+    tables = quality.build_tables(df_mfl, None, df_optionb_all)
+    assert quality.district_coverage(tables['districts'], tables['facilities']) == (2, 2)
+    df_violations, summary = summary_by_rule(tables)
+    assert summary.loc['optionb_orgunit_in_mfl', 'checked'] == 2
+    assert list(df_violations[df_violations['rule'] == 'optionb_orgunit_in_mfl']['key']) == ['otherOrgUnt']
@@ -0,0 +1,103 @@
+from time import monotonic, sleep
+
+import metadata_cache
+import refresh
+
+class Source(object):
+    # a dataset whose version and contents the tests change, and which can be made to fail
+    def __init__(self):
+        self.version = 'v1'
+        self.loads = 0
+        self.fail = False
+
+    def load(self):
+        if self.fail:
+            raise IOError('server unavailable')
+        self.loads += 1
+        return '%s-%d' % (self.version, self.loads)
+
+def wait_for(condition, timeout=5.0):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, 'timed out'
+        sleep(0.01)
+
+def test_first_read_loads():
+    source = Source()
+    refresher = refresh.Refresher('x', source.load, 60, version=lambda: source.version)
+    assert not refresher.loaded()
+    assert refresher.get() == 'v1-1'
+    assert refresher.ready()
+    assert refresher.snapshot().version == 'v1'
+
+def test_refresh_swaps_snapshot(counter):
+    source = Source()
+    refresher = refresh.Refresher('x', source.load, 60, version=lambda: source.version)
+    held = refresher.snapshot()
+    assert refresher.refresh() == 'unchanged'
+    assert refresher.snapshot() is held
+    source.version = 'v2'
+    assert refresher.refresh() == 'updated'
+    assert refresher.get() == 'v2-2'
+    assert held.value == 'v1-1' # a reader holding the old snapshot is not affected
+    assert counter('refresh_total', dataset='x', result='updated') == 1
+    assert counter('refresh_total', dataset='x', result='unchanged') == 1
+
+def test_failed_refresh_keeps_snapshot_and_retries_sooner(counter):
+    source = Source()
+    refresher = refresh.Refresher('x', source.load, 3600, version=lambda: source.version)
+    refresher.get()
+    source.version, source.fail = 'v2', True
+    assert refresher.refresh() == 'error'
+    assert refresher.get() == 'v1-1'
+    assert isinstance(refresher.error, IOError)
+    assert refresher.due - monotonic() <= refresh.RETRY_SECONDS
+    source.fail = False
+    assert refresher.refresh() == 'updated'
+    assert refresher.error is None
+    assert refresher.get() == 'v2-2'
+    assert refresher.due - monotonic() > refresh.RETRY_SECONDS
+    assert counter('refresh_total', dataset='x', result='error') == 1
+
+def test_initial_snapshot_is_partial():
+    source = Source()
+    refresher = refresh.Refresher('x', source.load, 60, version=lambda: source.version, initial=lambda: 'partial')
+    assert refresher.get() == 'partial'
+    assert refresher.loaded() and not refresher.ready()
+    assert refresher.refresh() == 'updated' # the same version does not skip the full load
+    assert refresher.get() == 'v1-1'
+    assert refresher.ready()
+
+def test_snapshot_restored_from_cache(counter):
+    cache = metadata_cache.open_cache('memory:')
+    source = Source()
+    refresh.Refresher('x', source.load, 60, version=lambda: source.version, cache=cache).get()
+    restored = refresh.Refresher('x', source.load, 60, version=lambda: source.version, initial=lambda: 'partial', cache=cache)
+    assert restored.get() == 'v1-1'
+    assert source.loads == 1
+    assert counter('refresh_total', dataset='x', result='restored') == 1
+
+def test_scheduler_refreshes_in_background():
+    source = Source()
+    scheduler = refresh.Scheduler().start()
+    try:
+        refresher = scheduler.add('x', source.load, 0.05, version=lambda: source.version)
+        assert refresher.get() == 'v1-1'
+        source.version = 'v2'
+        wait_for(lambda: refresher.get().startswith('v2'))
+    finally:
+        scheduler.stop()
+
+def test_scheduler_add_returns_existing_refresher():
+    scheduler = refresh.Scheduler()
+    first = scheduler.add('x', lambda: 1, 60)
+    assert scheduler.add('x', lambda: 2, 60) is first
+
+def test_scheduler_registry_keeps_one_per_key():
+    scheduler, other = refresh.scheduler('test_registry'), refresh.scheduler('test_registry_other')
+    try:
+        assert refresh.scheduler('test_registry') is scheduler
+        assert other is not scheduler
+    finally:
+        scheduler.stop()
+        other.stop()
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import search_index
+
+PARISHES = pd.DataFrame([
+    ('Ntungamo', 'Rushenyi', 'Kayonza', 'Katooma'),
+    ('Ntungamo', 'Rushenyi', 'Kayonza', 'Kagarama'),
+    ('Ntungamo', 'Ruhaama', 'Ntungamo', 'Nyakagyera'),
+    ('Kanungu', 'Kinkiizi', 'Kayonza', 'Kayonza'),
+    ('Sheema', 'Sheema', 'Kigarama', 'Katooma'),
+    ('Gulu', 'Gulu Municipality', 'Bar Dege Division', 'Bar Dege'),
+    ('Bushenyi', 'Igara', 'Kyeizooba', 'Ntungamo'),
+    ('Kanungu', 'Kinkiizi', 'Kayonza', 'Degeya'),
+], columns=['District', 'County', 'Subcounty', 'Parish'])
+
+MFL = pd.DataFrame([
+    ('Ntungamo District', 'Kayonza Subcounty', 'Kayonza HC III'),
+    ('Gulu District', 'Bardege Division', 'Bardege HC III'),
+    ('Ntungamo District', 'Kayonza Subcounty', None),
+], columns=['DISTRICT', 'SUBCOUNTY', 'NAME'])
+
+@pytest.fixture(scope='module')
+def places():
+    return search_index.build_search_index(PARISHES, MFL, { ('Ntungamo District', 'Kayonza Subcounty'): 'Kayonza' })
+
+def results(places, text, limit=10):
+    return [(places.names[i], places.levels[i], places.paths[i]) for i in places.query(text, limit)]
+
+def test_exact_name_ranks_districts_first(places):
+    assert results(places, 'Ntungamo') == [
+        ('Ntungamo District', 'District', ('Ntungamo District', None, None)),
+        ('Ntungamo', 'Subcounty', ('Ntungamo District', 'Ntungamo', None)),
+        ('Ntungamo', 'Parish', ('Bushenyi District', 'Kyeizooba', 'Ntungamo')),
+    ]
+    assert results(places, 'katooma') == [
+        ('Katooma', 'Parish', ('Ntungamo District', 'Kayonza', 'Katooma')),
+        ('Katooma', 'Parish', ('Sheema District', 'Kigarama', 'Katooma')),
+    ]
+
+def test_prefix_ranks_levels_then_names(places):
+    assert [(name, level) for name, level, _ in results(places, 'ka')] == [
+        ('Kanungu District', 'District'),
+        ('Kayonza', 'Subcounty'),
+        ('Kayonza', 'Subcounty'),
+        ('Kagarama', 'Parish'),
+        ('Katooma', 'Parish'),
+        ('Katooma', 'Parish'),
+        ('Kayonza', 'Parish'),
+        ('Kayonza HC III', 'Facility'),
+    ]
+    # prefix matches come before trigram ones, whatever their level
+    assert [(name, level) for name, level, _ in results(places, 'kay', limit=4)] == [
+        ('Kayonza', 'Subcounty'),
+        ('Kayonza', 'Subcounty'),
+        ('Kayonza', 'Parish'),
+        ('Kayonza HC III', 'Facility'),
+    ]
+    assert results(places, 'kay', limit=2) == [
+        ('Kayonza', 'Subcounty', ('Ntungamo District', 'Kayonza', None)),
+        ('Kayonza', 'Subcounty', ('Kanungu District', 'Kayonza', None)),
+    ]
+
+def test_whole_name_prefix_before_word_prefix(places):
+    assert [name for name, _, _ in results(places, 'bar')] == ['Bar Dege Division', 'Bar Dege', 'Bardege HC III']
+    # a parish whose name starts with the query before a subcounty with a later word that does
+    assert [name for name, _, _ in results(places, 'dege')] == ['Degeya', 'Bar Dege Division', 'Bar Dege', 'Bardege HC III']
+    assert results(places, 'kayonza hc')[0][0] == 'Kayonza HC III'
+
+def test_fuzzy_matches_misspellings(places):
+    assert [name for name, _, _ in results(places, 'katoma')] == ['Katooma', 'Katooma']
+    assert results(places, 'ntungamu')[0][:2] == ('Ntungamo', 'Subcounty')
+    assert results(places, 'ntungamu')[-1][:2] == ('Ntungamo District', 'District')
+    assert [name for name, _, _ in results(places, 'kayunza')][:3] == ['Kayonza', 'Kayonza', 'Kayonza']
+    assert results(places, 'xyz') == []
+    assert results(places, '  ') == []
+
+def test_facilities_jump_to_the_ubos_subcounty(places):
+    assert ('Kayonza HC III', 'Facility', ('Ntungamo District', 'Kayonza', None)) in results(places, 'kayonza hc')
+    # no lookup entry for the eHMIS spelling: the facility only preselects its district
+    assert results(places, 'bardege hc')[0] == ('Bardege HC III', 'Facility', ('Gulu District', None, None))
+
+def test_entries_round_trip(places):
+    restored = search_index.from_entries(places.entries())
+    for text in ('ntungamo', 'kay', 'dege', 'katoma'):
+        assert results(restored, text) == results(places, text)
+
+def test_ubos_names():
+    df_parish = pd.read_csv(Path(__file__).resolve().parent.parent / 'ubos_parish' / 'ALL_POP.csv')
+    places = search_index.build_search_index(df_parish)
+    assert results(places, 'ntungamo', limit=1) == [('Ntungamo District', 'District', ('Ntungamo District', None, None))]
+    assert ('Katooma', 'Parish', ('Ntungamo District', 'Kayonza', 'Katooma')) in results(places, 'katooma', limit=2)
+    assert results(places, 'ntungamu', limit=1)[0][0] == 'Ntungamo'